@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import array
+import bisect
 import builtins
+import heapq
+import inspect
+import itertools
 import json
+import numbers
 import os
+import struct
 import sys
+import threading
+import time
 import traceback
 import uuid
-from contextlib import suppress
-from io import StringIO
+import weakref
+import zlib
+from collections import OrderedDict, deque
+from contextlib import nullcontext, suppress
+from contextvars import ContextVar
 
 import param
 
@@ -15,12 +27,10 @@ from ._version import __version__
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 
-with open(os.path.join(HERE, "labextension", "package.json")) as fid:
-    data = json.load(fid)
-
 
 def _jupyter_labextension_paths():
-    return [{"src": "labextension", "dest": data["name"]}]
+    # Looked up on the module so the package.json is only read once
+    return [{"src": "labextension", "dest": sys.modules[__name__].data["name"]}]
 
 
 _in_ipython = hasattr(builtins, "get_ipython")
@@ -29,10 +39,27 @@ _in_ipython = hasattr(builtins, "get_ipython")
 if not (_in_ipython and sys.argv[0].endswith("ipykernel_launcher.py")):
     os.environ["_PYVIZ_COMMS_INSTALLED"] = str(__version__)
 
-# nb_mime_js is used to enable the necessary mime type support in classic notebook
 comm_path = os.path.dirname(os.path.abspath(__file__))
-with open(os.path.join(comm_path, "notebook.js")) as f:
-    nb_mime_js = "\n\n" + f.read()
+
+
+def __getattr__(name):
+    """Lazily loads module attributes which require reading files, so
+    importing pyviz_comms stays cheap when they are not needed:
+
+    * data       -  The contents of the labextension package.json.
+    * nb_mime_js -  JS used to enable the necessary mime type support
+                    in the classic notebook.
+    """
+    if name == "data":
+        with open(os.path.join(HERE, "labextension", "package.json")) as fid:
+            value = json.load(fid)
+    elif name == "nb_mime_js":
+        with open(os.path.join(comm_path, "notebook.js")) as f:
+            value = "\n\n" + f.read()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
 
 
 class extension(param.ParameterizedFunction):
@@ -46,6 +73,11 @@ class extension(param.ParameterizedFunction):
     # A registry of actions to perform when a server delete event is received
     _server_delete_actions = []
 
+    # Registries of actions to perform when a delete or server delete
+    # event is received for a specific id, indexed by that id
+    _keyed_delete_actions = {}
+    _keyed_server_delete_actions = {}
+
     # Records the execution_count at each execution of an extension
     _last_execution_count = None
     _repeat_execution_in_cell = False
@@ -62,25 +94,67 @@ class extension(param.ParameterizedFunction):
         return super().__new__(cls, *args, **kwargs)
 
     @classmethod
-    def add_delete_action(cls, action):
-        cls._delete_actions.append(action)
+    def add_delete_action(cls, action, id=None):
+        """Registers an action called with the id of a plot when it is
+        deleted. If an id is supplied the action is only called when
+        the plot with that id is deleted and is unregistered afterwards.
+        """
+        if id is None:
+            cls._delete_actions.append(action)
+        else:
+            cls._keyed_delete_actions.setdefault(id, []).append(action)
 
     @classmethod
-    def add_server_delete_action(cls, action):
-        cls._server_delete_actions.append(action)
+    def add_server_delete_action(cls, action, id=None):
+        """Registers an action called with the id of a server when it is
+        deleted. If an id is supplied the action is only called when
+        the server with that id is deleted and is unregistered afterwards.
+        """
+        if id is None:
+            cls._server_delete_actions.append(action)
+        else:
+            cls._keyed_server_delete_actions.setdefault(id, []).append(action)
 
     @classmethod
     def _process_comm_msg(cls, msg):
         """Processes comm messages to handle global actions such as
         cleaning up plots.
+
+        A batch_delete event bundles the delete and server delete
+        events collected by the frontend over a short period in the
+        ids and server_ids lists.
         """
         event_type = msg["event_type"]
         if event_type == "delete":
-            for action in cls._delete_actions:
-                action(msg["id"])
+            cls._run_delete_actions(msg["id"], cls._keyed_delete_actions, cls._delete_actions)
         elif event_type == "server_delete":
-            for action in cls._server_delete_actions:
-                action(msg["id"])
+            cls._run_delete_actions(
+                msg["id"], cls._keyed_server_delete_actions, cls._server_delete_actions
+            )
+        elif event_type == "batch_delete":
+            # A failing action must not prevent the cleanup of the other
+            # ids, like it could not when each id was a separate event
+            batches = [
+                (msg.get("ids", []), cls._keyed_delete_actions, cls._delete_actions),
+                (
+                    msg.get("server_ids", []),
+                    cls._keyed_server_delete_actions,
+                    cls._server_delete_actions,
+                ),
+            ]
+            for ids, keyed_actions, actions in batches:
+                for id in ids:
+                    try:
+                        cls._run_delete_actions(id, keyed_actions, actions)
+                    except Exception:
+                        traceback.print_exc()
+
+    @classmethod
+    def _run_delete_actions(cls, id, keyed_actions, actions):
+        for action in keyed_actions.pop(id, []):
+            action(id)
+        for action in actions:
+            action(id)
 
 
 PYVIZ_PROXY = """
@@ -93,25 +167,70 @@ ABORT_JS = """
 if (!window.PyViz) {{
   return;
 }}
-var events = [];
 var receiver = window.PyViz.receivers['{plot_id}'];
+var partial = null;
 if (receiver &&
         receiver._partial &&
         receiver._partial.content &&
         receiver._partial.content.events) {{
-    events = receiver._partial.content.events;
+    partial = receiver._partial;
 }}
 
 var value = cb_obj['{change}'];
 
 {transform}
 
-for (var event of events) {{
-  if ((event.kind === 'ModelChanged') && (event.attr === '{change}') &&
-      (cb_obj.id === event.model.id) &&
-      (JSON.stringify(value) === JSON.stringify(event.new))) {{
-    return;
+var is_echo = (partial !== null) && (function() {{
+  // The ModelChanged events of each incoming message are indexed once
+  // by model id and attribute, so checking for an echo does not scan
+  // all events and values are only serialized if they cannot be told
+  // apart cheaply
+  if (!window.PyViz.echo_index) {{
+    window.PyViz.echo_index = new WeakMap();
+  }}
+  var index = window.PyViz.echo_index.get(partial);
+  if (index === undefined) {{
+    index = new Map();
+    for (var event of partial.content.events) {{
+      if (event.kind !== 'ModelChanged') {{
+        continue;
+      }}
+      var key = event.model.id + ':' + event.attr;
+      if (!index.has(key)) {{
+        index.set(key, []);
+      }}
+      index.get(key).push({{value: event.new, json: undefined}});
+    }}
+    window.PyViz.echo_index.set(partial, index);
+  }}
+  var entries = index.get(cb_obj.id + ':{change}');
+  if (entries === undefined) {{
+    return false;
+  }}
+  var json;
+  for (var entry of entries) {{
+    var other = entry.value;
+    if ((other === value) || (Number.isNaN(other) && Number.isNaN(value))) {{
+      return true;
+    }} else if ((value === null) || (other === null) ||
+               (typeof value !== 'object') || (typeof other !== 'object') ||
+               (value.length !== other.length)) {{
+      continue;
+    }}
+    if (json === undefined) {{
+      json = JSON.stringify(value);
+    }}
+    if (entry.json === undefined) {{
+      entry.json = JSON.stringify(other);
+    }}
+    if (json === entry.json) {{
+      return true;
+    }}
   }}
+  return false;
+}})();
+if (is_echo) {{
+  return;
 }}
 """
 
@@ -149,51 +268,181 @@ if ((comm_msg != null) && (Object.keys(comm_msg.content).length > 0)) {{
 """
 
 JS_CALLBACK = """
-function unique_events(events) {{
-  // Processes the event queue ignoring duplicate events
-  // of the same type
-  var unique = [];
-  var unique_events = [];
-  for (var i=0; i<events.length; i++) {{
-    var _tmpevent = events[i];
-    event = _tmpevent[0];
-    data = _tmpevent[1];
-    if (unique_events.indexOf(event)===-1) {{
-      unique.unshift(data);
-      unique_events.push(event);
-      }}
+function comm_settings() {{
+  // Throttle and timeout in ms, which may be overridden from Python
+  var capabilities = (window.PyViz.capabilities || {{}})["{comm_id}"] || {{}};
+  var settings = capabilities.settings || {{}};
+  return {{
+    throttle: (settings.throttle != null) ? settings.throttle : {debounce},
+    timeout: (settings.timeout != null) ? settings.timeout : {timeout},
+    trace: !!settings.trace
+  }};
+}}
+
+function coalesce(comm_status, key, data, merge) {{
+  // Coalesces pending events keeping only the latest event per key,
+  // optionally merging the data with the pending event key by key
+  var pending = comm_status.pending.get(key);
+  if (merge && (pending !== undefined)) {{
+    Object.assign(pending, data);
+  }} else {{
+    comm_status.pending.delete(key);
+    comm_status.pending.set(key, Object.assign({{}}, data));
+  }}
+  if (!comm_status.times.has(key)) {{
+    comm_status.times.set(key, Date.now());
   }}
-  return unique;
 }}
 
 function process_events(comm_status) {{
-  // Iterates over event queue and sends events via Comm
-  var events = unique_events(comm_status.event_buffer);
-  for (var i=0; i<events.length; i++) {{
-    var data = events[i];
-    var comm = window.PyViz.comms[data["comm_id"]];
-    comm.send(data);
+  // Sends the pending events via Comm, blocking further sends until
+  // all of them have been acknowledged
+  comm_status.scheduled = false;
+  if (comm_status.blocked || !comm_status.pending.size) {{
+    return;
+  }}
+  var events = Array.from(comm_status.pending.entries());
+  var times = comm_status.times;
+  comm_status.pending.clear();
+  comm_status.times = new Map();
+  var comm_manager = window.PyViz.comm_manager;
+  var time = Date.now();
+  var trace = comm_settings().trace;
+  // Every send is numbered so ACKs arriving after the timeout are ignored
+  var batch = comm_status.batch = (comm_status.batch || 0) + 1;
+  for (var [key, data] of events) {{
+    // Events queued in the kernel may be coalesced by their event key
+    var metadata = {{
+      event_key: key + '|' + Object.keys(data).sort().join(','),
+      batch: batch
+    }};
+    if (trace) {{
+      // The latencies of events acknowledged since the last send are
+      // reported back to Python with the next event
+      metadata.trace = {{event: times.get(key), sent: time, previous: comm_status.traces}};
+      comm_status.traces = [];
+    }}
+    if (comm_manager.send_msg) {{
+      comm_manager.send_msg(data["comm_id"], data, metadata);
+    }} else {{
+      window.PyViz.comms[data["comm_id"]].send(data);
+    }}
+  }}
+  comm_status.blocked = true;
+  comm_status.outstanding = events.length;
+  comm_status.time = time;
+  setTimeout(function() {{
+    // Unblock if the acknowledgements did not arrive in time
+    if (comm_status.blocked && (comm_status.batch === batch)) {{
+      comm_status.blocked = false;
+      schedule(comm_status);
+    }}
+  }}, comm_settings().timeout);
+}}
+
+function schedule(comm_status) {{
+  // Sends the pending events on the next animation frame once the
+  // throttle interval since the last send has elapsed
+  if (comm_status.scheduled || !comm_status.pending.size) {{
+    return;
+  }}
+  comm_status.scheduled = true;
+  var delay = Math.max(comm_status.time + comm_settings().throttle - Date.now(), 0);
+  setTimeout(function() {{
+    if ((typeof requestAnimationFrame === 'undefined') || document.hidden) {{
+      process_events(comm_status);
+    }} else {{
+      requestAnimationFrame(function() {{ process_events(comm_status); }});
+    }}
+  }}, delay);
+}}
+
+function summarize(samples) {{
+  // Summarizes latency samples in ms
+  var sorted = samples.slice().sort((a, b) => a - b);
+  var count = sorted.length;
+  function percentile(q) {{
+    return count ? sorted[Math.min(Math.ceil(q * count) - 1, count - 1)] : 0;
+  }}
+  return {{
+    count: count,
+    mean: count ? sorted.reduce((a, b) => a + b, 0) / count : 0,
+    p50: percentile(0.5),
+    p95: percentile(0.95),
+    max: count ? sorted[count - 1] : 0
+  }};
+}}
+
+function record_latency(comm_status, comm_id, trace) {{
+  // Splits the latency of an acknowledged event into its stages: the
+  // debounce before it was sent, the transport, i.e. the round trip
+  // time less the time spent in the kernel, which does not depend on
+  // the clocks of browser and kernel being in sync, the time queued
+  // in the kernel and the time spent in the handler
+  var now = Date.now();
+  var stages = {{
+    debounce: trace.sent - trace.event,
+    transport: (now - trace.sent) - (trace.end - trace.received),
+    queue: trace.start - trace.received,
+    handler: trace.end - trace.start,
+    total: now - trace.event
+  }};
+  comm_status.traces.push(stages);
+  var latency = window.PyViz.latency;
+  if (latency === undefined) {{
+    // The most recent samples of every stage are kept per comm
+    latency = window.PyViz.latency = {{
+      limit: 1000,
+      samples: {{}},
+      summary: function(comm_id) {{
+        var comm_ids = (comm_id === undefined) ? Object.keys(this.samples) : [comm_id];
+        var summary = {{}};
+        for (var stage of ['debounce', 'transport', 'queue', 'handler', 'total']) {{
+          var samples = [];
+          for (var id of comm_ids) {{
+            samples = samples.concat((this.samples[id] || {{}})[stage] || []);
+          }}
+          summary[stage] = summarize(samples);
+        }}
+        return summary;
+      }}
+    }};
+  }}
+  var samples = latency.samples[comm_id];
+  if (samples === undefined) {{
+    samples = latency.samples[comm_id] = {{}};
+  }}
+  for (var stage in stages) {{
+    var values = samples[stage] || (samples[stage] = []);
+    values.push(stages[stage]);
+    if (values.length > latency.limit) {{
+      values.shift();
+    }}
   }}
-  comm_status.event_buffer = [];
 }}
 
 function on_msg(msg) {{
-  // Receives acknowledgement from Python, processing event
-  // and unblocking Comm if event queue empty
+  // Receives acknowledgement from Python, unblocking the Comm and
+  // sending any pending events once all sent events are acknowledged
   var metadata = msg.metadata;
   var comm_id = metadata.comm_id
   var comm_status = window.PyViz.comm_status[comm_id];
-  if (comm_status.event_buffer.length) {{
-    process_events(comm_status);
-    comm_status.blocked = true;
-    comm_status.time = Date.now()+{debounce};
-  }} else {{
-    comm_status.blocked = false;
+  if (metadata.trace) {{
+    record_latency(comm_status, comm_id, metadata.trace);
+  }}
+  // ACKs of a batch the timeout stopped waiting for are ignored
+  var current = (metadata.batch === undefined) || (metadata.batch === comm_status.batch);
+  if (current && comm_status.blocked) {{
+    comm_status.outstanding -= 1;
+    if (comm_status.outstanding <= 0) {{
+      comm_status.blocked = false;
+      schedule(comm_status);
+    }}
   }}
-  comm_status.event_buffer = [];
   if ((metadata.msg_type == "Ready") && metadata.content) {{
     console.log("Python callback returned following output:", metadata.content);
-  }} else if (metadata.msg_type == "Error") {{
+  }} else if ((metadata.msg_type == "Error") && metadata.traceback) {{
+    // Repeated errors are reported without traceback and not logged
     console.log("Python failed with the following traceback:", metadata.traceback)
   }}
 }}
@@ -205,32 +454,118 @@ if (!comm) {{
   return
 }}
 
-// Initialize event queue and timeouts for Comm
+// Initialize pending events and timeouts for Comm
 var comm_status = window.PyViz.comm_status["{comm_id}"];
-if (comm_status === undefined) {{
-  comm_status = {{event_buffer: [], blocked: false, time: Date.now()}}
+if ((comm_status === undefined) || (comm_status.times === undefined)) {{
+  comm_status = {{
+    pending: new Map(), times: new Map(), traces: [], blocked: false,
+    scheduled: false, outstanding: 0, time: 0, batch: 0
+  }}
   window.PyViz.comm_status["{comm_id}"] = comm_status
 }}
 
-// Add current event to queue and process queue if not blocked
+// Coalesce current event with pending events, events are coalesced
+// per model and event type while widget updates to the same model
+// are merged key by key
+data['comm_id'] = "{comm_id}";
+var model_id = cb_obj.id || Object.keys(data).join(',');
 var event_name = cb_obj.event_name;
 if (event_name === undefined) {{
-  // we are a widget not an event... fake a key.
-  event_name = Object.keys(data).join(',');
-}}
-data['comm_id'] = "{comm_id}";
-var timeout = comm_status.time + {timeout};
-if ((comm_status.blocked && (Date.now() < timeout))) {{
-  comm_status.event_buffer.unshift([event_name, data]);
+  coalesce(comm_status, model_id, data, true);
 }} else {{
-  comm_status.event_buffer.unshift([event_name, data]);
-  setTimeout(function() {{ process_events(comm_status); }}, {debounce});
-  comm_status.blocked = true;
-  comm_status.time = Date.now()+{debounce};
+  coalesce(comm_status, model_id + ':' + event_name, data, false);
+}}
+
+// Send events unless waiting for acknowledgements
+if (!comm_status.blocked) {{
+  schedule(comm_status);
 }}
 """
 
 
+# Capture buffer of the StandardOutput active in the current context
+_stdout_capture = ContextVar("pyviz_comms_stdout", default=None)
+
+_stdout_lock = threading.Lock()
+
+
+class _CaptureBuffer:
+    """Accumulates captured output up to a maximum number of characters."""
+
+    __slots__ = ("_chunks", "_size", "dropped", "limit")
+
+    def __init__(self, limit=None):
+        self._chunks = []
+        self._size = 0
+        self.dropped = 0
+        self.limit = limit
+
+    def write(self, text):
+        if self.limit is not None:
+            remaining = self.limit - self._size
+            if len(text) > remaining:
+                self.dropped += len(text) - max(remaining, 0)
+                text = text[: max(remaining, 0)]
+        if text:
+            self._chunks.append(text)
+            self._size += len(text)
+        return len(text)
+
+    def getvalue(self):
+        return "".join(self._chunks)
+
+
+class _StdoutProxy:
+    """Stand-in for sys.stdout which routes output to the capture buffer
+    active in the current thread or asyncio task, falling back to the
+    wrapped stream when no capture is active.
+    """
+
+    # Number of captures active in any thread or task
+    captures = 0
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        buffer = _stdout_capture.get()
+        if buffer is None:
+            return self._stream.write(text)
+        return buffer.write(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if _stdout_capture.get() is None:
+            self._stream.flush()
+
+    def __getattr__(self, attr):
+        return getattr(self._stream, attr)
+
+
+def _install_stdout_proxy():
+    """Ensures sys.stdout is wrapped in a _StdoutProxy while a capture
+    is active, only replacing it if some other code has swapped out
+    the stream since.
+    """
+    with _stdout_lock:
+        _StdoutProxy.captures += 1
+        if not isinstance(sys.stdout, _StdoutProxy):
+            sys.stdout = _StdoutProxy(sys.stdout)
+
+
+def _uninstall_stdout_proxy():
+    """Restores the wrapped sys.stdout once the last active capture
+    ends, unless some other code has swapped out the proxy since.
+    """
+    with _stdout_lock:
+        _StdoutProxy.captures -= 1
+        while not _StdoutProxy.captures and isinstance(sys.stdout, _StdoutProxy):
+            sys.stdout = sys.stdout._stream
+
+
 class StandardOutput(list):
     """Context manager to capture standard output for any code it
     is wrapping and make it available as a list, e.g.:
@@ -239,263 +574,2668 @@ class StandardOutput(list):
     ...   print('This gets captured')
     >>> print(stdout[0])
     This gets captured
+
+    The capture is scoped to the current thread or asyncio task, so
+    concurrently running code is unaffected, and at most `limit`
+    characters of output are retained.
     """
 
+    def __init__(self, limit=None):
+        super().__init__()
+        self._limit = limit
+
     def __enter__(self):
-        self._stdout = sys.stdout
-        sys.stdout = self._stringio = StringIO()
+        _install_stdout_proxy()
+        self._buffer = _CaptureBuffer(self._limit)
+        self._token = _stdout_capture.set(self._buffer)
         return self
 
     def __exit__(self, *args):
-        self.extend(self._stringio.getvalue().splitlines())
-        sys.stdout = self._stdout
+        _stdout_capture.reset(self._token)
+        _uninstall_stdout_proxy()
+        self.extend(self._buffer.getvalue().splitlines())
+        if self._buffer.dropped:
+            self.append(f"[{self._buffer.dropped} characters of output truncated]")
 
 
-class Comm(param.Parameterized):
-    """Comm encompasses any uni- or bi-directional connection between
-    a python process and a frontend allowing passing of messages
-    between the two. A Comms class must implement methods
-    send data and handle received message events.
-
-    If the Comm has to be set up on the frontend a template to
-    handle the creation of the comms channel along with a message
-    handler to process incoming messages must be supplied.
+def _as_buffer(obj):
+    """Returns a flat, byte-oriented memoryview onto any object supporting
+    the buffer protocol (e.g. bytes, bytearray or a NumPy array) without
+    copying the underlying memory.
+    """
+    view = obj if isinstance(obj, memoryview) else memoryview(obj)
+    if not view.c_contiguous:
+        raise ValueError(
+            "Comm buffers must be C-contiguous, ensure the data is contiguous "
+            "(e.g. using numpy.ascontiguousarray) before sending it."
+        )
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
 
-    The template must accept three arguments:
 
-    * id          -  A unique id to register to register the comm under.
-    * msg_handler -  JS code which has the msg variable in scope and
-                     performs appropriate action for the supplied message.
-    * init_frame  -  The initial frame to render on the frontend.
+def _readonly_buffer(obj):
+    """Returns a read-only memoryview onto a received buffer without
+    copying the underlying memory.
     """
+    view = obj if isinstance(obj, memoryview) else memoryview(obj)
+    return view if view.readonly else view.toreadonly()
 
-    html_template = """
-    <div id="fig_{plot_id}">
-      {init_frame}
-    </div>
+
+def _json_default(obj):
+    """Serializes values the JSON encoder does not support, like the
+    Jupyter kernel does for comm messages, e.g. NumPy scalars and
+    arrays and datetimes, falling back to their string representation.
     """
+    if isinstance(obj, numbers.Integral):
+        return int(obj)
+    elif isinstance(obj, numbers.Real):
+        return float(obj)
+    elif hasattr(obj, "tolist"):
+        return obj.tolist()
+    elif hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
 
-    id = param.String(doc="Unique identifier of this Comm instance")
 
-    js_template = ""
+# Number of items sampled per container, nesting depth and size of
+# scalar values used when estimating message sizes
+_NBYTES_SAMPLE = 16
+_NBYTES_DEPTH = 4
+_NBYTES_OTHER = 8
 
-    def __init__(self, id=None, on_msg=None, on_error=None, on_stdout=None, on_open=None):
-        """Initializes a Comms object"""
-        self._on_msg = on_msg
-        self._on_error = on_error
-        self._on_stdout = on_stdout
-        self._on_open = on_open
-        self._comm = None
-        super().__init__(id=id if id else uuid.uuid4().hex)
 
-    def init(self, on_msg=None):
-        """Initializes comms channel."""
+def _nbytes(obj, depth=0):
+    """Cheaply estimates the size in bytes of a message payload.
 
-    def close(self):
-        """Closes the comm connection"""
+    Strings and buffers are measured exactly. Containers are estimated
+    from a sample of their first items scaled up to their length, so
+    the cost does not grow with the size of the payload, and other
+    values count as a fixed number of bytes.
+    """
+    if obj is None:
+        return 0
+    elif isinstance(obj, (str, bytes, bytearray)):
+        return len(obj)
+    elif isinstance(obj, memoryview):
+        return obj.nbytes
+    elif depth > _NBYTES_DEPTH:
+        return _NBYTES_OTHER
+    elif isinstance(obj, dict):
+        items = list(itertools.islice(obj.items(), _NBYTES_SAMPLE))
+        sample = sum(_nbytes(key) + _nbytes(value, depth + 1) + 4 for key, value in items)
+    elif isinstance(obj, (list, tuple)):
+        items = obj[:_NBYTES_SAMPLE]
+        sample = sum(_nbytes(value, depth + 1) + 1 for value in items)
+    else:
+        return getattr(obj, "nbytes", _NBYTES_OTHER)
+    return 2 + (sample * len(obj) // len(items) if items else 0)
 
-    def send(self, data=None, metadata=None, buffers=None):
-        """Sends data to the frontend"""
 
-    @classmethod
-    def decode(cls, msg):
-        """Decode incoming message, e.g. by parsing json."""
-        return msg
+class _Scheduler:
+    """Runs callbacks after a delay on a single shared daemon thread,
+    rather than starting a thread for every timeout.
+    """
 
-    @property
-    def comm(self):
-        if not self._comm:
-            raise ValueError("Comm has not been initialized")
-        return self._comm
+    def __init__(self):
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
 
-    def _handle_msg(self, msg):
-        """Decode received message before passing it to on_msg callback
-        if it has been defined.
-        """
-        comm_id = None
-        try:
-            stdout = []
-            msg = self.decode(msg)
-            comm_id = msg.pop("comm_id", None)
-            if self._on_msg:
-                # Comm swallows standard output so we need to capture
-                # it and then send it to the frontend
-                with StandardOutput() as stdout:
-                    self._on_msg(msg)
-                if stdout:
-                    with suppress(Exception):
-                        self._on_stdout(stdout)
-        except Exception as e:
-            with suppress(Exception):
-                self._on_error(e)
-            error = "\n"
-            frames = traceback.extract_tb(sys.exc_info()[2])
-            for frame in frames[-20:]:
-                fname, lineno, fn, _text = frame
-                error += f"{fname} {fn} L{lineno}\n"
-            error += f"\t{type(e).__name__}: {e!s}"
-            if stdout:
-                stdout = "\n\t" + "\n\t".join(stdout)
-                error = f"{stdout}\n{error}"
-            reply = {"msg_type": "Error", "traceback": error}
-        else:
-            stdout = "\n\t" + "\n\t".join(stdout) if stdout else ""
-            reply = {"msg_type": "Ready", "content": stdout}
+    def call_later(self, delay, callback, *args):
+        """Schedules a callback, returning a function cancelling it."""
+        entry = [time.monotonic() + delay, next(self._counter), callback, args]
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="pyviz_comms-scheduler", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return lambda: self._cancel(entry)
 
-        # Returning the comm_id in an ACK message ensures that
-        # the correct comms handle is unblocked
-        if comm_id:
-            reply["comm_id"] = comm_id
-        self.send(metadata=reply)
+    def _cancel(self, entry):
+        # Cancelled entries are skipped once due, releasing the callback
+        with self._condition:
+            entry[2:] = None, ()
 
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    delay = self._queue[0][0] - time.monotonic() if self._queue else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                _, _, callback, args = heapq.heappop(self._queue)
+            if callback is not None:
+                try:
+                    callback(*args)
+                except Exception:
+                    traceback.print_exc()
 
-class JupyterComm(Comm):
-    """JupyterComm provides a Comm for the notebook which is initialized
-    the first time data is pushed to the frontend.
-    """
 
-    js_template = """
-    function msg_handler(msg) {{
-      var metadata = msg.metadata;
-      var buffers = msg.buffers;
-      var msg = msg.content.data;
-      if ((metadata.msg_type == "Ready")) {{
-        if (metadata.content) {{
-          console.log("Python callback returned following output:", metadata.content);
-        }}
-      }} else if (metadata.msg_type == "Error") {{
-        console.log("Python failed with the following traceback:", metadata.traceback)
-      }} else {{
-        {msg_handler}
-      }}
-    }}
-    if ((window.PyViz == undefined) || (!window.PyViz.comm_manager)) {{
-      console.log("Could not find comm manager")
-    }} else {{
-      window.PyViz.comm_manager.register_target('{plot_id}', '{comm_id}', msg_handler);
-    }}
-    """
+_scheduler = _Scheduler()
 
-    def init(self):
-        from ipykernel.comm import Comm as IPyComm
 
-        self._comm = IPyComm(target_name=self.id, data={})
-        self._comm.on_msg(self._handle_msg)
-        if self._on_open:
-            self._on_open({})
+class _Histogram:
+    """Fixed bucket histogram of durations in seconds."""
 
-    @classmethod
-    def decode(cls, msg):
-        """Decodes messages following Jupyter messaging protocol.
-        If JSON decoding fails data is assumed to be a regular string.
+    __slots__ = ("buckets", "count", "max", "total")
+
+    bounds = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.max = 0
+        self.total = 0
+
+    def record(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Estimates a percentile as the upper bound of the bucket it
+        falls into, or the maximum if that is lower.
         """
-        return msg["content"]["data"]
+        if not self.count:
+            return 0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.buckets, strict=False):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
 
-    def close(self):
-        """Closes the comm connection"""
-        if self._comm:
-            self._comm.close()
+    def snapshot(self):
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+            "buckets": dict(zip(labels, self.buckets, strict=True)),
+        }
 
-    def send(self, data=None, metadata=None, buffers=None):
-        """Pushes data across comm socket."""
-        if buffers is None:
-            buffers = []
-        if not self._comm:
-            self.init()
-        self.comm.send(data, metadata=metadata, buffers=buffers)
 
+class CommStats:
+    """Records traffic and timing statistics of a single Comm.
 
-class JupyterCommJS(JupyterComm):
-    """JupyterCommJS provides a comms channel for the Jupyter notebook,
-    which is initialized on the frontend. This allows sending events
-    initiated on the frontend to python.
+    Counts the messages and bytes sent and received, the errors raised
+    by the on_msg callback (and how many of them repeated an earlier
+    error) and the messages superseded by newer events or dropped by
+    flow control. The latency histograms cover the on_msg callback, the time from
+    receiving a message to acknowledging it and, when flow control or
+    tracing are enabled, the credit round trip and the stages of the
+    interaction latency reported by the frontend.
     """
 
-    js_template = """
-    <script>
-      function msg_handler(msg) {{
-        var msg = msg.content.data;
-        var buffers = msg.buffers
-        {msg_handler}
-      }}
-      var comm = window.PyViz.comm_manager.get_client_comm("{comm_id}");
-      comm.on_msg(msg_handler);
-    </script>
-    """
+    trace_stages = ("debounce", "transport", "queue", "handler", "total")
 
-    @classmethod
-    def decode(cls, msg):
-        decoded = dict(msg["content"]["data"])
-        if "buffers" in msg:
-            decoded["_buffers"] = dict(enumerate(msg["buffers"]))
-        return decoded
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
 
-    def __init__(self, id=None, on_msg=None, on_error=None, on_stdout=None, on_open=None):
-        """Initializes a Comms object"""
-        from IPython import get_ipython
+    def reset(self):
+        with self._lock:
+            self.msgs_in = 0
+            self.msgs_out = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.errors = 0
+            self.suppressed_errors = 0
+            self.coalesced = 0
+            self.dropped = 0
+            self.handler_latency = _Histogram()
+            self.handler_to_ack_latency = _Histogram()
+            self.credit_latency = _Histogram()
+            self.trace_latency = {stage: _Histogram() for stage in self.trace_stages}
 
-        super().__init__(id, on_msg, on_error, on_stdout, on_open)
-        self.manager = get_ipython().kernel.comm_manager
-        self.manager.register_target(self.id, self._handle_open)
+    def record_in(self, nbytes):
+        with self._lock:
+            self.msgs_in += 1
+            self.bytes_in += nbytes
 
-    def close(self):
-        """Closes the comm connection"""
-        if self._comm:
-            self._comm.close()
-        elif self.id in self.manager.targets:
-            del self.manager.targets[self.id]
-        else:
-            raise AssertionError(f"JupyterCommJS {self.id} is already closed")
+    def record_out(self, nbytes):
+        with self._lock:
+            self.msgs_out += 1
+            self.bytes_out += nbytes
 
-    def _handle_open(self, comm, msg):
-        self._comm = comm
-        self._comm.on_msg(self._handle_msg)
-        if self._on_open:
-            self._on_open(msg)
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
 
-    def send(self, data=None, metadata=None, buffers=None):
-        """Pushes data across comm socket."""
-        if buffers is None:
-            buffers = []
-        self.comm.send(data, metadata=metadata, buffers=buffers)
+    def record_suppressed_error(self):
+        with self._lock:
+            self.suppressed_errors += 1
 
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
 
-class CommManager:
-    """The CommManager is an abstract baseclass for establishing
-    websocket comms on the client and the server.
-    """
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
 
-    js_manager = """
-    function CommManager() {
-    }
+    def record_credit(self, duration):
+        with self._lock:
+            self.credit_latency.record(duration)
 
-    CommManager.prototype.register_target = function() {
-    }
+    def record_handler(self, duration):
+        with self._lock:
+            self.handler_latency.record(duration)
 
-    CommManager.prototype.get_client_comm = function() {
-    }
+    def record_handler_to_ack(self, duration):
+        with self._lock:
+            self.handler_to_ack_latency.record(duration)
 
-    window.PyViz.comm_manager = CommManager()
-    """
+    def record_trace(self, stages):
+        """Records the stages of the latency of an interaction in ms."""
+        with self._lock:
+            for stage, histogram in self.trace_latency.items():
+                if isinstance(stages.get(stage), (int, float)):
+                    histogram.record(stages[stage] / 1000)
 
-    _comms = {}
+    def snapshot(self):
+        with self._lock:
+            return {
+                "msgs_in": self.msgs_in,
+                "msgs_out": self.msgs_out,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "errors": self.errors,
+                "suppressed_errors": self.suppressed_errors,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "handler_latency": self.handler_latency.snapshot(),
+                "handler_to_ack_latency": self.handler_to_ack_latency.snapshot(),
+                "credit_latency": self.credit_latency.snapshot(),
+                "trace_latency": {
+                    stage: histogram.snapshot() for stage, histogram in self.trace_latency.items()
+                },
+            }
 
-    server_comm = Comm
 
-    client_comm = Comm
+class CommRegistry:
+    """Registry of Comms indexed by their id.
+
+    Only weak references to the Comms are held, so a Comm is dropped
+    from the registry once it is closed or no longer referenced
+    elsewhere, e.g. by the kernel or the object that created it. If a
+    max_size is set the least recently used Comms beyond the limit are
+    closed and evicted.
+    """
+
+    def __init__(self, max_size=None):
+        self._comms = weakref.WeakValueDictionary()
+        self._order = OrderedDict()
+        self._lock = threading.RLock()
+        self.max_size = max_size
+
+    def __getitem__(self, comm_id):
+        return self._comms[comm_id]
+
+    def __setitem__(self, comm_id, comm):
+        with self._lock:
+            self._comms[comm_id] = comm
+            comm._registry = self
+            if self.max_size is not None:
+                self._order[comm_id] = None
+                self._order.move_to_end(comm_id)
+        self._evict()
+
+    def __delitem__(self, comm_id):
+        with self._lock:
+            del self._comms[comm_id]
+            self._order.pop(comm_id, None)
+
+    def __contains__(self, comm_id):
+        return comm_id in self._comms
+
+    def __iter__(self):
+        return iter(list(self._comms.keys()))
+
+    def __len__(self):
+        return len(self._comms)
+
+    def get(self, comm_id, default=None):
+        return self._comms.get(comm_id, default)
+
+    def pop(self, comm_id, *default):
+        with self._lock:
+            self._order.pop(comm_id, None)
+            return self._comms.pop(comm_id, *default)
+
+    def keys(self):
+        return list(self._comms.keys())
+
+    def values(self):
+        return list(self._comms.values())
+
+    def items(self):
+        return list(self._comms.items())
+
+    def touch(self, comm_id):
+        """Marks the Comm as recently used."""
+        if self.max_size is None:
+            return
+        with self._lock:
+            if comm_id in self._order:
+                self._order.move_to_end(comm_id)
+
+    def resize(self, max_size):
+        """Sets the maximum number of registered Comms, evicting the
+        least recently used Comms beyond the limit.
+        """
+        with self._lock:
+            self.max_size = max_size
+            if max_size is None:
+                self._order.clear()
+            else:
+                for comm_id in self._comms.keys():
+                    self._order.setdefault(comm_id, None)
+        self._evict()
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        evicted = []
+        with self._lock:
+            while len(self._comms) > self.max_size and self._order:
+                comm_id, _ = self._order.popitem(last=False)
+                comm = self._comms.pop(comm_id, None)
+                if comm is not None:
+                    evicted.append(comm)
+            # Drop the ids of Comms which were garbage collected
+            if len(self._order) > 2 * self.max_size:
+                self._order = OrderedDict(
+                    (comm_id, None) for comm_id in self._order if comm_id in self._comms
+                )
+        for comm in evicted:
+            with suppress(Exception):
+                comm.close()
+
+
+class CommRecorder:
+    """Records the messages exchanged by Comms to an append-only log
+    file, which a CommReplayer can replay, e.g. to turn a session
+    captured in production into a repeatable benchmark.
+
+    Each record is written as a little-endian uint32 header length,
+    followed by a JSON header holding the timestamp, direction and id
+    of the Comm, the data, metadata and buffer lengths of the message
+    and the binary buffers themselves. Received messages are recorded
+    as they arrive and sent messages as they are transmitted, i.e.
+    after encoding and compression. The log is written through a
+    buffer, so call flush or close to ensure all records are written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, direction, comm_id, data, metadata, buffers):
+        """Appends a message sent ('out') or received ('in') by a Comm.
+
+        Recording runs on the send and receive paths of the Comm, so a
+        message which cannot be recorded is reported and skipped rather
+        than raising an error.
+        """
+        try:
+            buffers = [_as_buffer(buf) for buf in buffers or []]
+            header = {
+                "time": time.time(),
+                "direction": direction,
+                "comm_id": comm_id,
+                "data": data,
+                "metadata": metadata or {},
+                "buffers": [buf.nbytes for buf in buffers],
+            }
+            encoded = json.dumps(header, separators=(",", ":"), default=_json_default).encode()
+            with self._lock:
+                if self._file is None:
+                    self._file = open(self.path, "ab")
+                self._file.write(struct.pack("<I", len(encoded)) + encoded)
+                for buf in buffers:
+                    self._file.write(buf)
+        except Exception:
+            traceback.print_exc()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CommReplayer:
+    """Replays the messages recorded by a CommRecorder, e.g.:
+
+        comm = LocalCommManager.get_client_comm(on_msg=callback)
+        LocalFrontend.get().open(comm.id)
+        CommReplayer("session.log").replay(comm, speed=10)
+
+    Only the received messages are replayed, i.e. the events sent by
+    the frontend, which are handled by the Comm like the original
+    messages, including sending the acknowledgements. The replay is
+    timed with the given clock and sleep functions.
+    """
+
+    def __init__(self, path, clock=time.perf_counter, sleep=time.sleep):
+        self.path = path
+        self._clock = clock
+        self._sleep = sleep
+
+    def __iter__(self):
+        """Iterates over the records in the log as dictionaries of the
+        time, direction, comm_id, data, metadata and buffers.
+        """
+        with open(self.path, "rb") as f:
+            while True:
+                prefix = f.read(4)
+                if len(prefix) < 4:
+                    return
+                (length,) = struct.unpack("<I", prefix)
+                record = json.loads(f.read(length))
+                record["buffers"] = [f.read(nbytes) for nbytes in record["buffers"]]
+                yield record
+
+    def replay(self, comm, speed=1, comm_id=None):
+        """Replays the received messages, optionally only those of the
+        Comm with the given comm_id, into a Comm, preserving the
+        intervals between them divided by the speed, or as fast as
+        possible if speed is None.
+
+        Returns a summary of the replay: the number of messages and
+        the duration in seconds of the replay and a histogram of the
+        handler latency, i.e. the time taken by the Comm to handle each
+        message, which includes the on_msg callback and sending the
+        acknowledgement unless messages are dispatched on a thread.
+        """
+        latency = _Histogram()
+        count = 0
+        start = self._clock()
+        first = None
+        for record in self:
+            if record["direction"] != "in" or comm_id not in (None, record["comm_id"]):
+                continue
+            if first is None:
+                first = record["time"]
+            elif speed is not None:
+                delay = start + (record["time"] - first) / speed - self._clock()
+                if delay > 0:
+                    self._sleep(delay)
+            msg = comm._pack(record["data"], record["metadata"], record["buffers"])
+            received = self._clock()
+            comm._handle_msg(msg)
+            latency.record(self._clock() - received)
+            count += 1
+        return {
+            "messages": count,
+            "duration": self._clock() - start,
+            "handler_latency": latency.snapshot(),
+        }
+
+
+class Codec:
+    """A Codec defines the wire format of the messages exchanged with
+    the frontend. The encode method converts the data of an outgoing
+    message into the data and binary buffers to transmit, while the
+    decode method reverses the conversion, returning the decoded data
+    and any remaining buffers.
+
+    Codecs are looked up by name in the registry and must have a
+    counterpart of the same name in window.PyViz.codecs on the
+    frontend. Which codec is used by a Comm is negotiated with the
+    frontend when the comm is opened.
+    """
+
+    name = None
+
+    # Registry of available codecs indexed by name
+    registry = {}
+
+    @classmethod
+    def register(cls, codec):
+        """Makes a codec instance available under its name."""
+        cls.registry[codec.name] = codec
+        return codec
+
+    def encode(self, data):
+        return data, []
+
+    def decode(self, data, buffers):
+        return data, buffers
+
+
+class JSONCodec(Codec):
+    """Passes the data through unchanged, leaving the encoding to the
+    JSON serialization of the Jupyter messaging protocol.
+    """
+
+    name = "json"
+
+
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+_UINT32 = struct.Struct("<I")
+_FLOAT64 = struct.Struct("<d")
+_INT64_RANGE = range(-(2**63), 2**63)
+
+(
+    _NONE,
+    _FALSE,
+    _TRUE,
+    _INT,
+    _FLOAT,
+    _STR,
+    _LIST,
+    _DICT,
+    _FLOAT64_ARRAY,
+    _INT32_ARRAY,
+    _BYTES,
+) = range(11)
+
+
+class BinaryCodec(Codec):
+    """Compact binary codec which packs the data into a single buffer,
+    avoiding the cost of JSON serialization for numeric payloads.
+
+    Each value is written as a one byte type tag followed by its
+    little-endian, struct-packed representation. Strings, bytes and
+    containers are prefixed with their length, while lists consisting
+    only of numbers are packed as contiguous int32 or float64 arrays.
+    Like JSON, tuples and arrays decode to lists and dictionary keys
+    to strings, while integers outside the int64 range raise an
+    OverflowError.
+    """
+
+    name = "binary"
+
+    def encode(self, data):
+        out = bytearray()
+        self._write(out, data)
+        return {}, [memoryview(out)]
+
+    def decode(self, data, buffers):
+        view = _as_buffer(buffers[0])
+        value, _ = self._read(view, 0)
+        return value, buffers[1:]
+
+    def _write(self, out, value):
+        if value is None:
+            out.append(_NONE)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif isinstance(value, int):
+            if value not in _INT64_RANGE:
+                raise OverflowError(
+                    f"BinaryCodec cannot encode integer {value} outside the int64 range"
+                )
+            out.append(_INT)
+            out += _INT64.pack(value)
+        elif isinstance(value, float):
+            out.append(_FLOAT)
+            out += _FLOAT64.pack(value)
+        elif isinstance(value, str):
+            out.append(_STR)
+            self._write_bytes(out, value.encode("utf-8"))
+        elif isinstance(value, dict):
+            out.append(_DICT)
+            out += _UINT32.pack(len(value))
+            for key, item in value.items():
+                self._write_bytes(out, str(key).encode("utf-8"))
+                self._write(out, item)
+        elif isinstance(value, (list, tuple)):
+            self._write_list(out, value)
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            out.append(_BYTES)
+            self._write_bytes(out, _as_buffer(value))
+        elif hasattr(value, "tolist"):
+            # NumPy arrays and scalars
+            self._write(out, value.tolist())
+        else:
+            raise TypeError(f"BinaryCodec cannot encode object of type {type(value).__name__}")
+
+    def _write_bytes(self, out, raw):
+        out += _UINT32.pack(len(raw))
+        out += raw
+
+    def _write_list(self, out, values):
+        kinds = set(map(type, values))
+        packed = None
+        if kinds == {int}:
+            # Integers outside the int32 range are written individually
+            with suppress(OverflowError):
+                packed = (_INT32_ARRAY, self._pack_array("i", values))
+        elif kinds and kinds <= {int, float}:
+            # Integers outside the int64 range are rejected when written individually
+            if all(value in _INT64_RANGE for value in values if type(value) is int):
+                packed = (_FLOAT64_ARRAY, self._pack_array("d", values))
+        if packed is None:
+            out.append(_LIST)
+            out += _UINT32.pack(len(values))
+            for value in values:
+                self._write(out, value)
+        else:
+            out.append(packed[0])
+            out += _UINT32.pack(len(values))
+            out += packed[1]
+
+    @staticmethod
+    def _pack_array(typecode, values):
+        packed = array.array(typecode, values)
+        if sys.byteorder == "big":
+            packed.byteswap()
+        return packed
+
+    @staticmethod
+    def _unpack_array(typecode, view):
+        unpacked = array.array(typecode)
+        unpacked.frombytes(view)
+        if sys.byteorder == "big":
+            unpacked.byteswap()
+        return unpacked.tolist()
+
+    def _read(self, view, offset):
+        tag = view[offset]
+        offset += 1
+        if tag == _NONE:
+            return None, offset
+        elif tag == _FALSE:
+            return False, offset
+        elif tag == _TRUE:
+            return True, offset
+        elif tag == _INT:
+            return _INT64.unpack_from(view, offset)[0], offset + 8
+        elif tag == _FLOAT:
+            return _FLOAT64.unpack_from(view, offset)[0], offset + 8
+        (size,) = _UINT32.unpack_from(view, offset)
+        offset += 4
+        if tag == _STR:
+            return str(view[offset : offset + size], "utf-8"), offset + size
+        elif tag == _BYTES:
+            return view[offset : offset + size], offset + size
+        elif tag == _FLOAT64_ARRAY:
+            end = offset + 8 * size
+            return self._unpack_array("d", view[offset:end]), end
+        elif tag == _INT32_ARRAY:
+            end = offset + 4 * size
+            return self._unpack_array("i", view[offset:end]), end
+        elif tag == _LIST:
+            values = []
+            for _ in range(size):
+                value, offset = self._read(view, offset)
+                values.append(value)
+            return values, offset
+        elif tag == _DICT:
+            values = {}
+            for _ in range(size):
+                (length,) = _UINT32.unpack_from(view, offset)
+                offset += 4
+                key = str(view[offset : offset + length], "utf-8")
+                values[key], offset = self._read(view, offset + length)
+            return values, offset
+        raise ValueError(f"BinaryCodec encountered unknown type tag {tag}")
+
+
+Codec.register(JSONCodec())
+Codec.register(BinaryCodec())
+
+
+def _flush_pending(*args):
+    """Flushes all Comms with queued messages, registered as an IPython
+    post_run_cell hook so batched messages are sent at the end of a cell.
+    """
+    for comm in list(Comm._pending):
+        with suppress(Exception):
+            comm.flush()
+
+
+class Comm(param.Parameterized):
+    """Comm encompasses any uni- or bi-directional connection between
+    a python process and a frontend allowing passing of messages
+    between the two. A Comms class must implement methods
+    send data and handle received message events.
+
+    If the Comm has to be set up on the frontend a template to
+    handle the creation of the comms channel along with a message
+    handler to process incoming messages must be supplied.
+
+    The template must accept three arguments:
+
+    * id          -  A unique id to register to register the comm under.
+    * msg_handler -  JS code which has the msg variable in scope and
+                     performs appropriate action for the supplied message.
+    * init_frame  -  The initial frame to render on the frontend.
+    """
+
+    html_template = """
+    <div id="fig_{plot_id}">
+      {init_frame}
+    </div>
+    """
+
+    batch = param.Boolean(
+        default=False,
+        doc="""
+        Whether to queue outgoing messages and flush them as a single
+        batched message, reducing the per-message overhead when many
+        small messages are sent in quick succession.""",
+    )
+
+    batch_period = param.Number(
+        default=0.05,
+        bounds=(0, None),
+        allow_None=True,
+        doc="""
+        Maximum time in seconds a batched message is held before the
+        queue is flushed. If None the queue is only flushed at the end
+        of a cell execution or when flush is called explicitly.""",
+    )
+
+    dispatch = param.Selector(
+        default="sync",
+        objects=["sync", "thread"],
+        doc="""
+        How received messages are dispatched to the on_msg callback:
+        'sync' processes them on the thread receiving the message,
+        'thread' processes them on the executor, preserving the order
+        of messages within the Comm while different Comms are
+        processed concurrently.""",
+    )
+
+    recorder = param.ClassSelector(
+        class_=CommRecorder,
+        doc="""
+        CommRecorder recording the messages sent and received by the
+        Comm to a log file, which may be shared by multiple Comms.""",
+    )
+
+    coalesce = param.Boolean(
+        default=False,
+        doc="""
+        Whether to coalesce events queued for processing by the on_msg
+        callback: when an event arrives while an earlier event with the
+        same event key is still queued, only the latest event is
+        processed while the earlier one is acknowledged right away.
+        Events sent by the frontend callbacks are keyed by model, event
+        and the properties they carry. Events are only queued with
+        dispatch='thread', while the kernel is busy processing earlier
+        events of the Comm.""",
+    )
+
+    executor = param.Parameter(
+        doc="""
+        Executor, e.g. a concurrent.futures.ThreadPoolExecutor, used to
+        process messages when dispatch='thread', defaults to a thread
+        pool shared by all Comms.""",
+    )
+
+    capture_stdout = param.Boolean(
+        default=None,
+        allow_None=True,
+        doc="""
+        Whether to capture output printed by the on_msg callback and
+        forward it to the on_stdout callback and the frontend. By
+        default output is only captured if it is consumed, i.e. if an
+        on_stdout callback is given or the frontend logs the output
+        returned in acknowledgements. If disabled no capture is
+        performed.""",
+    )
+
+    stdout_limit = param.Integer(
+        default=100_000,
+        bounds=(0, None),
+        allow_None=True,
+        doc="""
+        Maximum number of characters of output captured per message,
+        any output beyond the limit is discarded.""",
+    )
+
+    metrics = param.Boolean(
+        default=False,
+        doc="""
+        Whether to record traffic and timing statistics for this Comm,
+        which may be inspected using the stats property or collected
+        for all Comms using CommManager.get_stats.""",
+    )
+
+    trace = param.Boolean(
+        default=False,
+        doc="""
+        Whether to trace the latency of interactions, splitting it into
+        the time events are debounced by the frontend, the transport,
+        the time queued in the kernel and the time spent in the on_msg
+        callback. The frontend aggregates the latencies per Comm in
+        window.PyViz.latency, e.g. window.PyViz.latency.summary(), and
+        reports them back, so they are recorded in the stats if
+        metrics are enabled. Queueing before the kernel processes a
+        message is attributed to the transport.""",
+    )
+
+    error_window = param.Number(
+        default=5,
+        bounds=(0, None),
+        allow_None=True,
+        doc="""
+        Interval in seconds within which repeated errors raised at the
+        same location are reported to the frontend without traceback
+        once error_limit tracebacks have been sent, avoiding a flood
+        of tracebacks when a callback fails on every event. If None
+        the traceback of every error is sent.""",
+    )
+
+    error_limit = param.Integer(
+        default=1,
+        bounds=(1, None),
+        doc="""
+        Number of tracebacks sent for errors raised at the same location
+        within the error_window.""",
+    )
+
+    codecs = param.List(
+        default=["json"],
+        item_type=str,
+        doc="""
+        Names of the codecs in the Codec.registry the Comm may use to
+        encode messages, in order of preference, e.g. ["binary", "json"]
+        to opt into the compact binary codec. The codec is negotiated
+        with the frontend when the comm is opened, falling back to JSON
+        if the frontend supports none of them.""",
+    )
+
+    compress_threshold = param.Integer(
+        default=None,
+        bounds=(0, None),
+        allow_None=True,
+        doc="""
+        Size in bytes above which binary buffers are compressed with
+        zlib before they are sent, provided the frontend supports
+        decompressing them. Reduces the bandwidth required to send
+        large buffers, e.g. column data and images, at the cost of
+        CPU time. If None buffers are never compressed.""",
+    )
+
+    max_in_flight = param.Integer(
+        default=None,
+        bounds=(1, None),
+        allow_None=True,
+        doc="""
+        Maximum number of messages sent to the frontend which it has not
+        yet reported as applied, bounding the latency when messages are
+        produced faster than the frontend can apply them. Only takes
+        effect if the frontend supports returning credits for applied
+        messages. If None flow control is disabled.""",
+    )
+
+    flow_policy = param.Selector(
+        default="block",
+        objects=["block", "drop", "merge"],
+        doc="""
+        What happens to messages sent while max_in_flight messages are
+        in flight: 'block' waits until the frontend catches up, queueing
+        the message instead when sending from the main thread, which
+        has to remain free to receive the credits, or when flushing
+        batched messages, 'drop' discards the message and 'merge'
+        queues messages and sends them as a single batched message
+        once the frontend catches up.""",
+    )
+
+    chunk_size = param.Integer(
+        default=None,
+        bounds=(1, None),
+        allow_None=True,
+        doc="""
+        Size in bytes above which messages are split into sequenced
+        fragments of at most this size, which the frontend reassembles
+        before handling the message, provided it supports doing so.
+        Keeps large messages, e.g. big patches, below the message size
+        limits of servers and proxies and allows other messages to be
+        sent in between fragments. If None messages are never split.""",
+    )
+
+    bulk_threshold = param.Integer(
+        default=None,
+        bounds=(0, None),
+        allow_None=True,
+        doc="""
+        Size in bytes above which messages are treated as bulk data and
+        sent by a background thread, one fragment at a time if chunking
+        is enabled, so acknowledgements and errors sent meanwhile are
+        transmitted ahead of the queued bulk data rather than waiting
+        for it, e.g. unblocking the frontend callbacks while a large
+        plot update is still in transit. Other messages are sent in
+        order after the queued bulk data. If None all messages are
+        sent in order as they are produced.""",
+    )
+
+    event_throttle = param.Integer(
+        default=None,
+        bounds=(0, None),
+        allow_None=True,
+        doc="""
+        Minimum interval in milliseconds between batches of events sent
+        by the frontend, overriding the debounce the callback code was
+        rendered with. Events occurring in the meantime are coalesced,
+        keeping only the latest state per model and event.""",
+    )
+
+    event_timeout = param.Integer(
+        default=None,
+        bounds=(0, None),
+        allow_None=True,
+        doc="""
+        Time in milliseconds the frontend waits for events to be
+        acknowledged before sending further events, overriding the
+        timeout the callback code was rendered with.""",
+    )
+
+    id = param.String(doc="Unique identifier of this Comm instance")
+
+    js_template = ""
+
+    # Parameters mirrored in plain attributes by _update_params. They
+    # are updated whenever one of them is set rather than by watchers,
+    # which would make param create Parameter objects for every Comm,
+    # making Comms costly to create
+    _mirrored_params = frozenset(
+        (
+            "batch",
+            "dispatch",
+            "coalesce",
+            "capture_stdout",
+            "stdout_limit",
+            "metrics",
+            "compress_threshold",
+            "max_in_flight",
+            "flow_policy",
+            "chunk_size",
+            "bulk_threshold",
+            "error_window",
+            "error_limit",
+            "recorder",
+            "trace",
+        )
+    )
+
+    # Default values of the mirrored parameters indexed by Comm class
+    _mirrored_default_values = weakref.WeakKeyDictionary()
+
+    # Handlers for control messages, which are processed as soon as
+    # they are received rather than passed to the on_msg callback,
+    # indexed by msg_type
+    _control_handlers = {}
+
+    # Whether the frontend logs the output returned in acknowledgements
+    _logs_stdout = False
+
+    # Seconds after which the ids of requests cancelled by the frontend
+    # are forgotten if no response was suppressed in the meantime
+    _cancelled_expiry = 60
+
+    # Comms with queued batched messages
+    _pending = set()
+
+    # Whether the IPython hook flushing queued messages is registered
+    _flush_hook_registered = False
+
+    # Thread pool shared by all Comms using thread dispatch
+    _default_executor = None
+
+    def __init__(
+        self,
+        id=None,
+        on_msg=None,
+        on_error=None,
+        on_stdout=None,
+        on_open=None,
+        on_request=None,
+        **params,
+    ):
+        """Initializes a Comms object"""
+        self._on_msg = on_msg
+        self._on_error = on_error
+        self._on_stdout = on_stdout
+        self._on_open = on_open
+        self._on_request = on_request
+        self._errors = {}
+        self._errors_lock = threading.Lock()
+        self._requests = {}
+        self._request_ids = itertools.count()
+        self._request_tasks = {}
+        self._cancelled_requests = set()
+        self._requests_lock = threading.Lock()
+        self._comm = None
+        self._batch_queue = []
+        self._batch_lock = threading.RLock()
+        self._cancel_flush = None
+        self._tasks = set()
+        self._inbox = deque()
+        self._inbox_keys = {}
+        self._inbox_lock = threading.Lock()
+        self._draining = False
+        self._stats = None
+        self._registry = None
+        self._codec = None
+        self._compression = None
+        self._credits = False
+        self._credits_offered = False
+        self._chunking = False
+        self._in_flight = 0
+        self._in_flight_since = deque()
+        self._backlog = deque()
+        self._flow = threading.Condition()
+        self._bulk = deque()
+        self._bulk_lane = threading.Condition()
+        self._bulk_sending = False
+        self._bulk_worker = None
+        self._bulk_stopped = False
+        self._write_lock = threading.Lock()
+        self._mirrored = False
+        super().__init__(id=id if id else uuid.uuid4().hex, **params)
+        # The parameters were just set, so they are mirrored from the
+        # values passed in rather than reading every parameter back
+        defaults = self._mirrored_defaults()
+        self._mirror({**defaults, **{k: v for k, v in params.items() if k in defaults}})
+        self._mirrored = True
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self._mirrored_params and self._mirrored:
+            self._update_params()
+
+    @classmethod
+    def _mirrored_defaults(cls):
+        """Default values of the mirrored parameters, cached per class
+        until a mirrored parameter is set on any Comm class.
+        """
+        defaults = Comm._mirrored_default_values.get(cls)
+        if defaults is None:
+            defaults = {name: getattr(cls, name) for name in cls._mirrored_params}
+            Comm._mirrored_default_values[cls] = defaults
+        return defaults
+
+    @staticmethod
+    def _clear_mirrored_defaults(*events):
+        Comm._mirrored_default_values.clear()
+
+    def _update_params(self):
+        self._mirror({name: getattr(self, name) for name in self._mirrored_params})
+
+    def _mirror(self, values):
+        # Parameter access is comparatively slow, so the values consulted
+        # for every message are mirrored in plain attributes
+        self._batch = values["batch"]
+        self._max_in_flight = values["max_in_flight"]
+        self._flow_policy = values["flow_policy"]
+        self._compress_threshold = values["compress_threshold"]
+        self._chunk_size = values["chunk_size"]
+        self._bulk_threshold = values["bulk_threshold"]
+        self._error_window = values["error_window"]
+        self._error_limit = values["error_limit"]
+        self._dispatch = values["dispatch"]
+        self._coalesce = values["coalesce"]
+        self._recorder = values["recorder"]
+        self._trace = values["trace"]
+        capture = values["capture_stdout"]
+        if capture is None:
+            capture = self._on_stdout is not None or self._logs_stdout
+        self._stdout_limit = values["stdout_limit"] if capture else -1
+        if not values["metrics"]:
+            self._stats = None
+        elif self._stats is None:
+            self._stats = CommStats()
+
+    @property
+    def stats(self):
+        """Snapshot of the statistics recorded for this Comm, or None if
+        metrics are disabled.
+        """
+        return None if self._stats is None else self._stats.snapshot()
+
+    def reset_stats(self):
+        """Resets the statistics recorded for this Comm."""
+        if self._stats is not None:
+            self._stats.reset()
+
+    def init(self, on_msg=None):
+        """Initializes comms channel."""
+
+    def close(self):
+        """Closes the comm connection"""
+        self._unregister()
+
+    def _unregister(self, *args):
+        """Removes the Comm from the registry it was added to and
+        releases any senders blocked by flow control.
+        """
+        if self._registry is not None:
+            self._registry.pop(self.id, None)
+            self._registry = None
+        # No more credits will arrive, so release any blocked senders
+        with self._flow:
+            self._credits = False
+            self._backlog.clear()
+            self._flow.notify_all()
+        # Nor will any responses
+        with self._requests_lock:
+            request_ids = list(self._requests)
+        for request_id in request_ids:
+            self._fail_request(request_id, RuntimeError(f"Comm {self.id} was closed"))
+
+    def request(self, data=None, buffers=None, timeout=None):
+        """Sends a request to the frontend, returning a
+        concurrent.futures.Future resolving to the result of the
+        request handler registered on the frontend with
+        comm_manager.on_request.
+
+        The future fails with a RuntimeError if the handler raised an
+        error and with a TimeoutError if no response arrives within
+        the timeout in seconds. Cancelling the future aborts the
+        request on the frontend. Responses are received on the main
+        thread of the kernel, so rather than blocking it waiting for
+        the result, await the future, e.g. using asyncio.wrap_future.
+        """
+        from concurrent.futures import Future
+
+        request_id = str(next(self._request_ids))
+        future = Future()
+        with self._requests_lock:
+            self._requests[request_id] = future
+        if timeout is not None:
+            cancel = _scheduler.call_later(
+                timeout,
+                self._fail_request,
+                request_id,
+                TimeoutError(f"Request timed out after {timeout} seconds"),
+            )
+            future.add_done_callback(lambda future: cancel())
+        future.add_done_callback(lambda future: self._request_done(request_id, future))
+        self.send(data, {"msg_type": "Request", "request_id": request_id}, buffers)
+        return future
+
+    def _fail_request(self, request_id, error):
+        from concurrent.futures import InvalidStateError
+
+        with self._requests_lock:
+            future = self._requests.get(request_id)
+        if future is not None:
+            with suppress(InvalidStateError):
+                future.set_exception(error)
+
+    def _request_done(self, request_id, future):
+        with self._requests_lock:
+            if self._requests.pop(request_id, None) is None:
+                return
+        # Aborts the request on the frontend unless it responded
+        if future.cancelled() or isinstance(future.exception(), TimeoutError):
+            self.send(metadata={"msg_type": "Cancel", "request_id": request_id})
+
+    def _resolve_request(self, request_id, result=None, error=None):
+        """Resolves the future of a request the frontend responded to."""
+        from concurrent.futures import InvalidStateError
+
+        with self._requests_lock:
+            future = self._requests.pop(request_id, None)
+        if future is None:
+            return
+        with suppress(InvalidStateError):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def send(self, data=None, metadata=None, buffers=None):
+        """Sends data to the frontend, queueing it if batching is enabled.
+
+        Buffers may be any C-contiguous object supporting the buffer
+        protocol, e.g. bytes, memoryviews or NumPy arrays, and are
+        passed on as memoryviews without copying the data.
+        """
+        buffers = [_as_buffer(buf) for buf in buffers] if buffers else []
+        if self._codec is not None and isinstance(data, dict):
+            data, encoded = self._codec.encode(data)
+            metadata = dict(metadata or {}, codec=self._codec.name)
+            buffers = encoded + buffers
+        if buffers and self._compression is not None and self._compress_threshold is not None:
+            metadata = self._compress(buffers, metadata)
+        if self._registry is not None:
+            self._registry.touch(self.id)
+        if self._recorder is not None:
+            self._recorder.record("out", self.id, data, metadata, buffers)
+        if self._stats is not None:
+            self._stats.record_out(
+                _nbytes(data) + _nbytes(metadata) + sum(buf.nbytes for buf in buffers)
+            )
+        if not self._batch:
+            self._transmit(data, metadata, buffers)
+            return
+        with self._batch_lock:
+            self._batch_queue.append((data, metadata, buffers))
+            Comm._pending.add(self)
+            if self._cancel_flush is None and self.batch_period is not None:
+                self._cancel_flush = _scheduler.call_later(self.batch_period, self.flush)
+        self._register_flush_hook()
+
+    @classmethod
+    def _register_flush_hook(cls):
+        if Comm._flush_hook_registered or not _in_ipython:
+            return
+        from IPython import get_ipython
+
+        ip = get_ipython()
+        if ip is None or not hasattr(ip, "events"):
+            return
+        ip.events.register("post_run_cell", _flush_pending)
+        Comm._flush_hook_registered = True
+
+    def flush(self):
+        """Sends all queued messages as a single batched message."""
+        with self._batch_lock:
+            queue, self._batch_queue = self._batch_queue, []
+            Comm._pending.discard(self)
+            if self._cancel_flush is not None:
+                self._cancel_flush()
+                self._cancel_flush = None
+            # Flushing must never wait for credits while holding the
+            # lock, which would block any further sends, including the
+            # acknowledgements sent by the thread receiving the credits
+            if queue:
+                self._transmit(*self._merge(queue), block=False)
+
+    @classmethod
+    def _merge(cls, queue):
+        """Merges a queue of messages into a single batched message."""
+        if len(queue) == 1:
+            return queue[0]
+        parts, buffers = [], []
+        for part_data, part_metadata, part_buffers in queue:
+            parts.append(
+                {
+                    "data": part_data,
+                    "metadata": part_metadata or {},
+                    "buffers": len(part_buffers),
+                }
+            )
+            buffers.extend(part_buffers)
+        return {"parts": parts}, {"msg_type": "Batch"}, buffers
+
+    @classmethod
+    def _is_reply(cls, data, metadata):
+        """Whether a message is or contains an acknowledgement, which
+        must never be held back by flow control.
+        """
+        msg_type = (metadata or {}).get("msg_type")
+        if msg_type == "Batch":
+            return any(cls._is_reply(None, part["metadata"]) for part in data["parts"])
+        return msg_type in ("Ready", "Error", "Response", "Cancel")
+
+    @classmethod
+    def _is_priority(cls, data, metadata):
+        """Whether a message consists only of replies, i.e. the
+        acknowledgements, errors and responses which may be sent ahead
+        of queued bulk data.
+        """
+        msg_type = (metadata or {}).get("msg_type")
+        if msg_type == "Batch":
+            return all(cls._is_priority(None, part["metadata"]) for part in data["parts"])
+        return msg_type in ("Ready", "Error", "Response", "Cancel")
+
+    def _transmit(self, data, metadata, buffers, block=True):
+        """Transmits a message, applying flow control if the frontend
+        returns credits for the messages it has applied. Unless block
+        is enabled the message is queued rather than waiting for credits.
+        """
+        if not self._credits or self._max_in_flight is None:
+            with self._flow:
+                # Until the frontend replies to the offer it may already
+                # return credits for these messages, so they are counted
+                if self._credits_offered:
+                    self._in_flight += 1
+            self._send(data, metadata, buffers)
+            return
+        with self._flow:
+            if (self._backlog or self._in_flight >= self._max_in_flight) and not self._is_reply(
+                data, metadata
+            ):
+                if self._flow_policy == "drop":
+                    if self._stats is not None:
+                        self._stats.record_drop()
+                    return
+                elif self._flow_policy == "merge" or not (block and self._can_block()):
+                    self._backlog.append((data, metadata, buffers))
+                    return
+                while self._credits and (self._backlog or self._in_flight >= self._max_in_flight):
+                    self._flow.wait()
+            self._send_counted(data, metadata, buffers)
+
+    def _can_block(self):
+        """Whether the current thread may wait for credits, which the
+        thread receiving the credits, i.e. the main thread of the kernel,
+        must not.
+        """
+        return threading.current_thread() is not threading.main_thread()
+
+    def _send_counted(self, data, metadata, buffers):
+        self._in_flight += 1
+        if self._stats is not None:
+            self._in_flight_since.append(time.perf_counter())
+        self._send(data, metadata, buffers)
+
+    def _release(self, credits):
+        """Releases credits returned by the frontend for applied messages,
+        sending queued messages as the window allows.
+        """
+        with self._flow:
+            # The oldest messages may have been sent without a timestamp
+            untimed = self._in_flight - len(self._in_flight_since)
+            self._in_flight = max(self._in_flight - credits, 0)
+            if self._stats is not None:
+                now = time.perf_counter()
+                for _ in range(min(credits - untimed, len(self._in_flight_since))):
+                    self._stats.record_credit(now - self._in_flight_since.popleft())
+            if self._backlog and self._flow_policy == "merge":
+                if self._max_in_flight is None or self._in_flight < self._max_in_flight:
+                    backlog, self._backlog = list(self._backlog), deque()
+                    self._send_counted(*self._merge(backlog))
+            else:
+                # Flow control may have been disabled in the meantime
+                while self._backlog and (
+                    self._max_in_flight is None or self._in_flight < self._max_in_flight
+                ):
+                    self._send_counted(*self._backlog.popleft())
+            self._flow.notify_all()
+
+    def _compress(self, buffers, metadata):
+        """Compresses the buffers exceeding the compress_threshold in
+        place, returning metadata listing the indices of the compressed
+        buffers. Buffers which do not shrink are sent uncompressed.
+        """
+        compressed = []
+        for i, buf in enumerate(buffers):
+            if buf.nbytes <= self._compress_threshold:
+                continue
+            deflated = zlib.compress(buf)
+            if len(deflated) < buf.nbytes:
+                buffers[i] = memoryview(deflated)
+                compressed.append(i)
+        if not compressed:
+            return metadata
+        return dict(metadata or {}, compressed=compressed)
+
+    def _chunk(self, data, metadata, buffers):
+        """Returns the messages to transmit for a message, splitting
+        messages larger than the chunk_size into sequenced fragments.
+
+        The message is serialized as a little-endian uint32 header
+        length, followed by a JSON header holding the data, metadata and
+        buffer lengths and the buffers themselves. The fragments carry
+        consecutive slices of the serialized message as their buffers,
+        without copying the original buffers.
+        """
+        if not (self._chunking and self._chunk_size):
+            return [(data, metadata, buffers)]
+        size = self._chunk_size
+        buffers = [_as_buffer(buf) for buf in buffers]
+        lengths = [buf.nbytes for buf in buffers]
+        header = json.dumps(
+            {"data": data, "metadata": metadata, "buffers": lengths}, default=_json_default
+        ).encode()
+        if 4 + len(header) + sum(lengths) <= size:
+            return [(data, metadata, buffers)]
+        parts = [memoryview(struct.pack("<I", len(header)) + header), *buffers]
+        fragments, current, filled = [], [], 0
+        for part in parts:
+            while part.nbytes:
+                view = part[: size - filled]
+                part = part[view.nbytes :]
+                current.append(view)
+                filled += view.nbytes
+                if filled == size:
+                    fragments.append(current)
+                    current, filled = [], 0
+        if current:
+            fragments.append(current)
+        fragment_id = uuid.uuid4().hex
+        return [
+            (
+                None,
+                {
+                    "msg_type": "Fragment",
+                    "fragment": {"id": fragment_id, "index": i, "count": len(fragments)},
+                },
+                fragment,
+            )
+            for i, fragment in enumerate(fragments)
+        ]
+
+    def _send(self, data, metadata, buffers):
+        """Transmits a single message over the underlying connection."""
+
+    @classmethod
+    def decode(cls, msg):
+        """Decode incoming message, e.g. by parsing json."""
+        return msg
+
+    def _decode(self, msg):
+        """Decodes a received message, applying the codec the frontend
+        encoded it with.
+        """
+        return self.decode(msg)
+
+    def _capabilities(self):
+        """Capabilities of the Comm offered to the frontend."""
+        return {
+            "codecs": [name for name in self.codecs if name in Codec.registry],
+            "compression": ["deflate"],
+            "credits": self.max_in_flight is not None,
+            "chunking": self.chunk_size is not None,
+        }
+
+    def _settings(self):
+        """Event settings applied by the frontend callbacks, omitting
+        those which are not overridden.
+        """
+        settings = {
+            "throttle": self.event_throttle,
+            "timeout": self.event_timeout,
+            "trace": self.trace or None,
+        }
+        return {key: value for key, value in settings.items() if value is not None}
+
+    def _negotiate(self, offer):
+        """Selects the capabilities supported by both the Comm and the
+        frontend from the capabilities offered by the frontend.
+        """
+        codecs = offer.get("codecs", [])
+        codec = next((name for name in self._capabilities()["codecs"] if name in codecs), "json")
+        compression = "deflate" if "deflate" in offer.get("compression", []) else None
+        credits = self.max_in_flight is not None and bool(offer.get("credits"))
+        chunking = self.chunk_size is not None and bool(offer.get("chunking"))
+        return {
+            "codec": codec,
+            "compression": compression,
+            "credits": credits,
+            "chunking": chunking,
+        }
+
+    def _apply_capabilities(self, capabilities):
+        """Applies the negotiated capabilities."""
+        codec = Codec.registry.get(capabilities.get("codec"))
+        self._codec = None if codec is None or codec.name == "json" else codec
+        self._compression = "deflate" if capabilities.get("compression") == "deflate" else None
+        with self._flow:
+            self._credits = bool(capabilities.get("credits"))
+            if self._credits_offered and not self._credits:
+                # No credits will be returned for the messages counted so far
+                self._in_flight = 0
+                self._in_flight_since.clear()
+            self._credits_offered = False
+        self._chunking = bool(capabilities.get("chunking"))
+
+    @property
+    def comm(self):
+        if not self._comm:
+            raise ValueError("Comm has not been initialized")
+        return self._comm
+
+    def _handle_msg(self, msg):
+        """Dispatches a received message for processing, either directly
+        or on the executor depending on the dispatch mode.
+        """
+        if self._control_handlers:
+            handler = self._control_handlers.get(self._msg_type(msg))
+            if handler is not None:
+                getattr(self, handler)(msg)
+                return
+        received = None
+        if self._registry is not None:
+            self._registry.touch(self.id)
+        if self._recorder is not None:
+            self._recorder.record("in", self.id, *self._unpack(msg))
+        if self._stats is not None:
+            received = time.perf_counter()
+            self._stats.record_in(self._message_size(msg))
+        elif self._trace:
+            received = time.perf_counter()
+        if self._dispatch == "sync":
+            self._process_msg(msg, received)
+            return
+        superseded = None
+        with self._inbox_lock:
+            key = self._metadata(msg).get("event_key") if self._coalesce else None
+            entry = [msg, received, key]
+            if key is not None:
+                # Latest wins, the superseded entry is skipped when drained
+                queued = self._inbox_keys.get(key)
+                if queued is not None:
+                    superseded, queued[0] = queued[0], None
+                self._inbox_keys[key] = entry
+            self._inbox.append(entry)
+            drain = not self._draining
+            self._draining = True
+        if superseded is not None:
+            self._acknowledge_superseded(superseded)
+        if drain:
+            self._get_executor().submit(self._drain_inbox)
+
+    def _get_executor(self):
+        if self.executor is not None:
+            return self.executor
+        if Comm._default_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            Comm._default_executor = ThreadPoolExecutor(thread_name_prefix="pyviz_comms")
+        return Comm._default_executor
+
+    def _drain_inbox(self):
+        """Processes queued messages in order until the inbox is empty,
+        ensuring a Comm is only ever processed by one thread at a time.
+        """
+        while True:
+            with self._inbox_lock:
+                if not self._inbox:
+                    self._draining = False
+                    return
+                entry = self._inbox.popleft()
+                msg, received, key = entry
+                if key is not None and self._inbox_keys.get(key) is entry:
+                    del self._inbox_keys[key]
+            if msg is not None:
+                self._process_msg(msg, received)
+
+    def _acknowledge_superseded(self, msg):
+        """Acknowledges a queued message superseded by a newer message
+        with the same event key without processing it, so the frontend
+        does not wait for it.
+        """
+        comm_id = None
+        with suppress(Exception):
+            comm_id = self._decode(msg).get("comm_id")
+        if self._stats is not None:
+            self._stats.record_coalesced()
+        reply = {"msg_type": "Ready", "content": "", "superseded": True}
+        self._send_reply(reply, comm_id, batch=self._metadata(msg).get("batch"))
+
+    def _message_size(self, msg):
+        """Estimates the size in bytes of a received message."""
+        return _nbytes(msg)
+
+    def _msg_type(self, msg):
+        """Returns the msg_type of a received message, if any."""
+        return None
+
+    def _unpack(self, msg):
+        """Returns the data, metadata and buffers of a received message."""
+        return msg, {}, []
+
+    def _pack(self, data, metadata, buffers):
+        """Builds a received message from its data, metadata and buffers,
+        reversing _unpack.
+        """
+        return data
+
+    def _metadata(self, msg):
+        """Returns the metadata of a received message."""
+        return {}
+
+    def _process_request(self, msg):
+        """Responds to a request from the frontend with the result of
+        the on_request callback, which may return a JSON serializable
+        value, a bytes-like object sent as a binary buffer or an
+        awaitable resolving to either.
+        """
+        request_id = self._metadata(msg).get("request_id")
+        try:
+            data = self._decode(msg)
+            if isinstance(data, dict):
+                data.pop("comm_id", None)
+            if self._on_request is None:
+                raise RuntimeError(f"Comm {self.id} has no on_request callback")
+            result = self._on_request(data)
+            if inspect.isawaitable(result):
+                task = self._schedule(self._await_request(result, request_id))
+                if task is not None and not task.done():
+                    with self._requests_lock:
+                        self._request_tasks[request_id] = task
+                return
+        except Exception as e:
+            self._send_response(request_id, error=e)
+        else:
+            self._send_response(request_id, result)
+
+    async def _await_request(self, awaitable, request_id):
+        import asyncio
+
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            self._send_response(request_id, error=e)
+        else:
+            self._send_response(request_id, result)
+        finally:
+            with self._requests_lock:
+                self._request_tasks.pop(request_id, None)
+
+    def _cancel_request(self, request_id):
+        """Cancels the processing of a request aborted by the frontend.
+
+        If the request is not being processed asynchronously its
+        response is suppressed instead, unless it was already sent, so
+        the cancellation is forgotten after _cancelled_expiry seconds.
+        """
+        with self._requests_lock:
+            task = self._request_tasks.pop(request_id, None)
+            if task is None:
+                self._cancelled_requests.add(request_id)
+        if task is not None:
+            task.cancel()
+        else:
+            _scheduler.call_later(self._cancelled_expiry, self._forget_cancelled, request_id)
+
+    def _forget_cancelled(self, request_id):
+        with self._requests_lock:
+            self._cancelled_requests.discard(request_id)
+
+    def _send_response(self, request_id, result=None, error=None):
+        with self._requests_lock:
+            cancelled = request_id in self._cancelled_requests
+            self._cancelled_requests.discard(request_id)
+        if cancelled:
+            return
+        metadata = {"msg_type": "Response", "request_id": request_id}
+        if error is not None:
+            with suppress(Exception):
+                self._on_error(error)
+            metadata["error"] = f"{type(error).__name__}: {error}"
+            self.send(metadata=metadata)
+        elif isinstance(result, (bytes, bytearray, memoryview)):
+            metadata["binary"] = True
+            self.send({}, metadata, [result])
+        else:
+            self.send({"result": result}, metadata)
+        if self._batch:
+            self.flush()
+
+    def _process_msg(self, msg, received=None):
+        """Decode received message before passing it to on_msg callback
+        if it has been defined.
+
+        If the on_msg callback returns an awaitable, e.g. because it is
+        a coroutine function, it is scheduled on the running asyncio
+        event loop and the acknowledgement is only sent once it has
+        completed, allowing other messages to be processed meanwhile.
+        """
+        if self._msg_type(msg) == "Request":
+            self._process_request(msg)
+            return
+        comm_id = None
+        metadata = self._metadata(msg)
+        batch = metadata.get("batch")
+        trace = metadata.get("trace") if self._trace else None
+        if trace is not None and self._stats is not None:
+            for stages in trace.pop("previous", None) or []:
+                self._stats.record_trace(stages)
+        start = None if self._stats is None and trace is None else time.perf_counter()
+        try:
+            stdout = []
+            msg = self._decode(msg)
+            comm_id = msg.pop("comm_id", None)
+            if self._on_msg:
+                # Comm swallows standard output so we need to capture
+                # it and then send it to the frontend
+                with self._capture_stdout() as stdout:
+                    result = self._on_msg(msg)
+                self._forward_stdout(stdout)
+                if inspect.isawaitable(result):
+                    self._schedule(self._await_msg(result, comm_id, received, start, trace, batch))
+                    return
+        except Exception as e:
+            reply = self._error_reply(e, stdout)
+        else:
+            stdout = "\n\t" + "\n\t".join(stdout) if stdout else ""
+            reply = {"msg_type": "Ready", "content": stdout}
+        self._send_reply(reply, comm_id, received, start, trace, batch)
+
+    async def _await_msg(
+        self, awaitable, comm_id, received=None, start=None, trace=None, batch=None
+    ):
+        """Awaits the result of an asynchronous on_msg callback before
+        sending the acknowledgement.
+        """
+        stdout = []
+        try:
+            # The task runs in its own context so output captured
+            # here is isolated from other concurrently running tasks
+            with self._capture_stdout() as stdout:
+                await awaitable
+            self._forward_stdout(stdout)
+        except Exception as e:
+            reply = self._error_reply(e, stdout)
+        else:
+            stdout = "\n\t" + "\n\t".join(stdout) if stdout else ""
+            reply = {"msg_type": "Ready", "content": stdout}
+        self._send_reply(reply, comm_id, received, start, trace, batch)
+
+    def _capture_stdout(self):
+        if self._stdout_limit == -1:
+            return nullcontext([])
+        return StandardOutput(self._stdout_limit)
+
+    def _forward_stdout(self, stdout):
+        if stdout and self._on_stdout:
+            with suppress(Exception):
+                self._on_stdout(stdout)
+
+    def _schedule(self, coro):
+        """Schedules a coroutine on the running event loop, e.g. the
+        loop of the IPython kernel, or runs it to completion if there
+        is no running event loop.
+        """
+        import asyncio
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(coro)
+            return None
+        task = loop.create_task(coro)
+        # Hold a reference to the task until it is done so it
+        # cannot be garbage collected while it is pending
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _error_reply(self, e, stdout):
+        """Generates an Error reply containing the traceback of the exception.
+
+        Errors are fingerprinted by their type and the location they were
+        raised at, once error_limit tracebacks have been sent for a
+        fingerprint within the error_window further errors are reported
+        by a reply counting the repeats instead.
+        """
+        if self._stats is not None:
+            self._stats.record_error()
+        with suppress(Exception):
+            self._on_error(e)
+        suppressed = 0
+        if self._error_window is not None:
+            tb = e.__traceback__
+            while tb is not None and tb.tb_next is not None:
+                tb = tb.tb_next
+            location = (tb.tb_frame.f_code.co_filename, tb.tb_lineno) if tb else None
+            fingerprint = (type(e), location)
+            now = time.monotonic()
+            with self._errors_lock:
+                # Each entry holds the start of the window, the number
+                # of tracebacks sent and the number of errors suppressed
+                entry = self._errors.get(fingerprint)
+                if entry is None or now - entry[0] > self._error_window:
+                    suppressed = entry[2] if entry else 0
+                    self._errors[fingerprint] = [now, 1, 0]
+                elif entry[1] < self._error_limit:
+                    entry[1] += 1
+                else:
+                    entry[2] += 1
+                    if self._stats is not None:
+                        self._stats.record_suppressed_error()
+                    return {
+                        "msg_type": "Error",
+                        "error": f"{type(e).__name__}: {e!s}",
+                        "repeated": entry[2],
+                    }
+        error = "\n"
+        frames = traceback.extract_tb(e.__traceback__)
+        for frame in frames[-20:]:
+            fname, lineno, fn, _text = frame
+            error += f"{fname} {fn} L{lineno}\n"
+        error += f"\t{type(e).__name__}: {e!s}"
+        if suppressed:
+            error += f"\n\t({suppressed} similar errors were not reported)"
+        if stdout:
+            stdout = "\n\t" + "\n\t".join(stdout)
+            error = f"{stdout}\n{error}"
+        return {"msg_type": "Error", "traceback": error}
+
+    def _send_reply(self, reply, comm_id, received=None, start=None, trace=None, batch=None):
+        if start is not None:
+            end = time.perf_counter()
+            if self._stats is not None:
+                self._stats.record_handler(end - start)
+            if trace is not None:
+                # Echoes the trace with the times the message was received
+                # and handled in ms since the epoch, like Date.now()
+                now = time.time() * 1000
+                reply["trace"] = dict(
+                    trace,
+                    received=now - (end - (start if received is None else received)) * 1000,
+                    start=now - (end - start) * 1000,
+                    end=now,
+                )
+        # Returning the comm_id in an ACK message ensures that
+        # the correct comms handle is unblocked
+        if comm_id:
+            reply["comm_id"] = comm_id
+        # Echoing the batch lets the frontend ignore ACKs of events it
+        # stopped waiting for after a timeout
+        if batch is not None:
+            reply["batch"] = batch
+        self.send(metadata=reply)
+        if self._batch:
+            self.flush()
+        if self._stats is not None and received is not None:
+            self._stats.record_handler_to_ack(time.perf_counter() - received)
+
+
+# Class watchers fire when a mirrored parameter is set on Comm or any of
+# its subclasses, unlike instance watchers they cost nothing per Comm
+Comm.param.watch(Comm._clear_mirrored_defaults, list(Comm._mirrored_params))
+
+
+class JupyterComm(Comm):
+    """JupyterComm provides a Comm for the notebook which is initialized
+    the first time data is pushed to the frontend.
+    """
+
+    js_template = """
+    function msg_handler(msg) {{
+      var metadata = msg.metadata;
+      var buffers = msg.buffers;
+      var msg = msg.content.data;
+      if ((metadata.msg_type == "Ready")) {{
+        if (metadata.content) {{
+          console.log("Python callback returned following output:", metadata.content);
+        }}
+      }} else if (metadata.msg_type == "Error") {{
+        if (metadata.traceback) {{
+          console.log("Python failed with the following traceback:", metadata.traceback)
+        }}
+      }} else {{
+        {msg_handler}
+      }}
+    }}
+    if ((window.PyViz == undefined) || (!window.PyViz.comm_manager)) {{
+      console.log("Could not find comm manager")
+    }} else {{
+      window.PyViz.comm_manager.register_target('{plot_id}', '{comm_id}', msg_handler);
+    }}
+    """
+
+    _control_handlers = {
+        "Capabilities": "_handle_capabilities",
+        "Credit": "_handle_credit",
+        "Response": "_handle_response",
+        "Cancel": "_handle_cancel",
+    }
+
+    _logs_stdout = True
+
+    def init(self):
+        # The frontend replies with the capabilities it selected
+        capabilities = self._capabilities()
+        self._credits_offered = capabilities["credits"]
+        self._comm = self._open_comm(data={"capabilities": capabilities})
+        self._comm.on_msg(self._handle_msg)
+        self._comm.on_close(self._unregister)
+        if self._on_open:
+            self._on_open({})
+
+    def _open_comm(self, data):
+        """Opens the ipykernel comm to the target registered by the frontend."""
+        from ipykernel.comm import Comm as IPyComm
+
+        return IPyComm(target_name=self.id, data=data)
+
+    @classmethod
+    def decode(cls, msg):
+        """Decodes messages following Jupyter messaging protocol.
+        If JSON decoding fails data is assumed to be a regular string.
+        """
+        return msg["content"]["data"]
+
+    def _message_size(self, msg):
+        buffers = msg.get("buffers") or []
+        return _nbytes(msg["content"]["data"]) + sum(_nbytes(buf) for buf in buffers)
+
+    def _msg_type(self, msg):
+        return msg["metadata"].get("msg_type")
+
+    def _unpack(self, msg):
+        return msg["content"]["data"], msg["metadata"], msg.get("buffers") or []
+
+    def _pack(self, data, metadata, buffers):
+        return {
+            "metadata": metadata,
+            "content": {"comm_id": self.id, "data": data},
+            "buffers": list(buffers),
+        }
+
+    def _metadata(self, msg):
+        return msg["metadata"]
+
+    def _decode(self, msg):
+        codec = msg["metadata"].get("codec")
+        if codec is None or codec == "json":
+            return self.decode(msg)
+        data, buffers = Codec.registry[codec].decode(
+            msg["content"]["data"], msg.get("buffers") or []
+        )
+        return self.decode(
+            {**msg, "content": {**msg["content"], "data": data}, "buffers": buffers}
+        )
+
+    def _handle_capabilities(self, msg):
+        self._apply_capabilities(msg["metadata"])
+
+    def _handle_credit(self, msg):
+        self._release(msg["metadata"].get("credits", 1))
+
+    def _handle_response(self, msg):
+        metadata = msg["metadata"]
+        request_id = metadata.get("request_id")
+        if "error" in metadata:
+            self._resolve_request(request_id, error=metadata["error"])
+        elif metadata.get("binary"):
+            self._resolve_request(request_id, _readonly_buffer(msg["buffers"][0]))
+        else:
+            self._resolve_request(request_id, self._decode(msg).get("result"))
+
+    def _handle_cancel(self, msg):
+        self._cancel_request(msg["metadata"].get("request_id"))
+
+    def close(self):
+        """Closes the comm connection"""
+        self._unregister()
+        if self._comm:
+            self.flush()
+            self._stop_bulk()
+            self._comm.close()
+
+    def _transmit(self, data, metadata, buffers, block=True):
+        # Open the comm first so the offered capabilities apply to the message
+        if not self._comm:
+            self.init()
+        super()._transmit(data, metadata, buffers, block)
+
+    def _send(self, data, metadata, buffers):
+        """Pushes data across comm socket."""
+        if not self._comm:
+            self.init()
+        self._write(data, metadata, buffers)
+
+    def _write(self, data, metadata, buffers):
+        """Writes a message to the comm, queueing it on the bulk lane if
+        it exceeds the bulk_threshold or bulk data is still being sent,
+        unless it only contains acknowledgements.
+        """
+        messages = self._chunk(data, metadata, buffers)
+        if self._bulk_threshold is not None:
+            size = _nbytes(data) + sum(_nbytes(buf) for buf in buffers)
+            with self._bulk_lane:
+                if size > self._bulk_threshold or (
+                    self._bulk_sending and not self._is_priority(data, metadata)
+                ):
+                    self._bulk.extend(messages)
+                    self._bulk_sending = True
+                    if self._bulk_worker is None:
+                        self._bulk_worker = threading.Thread(
+                            target=self._drain_bulk, name="pyviz_comms-bulk", daemon=True
+                        )
+                        self._bulk_worker.start()
+                    self._bulk_lane.notify_all()
+                    return
+        with self._write_lock:
+            for message in messages:
+                self.comm.send(*message)
+
+    def _drain_bulk(self):
+        """Sends the queued bulk messages one fragment at a time, giving
+        messages sent by other threads the chance to go ahead in between.
+
+        Runs on the bulk worker of the Comm, which waits for further
+        bulk messages until the Comm is closed.
+        """
+        while True:
+            with self._bulk_lane:
+                self._bulk_lane.wait_for(lambda: self._bulk or self._bulk_stopped)
+                if not self._bulk:
+                    self._bulk_worker = None
+                    return
+                message = self._bulk.popleft()
+            try:
+                with self._write_lock:
+                    self.comm.send(*message)
+            except Exception:
+                # The comm is unusable, e.g. because it was closed
+                traceback.print_exc()
+                with self._bulk_lane:
+                    self._bulk.clear()
+            with self._bulk_lane:
+                if not self._bulk:
+                    self._bulk_sending = False
+                    self._bulk_lane.notify_all()
+
+    def _unregister(self, *args):
+        super()._unregister(*args)
+        # Lets the bulk worker exit once the queued messages are sent
+        with self._bulk_lane:
+            self._bulk_stopped = True
+            self._bulk_lane.notify_all()
+
+    def _stop_bulk(self):
+        """Waits until the queued bulk messages have been sent and the
+        bulk worker has exited.
+        """
+        with self._bulk_lane:
+            self._bulk_stopped = True
+            self._bulk_lane.notify_all()
+            self._bulk_lane.wait_for(lambda: not self._bulk_sending)
+            worker = self._bulk_worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join()
+
+
+class JupyterCommJS(JupyterComm):
+    """JupyterCommJS provides a comms channel for the Jupyter notebook,
+    which is initialized on the frontend. This allows sending events
+    initiated on the frontend to python.
+    """
+
+    js_template = """
+    <script>
+      function msg_handler(msg) {{
+        var msg = msg.content.data;
+        var buffers = msg.buffers
+        {msg_handler}
+      }}
+      var comm = window.PyViz.comm_manager.get_client_comm("{comm_id}");
+      comm.on_msg(msg_handler);
+    </script>
+    """
+
+    @classmethod
+    def decode(cls, msg):
+        """Decodes messages following the Jupyter messaging protocol,
+        exposing any binary buffers as read-only memoryviews onto the
+        received data.
+        """
+        decoded = dict(msg["content"]["data"])
+        if "buffers" in msg:
+            decoded["_buffers"] = {
+                i: _readonly_buffer(buf) for i, buf in enumerate(msg["buffers"])
+            }
+        return decoded
+
+    def __init__(
+        self, id=None, on_msg=None, on_error=None, on_stdout=None, on_open=None, **params
+    ):
+        """Initializes a Comms object"""
+        super().__init__(id, on_msg, on_error, on_stdout, on_open, **params)
+        self.manager = self._comm_manager()
+        self.manager.register_target(self.id, self._handle_open)
+
+    def _comm_manager(self):
+        """Returns the manager the comm target is registered with."""
+        from IPython import get_ipython
+
+        return get_ipython().kernel.comm_manager
+
+    def close(self):
+        """Closes the comm connection"""
+        self._unregister()
+        if self._comm:
+            self.flush()
+            self._stop_bulk()
+            self._comm.close()
+        elif self.id in self.manager.targets:
+            del self.manager.targets[self.id]
+        else:
+            raise AssertionError(f"JupyterCommJS {self.id} is already closed")
+
+    def _handle_open(self, comm, msg):
+        self._comm = comm
+        self._comm.on_msg(self._handle_msg)
+        self._comm.on_close(self._unregister)
+        offer = (msg["content"]["data"] or {}).get("capabilities")
+        if offer is not None:
+            capabilities = self._negotiate(offer)
+            self._apply_capabilities(capabilities)
+            # batch_delete tells the frontend that delete events may be
+            # batched, which kernels predating the handshake do not handle
+            self._comm.send(
+                metadata={
+                    "msg_type": "Capabilities",
+                    "comm_id": self.id,
+                    "settings": self._settings(),
+                    "batch_delete": True,
+                    **capabilities,
+                }
+            )
+        if self._on_open:
+            self._on_open(msg)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in ("event_throttle", "event_timeout", "trace"):
+            self._update_settings()
+
+    def _update_settings(self):
+        # Pushes the settings to the callbacks of an already open comm
+        if self._comm:
+            self._comm.send(
+                metadata={"msg_type": "Settings", "comm_id": self.id, "settings": self._settings()}
+            )
+
+    def _send(self, data, metadata, buffers):
+        """Pushes data across comm socket."""
+        self._write(data, metadata, buffers)
+
+
+class _Channel:
+    """A logical comm carried by a Multiplexer, implementing the subset
+    of the ipykernel Comm API used by JupyterComm and JupyterCommJS.
+    """
+
+    def __init__(self, multiplexer, comm_id):
+        self.comm_id = comm_id
+        self.closed = False
+        self._multiplexer = multiplexer
+        self._msg_callback = None
+        self._close_callbacks = []
+
+    def on_msg(self, callback):
+        self._msg_callback = callback
+
+    def on_close(self, callback):
+        self._close_callbacks.append(callback)
+
+    def send(self, data=None, metadata=None, buffers=None):
+        self._multiplexer.send(self.comm_id, data, metadata, buffers)
+
+    def close(self, data=None, metadata=None, buffers=None):
+        if self.closed:
+            return
+        self.send(data, dict(metadata or {}, msg_type="Close"), buffers)
+        self._multiplexer._remove(self.comm_id)
+        self._handle_close({})
+
+    def _handle_msg(self, msg):
+        if self._msg_callback is not None:
+            self._msg_callback(msg)
+
+    def _handle_close(self, msg):
+        self.closed = True
+        for callback in self._close_callbacks:
+            callback(msg)
+
+
+class Multiplexer:
+    """Carries the messages of many logical channels over the single
+    comm the frontend opens per kernel, tagging each message with the
+    id of its channel in the metadata.
+
+    Mirrors the ipykernel CommManager, channels are opened to targets
+    registered with register_target or using open, which sends an Open
+    message to the frontend instead of opening another comm. Messages
+    sent before the frontend has opened the shared comm are queued
+    until it does, up to queue_limit messages beyond which the oldest
+    are dropped.
+
+    A frontend which is reloaded or re-executes the manager code may
+    open another shared comm. Every channel therefore stays on the
+    comm it was opened on, while new channels use the most recently
+    opened comm.
+    """
+
+    target_name = "pyviz-multiplexer"
+
+    queue_limit = 10_000
+
+    # The Multiplexer of the running kernel
+    _instance = None
+
+    def __init__(self, manager):
+        self.targets = {}
+        self._manager = manager
+        self._comms = []
+        self._owners = {}
+        self._channels = {}
+        self._queue = deque(maxlen=self.queue_limit)
+        self._lock = threading.Lock()
+        manager.register_target(self.target_name, self._handle_open)
+
+    @classmethod
+    def get(cls):
+        """Returns the Multiplexer of the running kernel."""
+        from IPython import get_ipython
+
+        manager = get_ipython().kernel.comm_manager
+        if cls._instance is None or cls._instance._manager is not manager:
+            cls._instance = cls(manager)
+        return cls._instance
+
+    def register_target(self, target_name, callback):
+        self.targets[target_name] = callback
+
+    def open(self, comm_id, data=None):
+        """Opens a channel to a target registered by the frontend."""
+        channel = _Channel(self, comm_id)
+        self._channels[comm_id] = channel
+        channel.send(data, {"msg_type": "Open"})
+        return channel
+
+    def send(self, comm_id, data=None, metadata=None, buffers=None):
+        metadata = dict(metadata or {}, channel=comm_id)
+        with self._lock:
+            comm = self._owners.get(comm_id)
+            if comm is None and self._comms:
+                comm = self._owners[comm_id] = self._comms[-1]
+            if comm is None:
+                self._queue.append((data, metadata, buffers))
+            else:
+                comm.send(data, metadata=metadata, buffers=buffers)
+
+    def _remove(self, comm_id):
+        with self._lock:
+            self._owners.pop(comm_id, None)
+        self._channels.pop(comm_id, None)
+
+    def _handle_open(self, comm, msg):
+        comm.on_msg(lambda msg: self._route(comm, msg))
+        comm.on_close(lambda msg: self._handle_close(comm, msg))
+        with self._lock:
+            self._comms.append(comm)
+            while self._queue:
+                data, metadata, buffers = self._queue.popleft()
+                self._owners.setdefault(metadata["channel"], comm)
+                comm.send(data, metadata=metadata, buffers=buffers)
+
+    def _handle_close(self, comm, msg):
+        with self._lock:
+            if comm not in self._comms:
+                return
+            self._comms.remove(comm)
+            comm_ids = [comm_id for comm_id, owner in self._owners.items() if owner is comm]
+            for comm_id in comm_ids:
+                del self._owners[comm_id]
+        channels = [
+            self._channels.pop(comm_id) for comm_id in comm_ids if comm_id in self._channels
+        ]
+        for channel in channels:
+            channel._handle_close(msg)
+
+    def _route(self, comm, msg):
+        metadata = msg["metadata"]
+        comm_id = metadata.get("channel")
+        msg_type = metadata.get("msg_type")
+        if msg_type == "Open" and comm_id in self.targets:
+            with self._lock:
+                self._owners[comm_id] = comm
+            channel = self._channels[comm_id] = _Channel(self, comm_id)
+            self.targets[comm_id](channel, msg)
+        elif msg_type == "Close":
+            channel = self._channels.pop(comm_id, None)
+            with self._lock:
+                self._owners.pop(comm_id, None)
+            if channel is not None:
+                channel._handle_close(msg)
+        elif comm_id in self._channels:
+            self._channels[comm_id]._handle_msg(msg)
+
+
+def _channel_id(id):
+    """Returns the id of a channel, which the frontend recognizes by
+    the pyviz-channel: prefix.
+    """
+    prefix = "pyviz-channel:"
+    if id is None:
+        return prefix + uuid.uuid4().hex
+    return id if id.startswith(prefix) else prefix + id
+
+
+class JupyterChannel(JupyterComm):
+    """JupyterChannel provides a Comm for the notebook like JupyterComm,
+    which is carried by the single comm shared by all channels of the
+    kernel rather than opening a comm of its own.
+    """
+
+    def __init__(
+        self, id=None, on_msg=None, on_error=None, on_stdout=None, on_open=None, **params
+    ):
+        """Initializes a Comms object"""
+        super().__init__(_channel_id(id), on_msg, on_error, on_stdout, on_open, **params)
+        # The frontend opens the shared comm when the channel is rendered
+        self.manager = Multiplexer.get()
+
+    def _open_comm(self, data):
+        return self.manager.open(self.id, data)
+
+
+class JupyterChannelJS(JupyterCommJS):
+    """JupyterChannelJS provides a comms channel initialized on the
+    frontend like JupyterCommJS, which is carried by the single comm
+    shared by all channels of the kernel rather than opening a comm of
+    its own.
+    """
+
+    def __init__(
+        self, id=None, on_msg=None, on_error=None, on_stdout=None, on_open=None, **params
+    ):
+        """Initializes a Comms object"""
+        super().__init__(_channel_id(id), on_msg, on_error, on_stdout, on_open, **params)
+
+    def _comm_manager(self):
+        return Multiplexer.get()
+
+
+# Frontend counterparts of the codecs in Codec.registry
+CODECS_JS = """
+(function() {
+  var NONE = 0, FALSE = 1, TRUE = 2, INT = 3, FLOAT = 4, STR = 5, LIST = 6, DICT = 7,
+      FLOAT64_ARRAY = 8, INT32_ARRAY = 9, BYTES = 10;
+  var encoder = new TextEncoder();
+  var decoder = new TextDecoder();
+
+  function Writer() {
+    this.bytes = new Uint8Array(256);
+    this.view = new DataView(this.bytes.buffer);
+    this.offset = 0;
+  }
+
+  Writer.prototype.reserve = function(size) {
+    if ((this.offset + size) <= this.bytes.length) {
+      return;
+    }
+    var bytes = new Uint8Array(Math.max(2 * this.bytes.length, this.offset + size));
+    bytes.set(this.bytes.subarray(0, this.offset));
+    this.bytes = bytes;
+    this.view = new DataView(bytes.buffer);
+  }
+
+  Writer.prototype.tag = function(tag) {
+    this.reserve(1);
+    this.view.setUint8(this.offset, tag);
+    this.offset += 1;
+  }
+
+  Writer.prototype.uint32 = function(value) {
+    this.reserve(4);
+    this.view.setUint32(this.offset, value, true);
+    this.offset += 4;
+  }
+
+  Writer.prototype.raw = function(bytes) {
+    this.uint32(bytes.length);
+    this.reserve(bytes.length);
+    this.bytes.set(bytes, this.offset);
+    this.offset += bytes.length;
+  }
+
+  Writer.prototype.numbers = function(values, integer) {
+    var size = integer ? 4 : 8;
+    this.tag(integer ? INT32_ARRAY : FLOAT64_ARRAY);
+    this.uint32(values.length);
+    this.reserve(size * values.length);
+    for (var i = 0; i < values.length; i++) {
+      if (integer) {
+        this.view.setInt32(this.offset, values[i], true);
+      } else {
+        this.view.setFloat64(this.offset, values[i], true);
+      }
+      this.offset += size;
+    }
+  }
+
+  Writer.prototype.array = function(values) {
+    // Integers outside the int32 range are written individually
+    var numeric = values.length > 0;
+    var integer = true;
+    var int32 = true;
+    for (var value of values) {
+      if (typeof value !== 'number') {
+        numeric = false;
+        break;
+      } else if (!Number.isInteger(value)) {
+        integer = false;
+      } else if ((value < -2147483648) || (value > 2147483647)) {
+        int32 = false;
+      }
+    }
+    if (numeric && (int32 || !integer)) {
+      this.numbers(values, integer);
+      return;
+    }
+    this.tag(LIST);
+    this.uint32(values.length);
+    for (var value of values) {
+      this.value(value);
+    }
+  }
+
+  Writer.prototype.value = function(value) {
+    if ((value != null) && (typeof value.toJSON === 'function')) {
+      value = value.toJSON();
+    }
+    if ((value == null) || (typeof value === 'function') || (typeof value === 'symbol')) {
+      this.tag(NONE);
+    } else if (typeof value === 'boolean') {
+      this.tag(value ? TRUE : FALSE);
+    } else if (typeof value === 'number') {
+      this.reserve(9);
+      if (Number.isSafeInteger(value)) {
+        this.tag(INT);
+        this.view.setBigInt64(this.offset, BigInt(value), true);
+      } else {
+        this.tag(FLOAT);
+        this.view.setFloat64(this.offset, value, true);
+      }
+      this.offset += 8;
+    } else if (typeof value === 'string') {
+      this.tag(STR);
+      this.raw(encoder.encode(value));
+    } else if (value instanceof Int32Array) {
+      this.numbers(value, true);
+    } else if ((value instanceof ArrayBuffer) || (value instanceof DataView)) {
+      this.tag(BYTES);
+      this.raw(value instanceof DataView ? new Uint8Array(value.buffer, value.byteOffset, value.byteLength) : new Uint8Array(value));
+    } else if (ArrayBuffer.isView(value)) {
+      this.numbers(value, false);
+    } else if (Array.isArray(value)) {
+      this.array(value);
+    } else {
+      var keys = Object.keys(value).filter(function(key) {
+        return (value[key] !== undefined) && (typeof value[key] !== 'function');
+      });
+      this.tag(DICT);
+      this.uint32(keys.length);
+      for (var key of keys) {
+        this.raw(encoder.encode(key));
+        this.value(value[key]);
+      }
+    }
+  }
+
+  function Reader(view) {
+    this.view = view;
+    this.offset = 0;
+  }
+
+  Reader.prototype.uint32 = function() {
+    var value = this.view.getUint32(this.offset, true);
+    this.offset += 4;
+    return value;
+  }
+
+  Reader.prototype.bytes = function(size) {
+    var bytes = new Uint8Array(this.view.buffer, this.view.byteOffset + this.offset, size);
+    this.offset += size;
+    return bytes;
+  }
+
+  Reader.prototype.value = function() {
+    var tag = this.view.getUint8(this.offset);
+    this.offset += 1;
+    if (tag === NONE) {
+      return null;
+    } else if ((tag === FALSE) || (tag === TRUE)) {
+      return tag === TRUE;
+    } else if ((tag === INT) || (tag === FLOAT)) {
+      var value = (tag === INT) ? Number(this.view.getBigInt64(this.offset, true)) : this.view.getFloat64(this.offset, true);
+      this.offset += 8;
+      return value;
+    }
+    var size = this.uint32();
+    if (tag === STR) {
+      return decoder.decode(this.bytes(size));
+    } else if (tag === BYTES) {
+      var bytes = this.bytes(size);
+      return new DataView(bytes.buffer, bytes.byteOffset, size);
+    } else if ((tag === FLOAT64_ARRAY) || (tag === INT32_ARRAY)) {
+      var values = new Array(size);
+      for (var i = 0; i < size; i++) {
+        if (tag === INT32_ARRAY) {
+          values[i] = this.view.getInt32(this.offset, true);
+          this.offset += 4;
+        } else {
+          values[i] = this.view.getFloat64(this.offset, true);
+          this.offset += 8;
+        }
+      }
+      return values;
+    } else if (tag === LIST) {
+      var values = new Array(size);
+      for (var i = 0; i < size; i++) {
+        values[i] = this.value();
+      }
+      return values;
+    } else if (tag === DICT) {
+      var values = {};
+      for (var i = 0; i < size; i++) {
+        var key = decoder.decode(this.bytes(this.uint32()));
+        values[key] = this.value();
+      }
+      return values;
+    }
+    throw new Error('Binary codec encountered unknown type tag ' + tag);
+  }
+
+  window.PyViz.codecs = {
+    json: {
+      encode: function(data) { return [data, []]; },
+      decode: function(data, buffers) { return [data, buffers]; }
+    },
+    binary: {
+      encode: function(data) {
+        var writer = new Writer();
+        writer.value(data);
+        return [{}, [writer.bytes.buffer.slice(0, writer.offset)]];
+      },
+      decode: function(data, buffers) {
+        var buffer = buffers[0];
+        var view = ArrayBuffer.isView(buffer) ? new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength) : new DataView(buffer);
+        return [new Reader(view).value(), buffers.slice(1)];
+      }
+    }
+  };
+})();
+"""
+
+
+class CommManager:
+    """The CommManager is an abstract baseclass for establishing
+    websocket comms on the client and the server.
+    """
+
+    js_manager = """
+    function CommManager() {
+    }
+
+    CommManager.prototype.register_target = function() {
+    }
+
+    CommManager.prototype.get_client_comm = function() {
+    }
+
+    window.PyViz.comm_manager = CommManager()
+    """
+
+    # Registry of all Comms created by the manager
+    _comms = CommRegistry()
+
+    server_comm = Comm
+
+    client_comm = Comm
 
     @classmethod
-    def get_server_comm(cls, on_msg=None, id=None, on_error=None, on_stdout=None, on_open=None):
-        comm = cls.server_comm(id, on_msg, on_error, on_stdout, on_open)
+    def get_server_comm(
+        cls, on_msg=None, id=None, on_error=None, on_stdout=None, on_open=None, **params
+    ):
+        comm = cls.server_comm(id, on_msg, on_error, on_stdout, on_open, **params)
         cls._comms[comm.id] = comm
         return comm
 
     @classmethod
-    def get_client_comm(cls, on_msg=None, id=None, on_error=None, on_stdout=None, on_open=None):
-        comm = cls.client_comm(id, on_msg, on_error, on_stdout, on_open)
+    def get_client_comm(
+        cls, on_msg=None, id=None, on_error=None, on_stdout=None, on_open=None, **params
+    ):
+        comm = cls.client_comm(id, on_msg, on_error, on_stdout, on_open, **params)
         cls._comms[comm.id] = comm
         return comm
 
+    @classmethod
+    def live_comms(cls):
+        """Returns the number of registered Comms which are still alive."""
+        return len(cls._comms)
+
+    @classmethod
+    def set_max_comms(cls, max_comms):
+        """Limits the number of registered Comms, closing the least
+        recently used Comms beyond the limit. None removes the limit.
+        """
+        cls._comms.resize(max_comms)
+
+    @classmethod
+    def flush(cls):
+        """Flushes the queued messages of all batched comms."""
+        _flush_pending()
+
+    @classmethod
+    def get_stats(cls):
+        """Returns a snapshot of the statistics of all registered Comms
+        with metrics enabled, indexed by the Comm id.
+        """
+        return {comm_id: comm.stats for comm_id, comm in list(cls._comms.items()) if comm.metrics}
+
+    @classmethod
+    def reset_stats(cls):
+        """Resets the statistics of all registered Comms."""
+        for comm in cls._comms.values():
+            comm.reset_stats()
+
 
 class JupyterCommManager(CommManager):
     """The JupyterCommManager is used to establishing websocket comms on
@@ -510,22 +3250,437 @@ class JupyterCommManager(CommManager):
     plot, ensuring the corresponding comms can be accessed.
     """
 
-    js_manager = """
+    js_manager = (
+        CODECS_JS
+        + """
     function JupyterCommManager() {
+      this.requests = {};
+      this.request_count = 0;
+      this.request_handlers = {};
+      this.aborts = {};
+    }
+
+    if (window.PyViz.capabilities === undefined) {
+      window.PyViz.capabilities = {};
+    }
+
+    // Multiplexers are kept on window.PyViz rather than on the manager,
+    // which is replaced whenever this code is executed again
+    if (window.PyViz.multiplexers === undefined) {
+      window.PyViz.multiplexers = {};
+    }
+
+    JupyterCommManager.prototype.capabilities = function() {
+      // Capabilities offered to the kernel when opening a comm
+      var compression = (typeof DecompressionStream === 'undefined') ? [] : ['deflate'];
+      return {codecs: Object.keys(window.PyViz.codecs), compression: compression, credits: true, chunking: true};
+    }
+
+    JupyterCommManager.prototype.negotiate = function(offer) {
+      // Selects the first codec offered by the kernel which is supported,
+      // whether compressed buffers can be decompressed, whether the
+      // kernel expects credits for applied messages and whether it may
+      // split large messages into fragments
+      var codecs = offer.codecs || [];
+      var codec = codecs.find((name) => name in window.PyViz.codecs);
+      var compression = this.capabilities().compression.find((name) => (offer.compression || []).indexOf(name) > -1);
+      return {codec: codec || 'json', compression: compression || null, credits: !!offer.credits, chunking: !!offer.chunking};
+    }
+
+    JupyterCommManager.prototype.reassemble = function(fragments, msg) {
+      // Collects the fragments of a chunked message, returning the
+      // reassembled message once all of its fragments have arrived
+      var fragment = msg.metadata.fragment;
+      var pending = fragments[fragment.id];
+      if (pending === undefined) {
+        pending = fragments[fragment.id] = {received: 0, parts: new Array(fragment.count)};
+      }
+      pending.parts[fragment.index] = msg.buffers || [];
+      pending.received += 1;
+      if (pending.received < fragment.count) {
+        return null;
+      }
+      delete fragments[fragment.id];
+      var views = [].concat(...pending.parts).map((buffer) => {
+        return ArrayBuffer.isView(buffer) ? new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength) : new Uint8Array(buffer);
+      });
+      var index = 0;
+      var position = 0;
+      function read(length) {
+        // Copies the next length bytes spread across the fragments
+        var bytes = new Uint8Array(length);
+        var filled = 0;
+        while (filled < length) {
+          var view = views[index];
+          var count = Math.min(length - filled, view.byteLength - position);
+          bytes.set(view.subarray(position, position+count), filled);
+          filled += count;
+          position += count;
+          if (position === view.byteLength) {
+            index += 1;
+            position = 0;
+          }
+        }
+        return bytes;
+      }
+      var header_length = new DataView(read(4).buffer).getUint32(0, true);
+      var header = JSON.parse(new TextDecoder().decode(read(header_length)));
+      var buffers = header.buffers.map((length) => new DataView(read(length).buffer));
+      return {content: {data: header.data, comm_id: msg.content.comm_id}, metadata: header.metadata || {}, buffers};
+    }
+
+    JupyterCommManager.prototype.decompress = function(msg) {
+      // Inflates the buffers listed as compressed in the metadata
+      var buffers = (msg.buffers || []).slice();
+      var inflated = msg.metadata.compressed.map((index) => {
+        var buffer = buffers[index];
+        var bytes = ArrayBuffer.isView(buffer) ? new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength) : new Uint8Array(buffer);
+        var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+        return new Response(stream).arrayBuffer().then((decompressed) => {
+          buffers[index] = new DataView(decompressed);
+        });
+      });
+      return Promise.all(inflated).then(() => ({content: msg.content, metadata: msg.metadata, buffers}));
+    }
+
+    JupyterCommManager.prototype.send = function(comm, data, metadata, buffers) {
+      // The classic notebook Comm accepts callbacks as the second argument
+      if (typeof comm.on_msg === 'function') {
+        comm.send(data, {}, metadata, buffers);
+      } else {
+        comm.send(data, metadata, buffers);
+      }
+    }
+
+    JupyterCommManager.prototype.send_msg = function(comm_id, data, metadata) {
+      // Sends data over a client comm, encoded with the negotiated codec
+      var comm = window.PyViz.comms[comm_id];
+      var codec = (window.PyViz.capabilities[comm_id] || {}).codec;
+      if ((codec === undefined) || (codec === 'json') || !(codec in window.PyViz.codecs)) {
+        if (metadata) {
+          this.send(comm, data, metadata, []);
+        } else {
+          comm.send(data);
+        }
+        return;
+      }
+      var encoded = window.PyViz.codecs[codec].encode(data);
+      this.send(comm, encoded[0], Object.assign({}, metadata, {codec: codec}), encoded[1]);
+    }
+
+    JupyterCommManager.prototype.request = function(comm_id, data, options) {
+      // Sends a request over a client comm, returning a Promise of the
+      // result returned by the on_request callback of the kernel Comm.
+      // The Promise is rejected if the callback raised an error, if no
+      // response arrived within options.timeout ms or if options.signal
+      // is aborted, which also aborts the request in the kernel.
+      var self = this;
+      options = options || {};
+      var request_id = 'js-' + (this.request_count += 1);
+      return new Promise((resolve, reject) => {
+        var timer = null;
+        function settle() {
+          delete self.requests[request_id];
+          clearTimeout(timer);
+        }
+        function cancel(error) {
+          if (request_id in self.requests) {
+            self.requests[request_id].reject(error);
+            self.send_msg(comm_id, {}, {msg_type: 'Cancel', request_id: request_id});
+          }
+        }
+        self.requests[request_id] = {
+          resolve: (result) => { settle(); resolve(result); },
+          reject: (error) => { settle(); reject(error); }
+        };
+        if (options.timeout != null) {
+          timer = setTimeout(() => cancel(new Error('Request timed out after ' + options.timeout + ' ms')), options.timeout);
+        }
+        if (options.signal) {
+          options.signal.addEventListener('abort', () => cancel(new Error('Request aborted')));
+        }
+        self.send_msg(comm_id, data || {}, {msg_type: 'Request', request_id: request_id});
+      });
+    }
+
+    JupyterCommManager.prototype.on_request = function(comm_id, handler) {
+      // Registers the handler responding to requests the kernel sends
+      // using Comm.request, which is called with the request data and an
+      // object holding the buffers and an AbortSignal and may return a
+      // Promise. ArrayBuffers and typed arrays are returned as buffers.
+      this.request_handlers[comm_id] = handler;
+    }
+
+    JupyterCommManager.prototype.settle = function(msg) {
+      // Settles the Promise of a request the kernel responded to
+      var metadata = msg.metadata;
+      var request = this.requests[metadata.request_id];
+      if (request === undefined) {
+        return;
+      } else if (metadata.error) {
+        request.reject(new Error(metadata.error));
+      } else if (metadata.binary) {
+        request.resolve(msg.buffers[0]);
+      } else {
+        request.resolve(msg.content.data.result);
+      }
+    }
+
+    JupyterCommManager.prototype.answer = function(comm, comm_id, msg) {
+      // Responds to a request from the kernel with the result of the
+      // handler registered with on_request
+      var self = this;
+      var request_id = msg.metadata.request_id;
+      var key = comm_id + ':' + request_id;
+      var controller = new AbortController();
+      this.aborts[key] = controller;
+      function respond(data, metadata, buffers) {
+        delete self.aborts[key];
+        if (!controller.signal.aborted) {
+          self.send(comm, data, Object.assign({msg_type: 'Response', request_id: request_id}, metadata), buffers);
+        }
+      }
+      new Promise((resolve) => {
+        var handler = this.request_handlers[comm_id];
+        if (handler === undefined) {
+          throw new Error('No request handler registered for comm ' + comm_id);
+        }
+        resolve(handler(msg.content.data, {buffers: msg.buffers, signal: controller.signal}));
+      }).then((result) => {
+        if ((result instanceof ArrayBuffer) || ArrayBuffer.isView(result)) {
+          respond({}, {binary: true}, [result]);
+        } else {
+          respond({result: (result === undefined) ? null : result}, {}, []);
+        }
+      }, (error) => {
+        respond({}, {error: String((error && error.message) || error)}, []);
+      });
+    }
+
+    JupyterCommManager.prototype.abort = function(comm_id, request_id) {
+      // Aborts a request the kernel cancelled
+      var key = comm_id + ':' + request_id;
+      if (key in this.aborts) {
+        this.aborts[key].abort();
+        delete this.aborts[key];
+      }
+    }
+
+    JupyterCommManager.prototype.wrap_handler = function(comm_id, msg_handler, comm) {
+      // Reassembles fragmented messages, unpacks batched messages,
+      // decompresses buffers, decodes messages encoded with a codec and
+      // records the capabilities negotiated by the kernel. Requests and
+      // responses are handled by the manager while other messages are
+      // passed on to the msg_handler. Once a message has been handled a
+      // credit is returned to the kernel if it applies flow control.
+      var self = this;
+      var queue = null;
+      var fragments = {};
+      function credit() {
+        var target = comm || window.PyViz.comms[comm_id];
+        if (target && (window.PyViz.capabilities[comm_id] || {}).credits) {
+          self.send(target, {}, {msg_type: 'Credit', credits: 1});
+        }
+      }
+      function track(promise) {
+        var tracked = promise.catch((error) => {
+          console.error('Failed to process comm message:', error);
+        }).then(() => {
+          credit();
+          if (queue === tracked) {
+            queue = null;
+          }
+        });
+        queue = tracked;
+      }
+      function receive(msg) {
+        // Decompression is asynchronous, so while a compressed message
+        // is processed subsequent messages are chained to preserve order
+        var msg_type = (msg.metadata || {}).msg_type;
+        if (msg_type == "Fragment") {
+          msg = self.reassemble(fragments, msg);
+          if (msg === null) {
+            return;
+          }
+          msg_type = msg.metadata.msg_type;
+        }
+        if (msg_type == "Capabilities") {
+          window.PyViz.capabilities[comm_id] = msg.metadata;
+        } else if (msg_type == "Settings") {
+          var capabilities = window.PyViz.capabilities[comm_id] || {};
+          capabilities.settings = msg.metadata.settings;
+          window.PyViz.capabilities[comm_id] = capabilities;
+        } else if (queue !== null) {
+          track(queue.then(() => handle(msg)));
+        } else {
+          var result;
+          try {
+            result = handle(msg);
+          } finally {
+            if (!result) {
+              credit();
+            }
+          }
+          if (result) {
+            track(result);
+          }
+        }
+      }
+      function handle(msg) {
+        // Returns a Promise if the message is processed asynchronously
+        var metadata = msg.metadata || {};
+        if (metadata.compressed) {
+          return self.decompress(msg).then(handle_decompressed);
+        }
+        return handle_decompressed(msg);
+      }
+      function handle_decompressed(msg) {
+        var metadata = msg.metadata || {};
+        var buffers = msg.buffers || [];
+        var data = msg.content.data;
+        if (metadata.msg_type == "Batch") {
+          var offset = 0;
+          var result;
+          for (var part of data.parts) {
+            var part_msg = {content: {data: part.data, comm_id}, metadata: part.metadata, buffers: buffers.slice(offset, offset+part.buffers)};
+            offset += part.buffers;
+            result = result ? result.then(handle.bind(null, part_msg)) : handle(part_msg);
+          }
+          return result;
+        } else if (metadata.codec && (metadata.codec in window.PyViz.codecs)) {
+          var decoded = window.PyViz.codecs[metadata.codec].decode(data, buffers);
+          msg = {content: {data: decoded[0], comm_id}, metadata, buffers: decoded[1]};
+        }
+        if (metadata.msg_type == "Response") {
+          self.settle(msg);
+        } else if (metadata.msg_type == "Request") {
+          self.answer(comm || window.PyViz.comms[comm_id], comm_id, msg);
+        } else if (metadata.msg_type == "Cancel") {
+          self.abort(comm_id, metadata.request_id);
+        } else if (msg_handler) {
+          msg_handler(msg);
+        }
+      }
+      return receive;
+    }
+
+    // Comms whose id starts with the channel prefix are multiplexed over
+    // a single comm per kernel opened to the multiplexer target
+    JupyterCommManager.prototype.channel_prefix = 'pyviz-channel:';
+
+    JupyterCommManager.prototype.multiplexer_target = 'pyviz-multiplexer';
+
+    JupyterCommManager.prototype.multiplexer = function(plot_id) {
+      // Returns the multiplexer of the kernel the plot belongs to, opening
+      // the comm shared by its channels on first use
+      var kernel = window.PyViz.kernels[plot_id];
+      var key = (kernel && kernel.id) || '';
+      var multiplexers = window.PyViz.multiplexers;
+      if (key in multiplexers) {
+        return multiplexers[key];
+      }
+      var multiplexer = {channels: {}, pending: {}, comm: null};
+      multiplexer.comm = this.open_comm(plot_id, this.multiplexer_target, {}, (msg) => {
+        // Routes messages to their channel, holding on to messages for
+        // channels which have not been registered yet
+        var metadata = msg.metadata || {};
+        var channel = metadata.channel;
+        if (metadata.msg_type == 'Close') {
+          delete multiplexer.channels[channel];
+          delete multiplexer.pending[channel];
+          delete window.PyViz.comms[channel];
+        } else if (channel in multiplexer.channels) {
+          multiplexer.channels[channel](msg);
+        } else {
+          (multiplexer.pending[channel] = multiplexer.pending[channel] || []).push(msg);
+        }
+      });
+      if (!multiplexer.comm) {
+        return null;
+      }
+      var forget = () => {
+        // Once the shared comm is closed its channels are gone as well
+        if (multiplexers[key] === multiplexer) {
+          delete multiplexers[key];
+        }
+        for (var channel of Object.keys(multiplexer.channels)) {
+          if (window.PyViz.comms[channel] && (window.PyViz.comms[channel].multiplexer === multiplexer)) {
+            delete window.PyViz.comms[channel];
+          }
+        }
+      };
+      if (typeof multiplexer.comm.on_close === 'function') {
+        multiplexer.comm.on_close(forget);
+      } else {
+        multiplexer.comm.onClose = forget;
+      }
+      multiplexers[key] = multiplexer;
+      return multiplexer;
+    }
+
+    JupyterCommManager.prototype.open_channel = function(multiplexer, comm_id, receive) {
+      // Returns a comm sending messages tagged with the channel id over
+      // the multiplexer and routes the messages of the channel to receive
+      var self = this;
+      var channel = {
+        comm_id: comm_id,
+        multiplexer: multiplexer,
+        on_msg: function(msg_handler) {
+          self.route_channel(multiplexer, comm_id, self.wrap_handler(comm_id, msg_handler, channel));
+        },
+        send: function(data, callbacks, metadata, buffers) {
+          var tagged = Object.assign({}, metadata, {channel: comm_id});
+          self.send(multiplexer.comm, data || {}, tagged, buffers);
+        }
+      };
+      if (receive) {
+        this.route_channel(multiplexer, comm_id, receive(channel));
+      }
+      return channel;
+    }
+
+    JupyterCommManager.prototype.route_channel = function(multiplexer, comm_id, receive) {
+      multiplexer.channels[comm_id] = receive;
+      var pending = multiplexer.pending[comm_id] || [];
+      delete multiplexer.pending[comm_id];
+      for (var msg of pending) {
+        receive(msg);
+      }
     }
 
     JupyterCommManager.prototype.register_target = function(plot_id, comm_id, msg_handler) {
-      if (window.comm_manager || ((window.Jupyter !== undefined) && (Jupyter.notebook.kernel != null))) {
+      var self = this;
+      function open(comm, msg) {
+        // Replies with the capabilities selected from the kernel's offer
+        var offer = ((msg && msg.content && msg.content.data) || {}).capabilities;
+        if (offer) {
+          var selected = self.negotiate(offer);
+          window.PyViz.capabilities[comm_id] = selected;
+          self.send(comm, {}, Object.assign({msg_type: 'Capabilities'}, selected));
+        }
+      }
+      if (comm_id.startsWith(this.channel_prefix)) {
+        var multiplexer = this.multiplexer(plot_id);
+        if (multiplexer) {
+          this.open_channel(multiplexer, comm_id, (channel) => {
+            var handler = self.wrap_handler(comm_id, msg_handler, channel);
+            return (msg) => (msg.metadata.msg_type == 'Open') ? open(channel, msg) : handler(msg);
+          });
+        }
+      } else if (window.comm_manager || ((window.Jupyter !== undefined) && (Jupyter.notebook.kernel != null))) {
         var comm_manager = window.comm_manager || Jupyter.notebook.kernel.comm_manager;
-        comm_manager.register_target(comm_id, function(comm) {
-          comm.on_msg(msg_handler);
+        comm_manager.register_target(comm_id, function(comm, msg) {
+          comm.on_msg(self.wrap_handler(comm_id, msg_handler, comm));
+          open(comm, msg);
         });
       } else if ((plot_id in window.PyViz.kernels) && (window.PyViz.kernels[plot_id])) {
-        window.PyViz.kernels[plot_id].registerCommTarget(comm_id, function(comm) {
-          comm.onMsg = msg_handler;
+        window.PyViz.kernels[plot_id].registerCommTarget(comm_id, function(comm, msg) {
+          comm.onMsg = self.wrap_handler(comm_id, msg_handler, comm);
+          open(comm, msg);
         });
       } else if (typeof google != 'undefined' && google.colab.kernel != null) {
         google.colab.kernel.comms.registerTarget(comm_id, (comm) => {
+          var handler = self.wrap_handler(comm_id, msg_handler, comm);
           var messages = comm.messages[Symbol.asyncIterator]();
           function processIteratorResult(result) {
             var message = result.value;
@@ -536,7 +3691,7 @@ class JupyterCommManager(CommManager):
             }
             var metadata = message.metadata || {};
             var msg = {content, buffers, metadata}
-            msg_handler(msg);
+            handler(msg);
             return messages.next().then(processIteratorResult);
           }
           return messages.next().then(processIteratorResult);
@@ -545,20 +3700,35 @@ class JupyterCommManager(CommManager):
     }
 
     JupyterCommManager.prototype.get_client_comm = function(plot_id, comm_id, msg_handler) {
+      var data = {capabilities: this.capabilities()};
       if (comm_id in window.PyViz.comms) {
         return window.PyViz.comms[comm_id];
-      } else if (window.comm_manager || ((window.Jupyter !== undefined) && (Jupyter.notebook.kernel != null))) {
-        var comm_manager = window.comm_manager || Jupyter.notebook.kernel.comm_manager;
-        var comm = comm_manager.new_comm(comm_id, {}, {}, {}, comm_id);
-        if (msg_handler) {
-          comm.on_msg(msg_handler);
+      } else if (comm_id.startsWith(this.channel_prefix)) {
+        var multiplexer = this.multiplexer(plot_id);
+        if (!multiplexer) {
+          return null;
         }
+        var comm = this.open_channel(multiplexer, comm_id, (channel) => this.wrap_handler(comm_id, msg_handler, channel));
+        comm.send(data, {}, {msg_type: 'Open'});
+      } else {
+        var comm = this.open_comm(plot_id, comm_id, data, this.wrap_handler(comm_id, msg_handler));
+      }
+      window.PyViz.comms[comm_id] = comm;
+      return comm;
+    }
+
+    JupyterCommManager.prototype.open_comm = function(plot_id, target, data, handler) {
+      // Opens a comm to a target registered in the kernel
+      if (window.comm_manager || ((window.Jupyter !== undefined) && (Jupyter.notebook.kernel != null))) {
+        var comm_manager = window.comm_manager || Jupyter.notebook.kernel.comm_manager;
+        var comm = comm_manager.new_comm(target, data, {}, {}, target);
+        comm.on_msg(handler);
       } else if ((plot_id in window.PyViz.kernels) && (window.PyViz.kernels[plot_id])) {
-        var comm = window.PyViz.kernels[plot_id].connectToComm(comm_id);
+        var comm = window.PyViz.kernels[plot_id].connectToComm(target);
         let retries = 0;
         const open = () => {
           if (comm.active || comm.active === undefined) {
-            comm.open();
+            comm.open(data);
           } else if (retries > 3) {
             console.warn('Comm target never activated')
           } else {
@@ -567,29 +3737,28 @@ class JupyterCommManager(CommManager):
           }
         }
         if (comm.active || comm.active === undefined) {
-          comm.open();
+          comm.open(data);
         } else {
           setTimeout(open, 500)
         }
-        if (msg_handler) {
-          comm.onMsg = msg_handler;
-        }
+        comm.onMsg = handler;
       } else if (typeof google != 'undefined' && google.colab.kernel != null) {
-        var comm_promise = google.colab.kernel.comms.open(comm_id)
+        var comm_promise = google.colab.kernel.comms.open(target, data)
         comm_promise.then((comm) => {
-          window.PyViz.comms[comm_id] = comm;
-          if (msg_handler) {
-            var messages = comm.messages[Symbol.asyncIterator]();
-            function processIteratorResult(result) {
-              var message = result.value;
-              var content = {data: message.data};
-              var metadata = message.metadata || {comm_id};
-              var msg = {content, metadata}
-              msg_handler(msg);
-              return messages.next().then(processIteratorResult);
+          var messages = comm.messages[Symbol.asyncIterator]();
+          function processIteratorResult(result) {
+            var message = result.value;
+            var content = {data: message.data};
+            var buffers = []
+            for (var buffer of message.buffers || []) {
+              buffers.push(new DataView(buffer))
             }
+            var metadata = message.metadata || {comm_id: target};
+            var msg = {content, buffers, metadata}
+            handler(msg);
             return messages.next().then(processIteratorResult);
           }
+          return messages.next().then(processIteratorResult);
         })
         var sendClosure = (data, metadata, buffers, disposeOnDone) => {
           return comm_promise.then((comm) => {
@@ -600,22 +3769,411 @@ class JupyterCommManager(CommManager):
           send: sendClosure
         };
       }
-      window.PyViz.comms[comm_id] = comm;
       return comm;
     }
     window.PyViz.comm_manager = new JupyterCommManager();
     """
+    )
 
     server_comm = JupyterComm
 
     client_comm = JupyterCommJS
 
 
+class MultiplexedCommManager(JupyterCommManager):
+    """The MultiplexedCommManager establishes comms like the
+    JupyterCommManager but multiplexes them as channels over a single
+    comm per kernel, which the frontend opens when the first channel is
+    used. Since opening a channel does not open a comm the cost of
+    rendering and of the comm bookkeeping in the kernel no longer grows
+    with the number of comms, e.g. one per widget.
+    """
+
+    server_comm = JupyterChannel
+
+    client_comm = JupyterChannelJS
+
+
+class _LocalEndpoint:
+    """The kernel end of a connection to the LocalFrontend, implementing
+    the subset of the ipykernel Comm API used by JupyterComm and
+    JupyterCommJS.
+    """
+
+    def __init__(self, connection):
+        self.comm_id = connection.comm_id
+        self.closed = False
+        self._connection = connection
+        self._msg_callback = None
+        self._close_callbacks = []
+
+    def on_msg(self, callback):
+        self._msg_callback = callback
+
+    def on_close(self, callback):
+        self._close_callbacks.append(callback)
+
+    def send(self, data=None, metadata=None, buffers=None):
+        if not self.closed:
+            self._connection._receive(data, metadata, buffers)
+
+    def close(self, data=None, metadata=None, buffers=None):
+        self.closed = self._connection.closed = True
+
+    def _handle_msg(self, msg):
+        if self._msg_callback is not None:
+            self._msg_callback(msg)
+
+    def _handle_close(self, msg):
+        self.closed = True
+        for callback in self._close_callbacks:
+            callback(msg)
+
+
+class LocalConnection:
+    """The frontend end of a connection between a local Comm and the
+    LocalFrontend, which handles messages like the JupyterCommManager
+    does in the browser: it records the negotiated capabilities,
+    decompresses, unpacks and decodes messages, returns credits and
+    counts acknowledgements before passing the messages on to the
+    on_msg callback as (data, metadata, buffers) tuples.
+    """
+
+    def __init__(self, frontend, comm_id, on_msg=None):
+        self.comm_id = comm_id
+        self.capabilities = {}
+        self.closed = False
+        self._frontend = frontend
+        self._endpoint = _LocalEndpoint(self)
+        self._on_msg = on_msg
+        self._lock = threading.RLock()
+        self._acks = threading.Condition(self._lock)
+        self._outstanding = 0
+        self._sent_times = deque()
+        self._ack_latency = _Histogram()
+        self._errors = 0
+        self._requests = {}
+        self._request_ids = itertools.count()
+
+    def on_msg(self, callback):
+        self._on_msg = callback
+
+    def send(self, data=None, metadata=None, buffers=None):
+        """Sends a message to the Comm, encoded with the negotiated codec."""
+        buffers = list(buffers or [])
+        codec = Codec.registry.get(self.capabilities.get("codec"))
+        if codec is not None and codec.name != "json" and isinstance(data, dict):
+            data, encoded = codec.encode(data)
+            metadata = dict(metadata or {}, codec=codec.name)
+            buffers = encoded + buffers
+        self._frontend._deliver(self._endpoint, data, metadata, buffers)
+
+    def send_event(self, data, max_outstanding=1, timeout=None):
+        """Sends an event like the JS_CALLBACK does, first waiting until
+        fewer than max_outstanding sent events await acknowledgement.
+        """
+        with self._acks:
+            if not self._acks.wait_for(lambda: self._outstanding < max_outstanding, timeout):
+                raise TimeoutError(f"Events sent to {self.comm_id} were not acknowledged")
+            self._outstanding += 1
+            self._sent_times.append(time.perf_counter())
+        self.send(
+            dict(data, comm_id=self.comm_id),
+            {"event_key": ",".join(sorted([*data, "comm_id"]))},
+        )
+
+    def simulate(self, events, rate=None, max_outstanding=1, timeout=10):
+        """Sends a sequence of events at the given rate per second, or as
+        fast as they are acknowledged if rate is None, and waits until
+        all of them have been acknowledged.
+
+        Returns a summary of the run: the number of events and errors,
+        the duration in seconds, the throughput in events per second and
+        a histogram of the acknowledgement latency.
+        """
+        with self._lock:
+            self._errors = 0
+            self._ack_latency = _Histogram()
+        start = time.perf_counter()
+        count = 0
+        for count, event in enumerate(events, 1):
+            if rate is not None:
+                delay = start + (count - 1) / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.send_event(event, max_outstanding, timeout)
+        with self._acks:
+            if not self._acks.wait_for(lambda: self._outstanding == 0, timeout):
+                raise TimeoutError(f"Events sent to {self.comm_id} were not acknowledged")
+            duration = time.perf_counter() - start
+            return {
+                "events": count,
+                "errors": self._errors,
+                "duration": duration,
+                "events_per_second": count / duration if duration else float("inf"),
+                "ack_latency": self._ack_latency.snapshot(),
+            }
+
+    def request(self, data=None, timeout=None):
+        """Sends a request to the on_request callback of the Comm,
+        returning a concurrent.futures.Future of the result.
+        """
+        from concurrent.futures import Future
+
+        request_id = f"local-{next(self._request_ids)}"
+        future = self._requests[request_id] = Future()
+        future.add_done_callback(lambda future: self._requests.pop(request_id, None))
+        self.send(data or {}, {"msg_type": "Request", "request_id": request_id})
+        if timeout is not None:
+            cancel = _scheduler.call_later(
+                timeout,
+                lambda: (
+                    future.done()
+                    or future.set_exception(
+                        TimeoutError(f"Request timed out after {timeout} seconds")
+                    )
+                ),
+            )
+            future.add_done_callback(lambda future: cancel())
+        return future
+
+    def close(self):
+        """Closes the connection, notifying the Comm."""
+        if not self.closed:
+            self.closed = True
+            self._frontend._queue.put((self._endpoint._handle_close, ({},)))
+
+    def _receive(self, data, metadata, buffers):
+        metadata = metadata or {}
+        msg_type = metadata.get("msg_type")
+        if msg_type == "Capabilities":
+            self.capabilities = metadata
+            return
+        elif msg_type == "Settings":
+            self.capabilities = dict(self.capabilities, settings=metadata.get("settings"))
+            return
+        # Messages are handled one at a time like in the browser
+        with self._lock:
+            self._handle(data, metadata, list(buffers or []))
+        if self.capabilities.get("credits"):
+            self.send(metadata={"msg_type": "Credit", "credits": 1})
+
+    def _handle(self, data, metadata, buffers):
+        for i in metadata.get("compressed", []):
+            buffers[i] = memoryview(zlib.decompress(buffers[i]))
+        msg_type = metadata.get("msg_type")
+        if msg_type == "Batch":
+            offset = 0
+            for part in data["parts"]:
+                self._handle(
+                    part["data"], part["metadata"], buffers[offset : offset + part["buffers"]]
+                )
+                offset += part["buffers"]
+            return
+        codec = metadata.get("codec")
+        if codec is not None and codec != "json":
+            data, buffers = Codec.registry[codec].decode(data, buffers)
+        if msg_type in ("Ready", "Error") and self._sent_times:
+            self._outstanding -= 1
+            self._errors += msg_type == "Error"
+            self._ack_latency.record(time.perf_counter() - self._sent_times.popleft())
+            self._acks.notify_all()
+        elif msg_type == "Response":
+            future = self._requests.get(metadata.get("request_id"))
+            if future is not None and not future.done():
+                if "error" in metadata:
+                    future.set_exception(RuntimeError(metadata["error"]))
+                else:
+                    future.set_result(buffers[0] if metadata.get("binary") else data["result"])
+            return
+        if self._on_msg is not None:
+            self._on_msg(data, metadata, buffers)
+
+
+class LocalFrontend:
+    """Scriptable stand-in for the frontend of local Comms, e.g. to
+    load test callbacks or to embed Comms in a service without a Jupyter
+    kernel or a browser, e.g.:
+
+        comm = LocalCommManager.get_client_comm(on_msg=callback)
+        connection = LocalFrontend.get().open(comm.id)
+        connection.simulate({"x": i} for i in range(10000))
+
+    Messages sent to the Comms are queued and processed one at a time by
+    a background thread standing in for the main thread of the kernel,
+    while messages sent by the Comms are handled as soon as they are
+    sent, on the thread sending them.
+    """
+
+    # The LocalFrontend used by local Comms
+    _instance = None
+
+    def __init__(self):
+        import queue
+
+        self.targets = {}
+        self.connections = {}
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="pyviz_comms-local", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get(cls):
+        """Returns the LocalFrontend used by local Comms."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def capabilities(self):
+        """Capabilities offered to the Comms."""
+        return {
+            "codecs": list(Codec.registry),
+            "compression": ["deflate"],
+            "credits": True,
+            "chunking": False,
+        }
+
+    def negotiate(self, offer):
+        """Selects the capabilities offered by a Comm the frontend supports."""
+        codec = next((name for name in offer.get("codecs", []) if name in Codec.registry), "json")
+        compression = "deflate" if "deflate" in offer.get("compression", []) else None
+        return {
+            "codec": codec,
+            "compression": compression,
+            "credits": bool(offer.get("credits")),
+            "chunking": False,
+        }
+
+    def register_target(self, target_name, callback):
+        self.targets[target_name] = callback
+
+    def open(self, comm_id, on_msg=None, timeout=5):
+        """Opens a connection to the client Comm with the given id, which
+        is passed the capabilities of the frontend, waiting up to the
+        timeout for the Comm to reply with the negotiated capabilities.
+        """
+        if comm_id not in self.targets:
+            raise KeyError(f"No local Comm registered with id {comm_id}")
+        connection = self.connections[comm_id] = LocalConnection(self, comm_id, on_msg)
+        msg = self._message(comm_id, {"capabilities": self.capabilities()}, None, None)
+        self._queue.put((self.targets[comm_id], (connection._endpoint, msg)))
+        # Events sent before the reply would not be encoded with the codec
+        if threading.current_thread() is not self._thread and not self.wait(timeout):
+            raise TimeoutError(f"Local Comm {comm_id} did not reply in time")
+        return connection
+
+    def wait(self, timeout=None):
+        """Waits until the messages sent to the Comms so far have been
+        processed, returning whether they were processed in time.
+        """
+        done = threading.Event()
+        self._queue.put((done.set, ()))
+        return done.wait(timeout)
+
+    def close(self):
+        """Closes all connections and stops processing messages."""
+        for connection in list(self.connections.values()):
+            connection.close()
+        self._queue.put(None)
+        self._thread.join()
+        if LocalFrontend._instance is self:
+            LocalFrontend._instance = None
+
+    def _accept(self, comm_id, data):
+        """Accepts a connection opened by a server Comm, replying with the
+        capabilities selected from its offer.
+        """
+        connection = self.connections[comm_id] = LocalConnection(self, comm_id)
+        offer = (data or {}).get("capabilities")
+        if offer is not None:
+            connection.capabilities = self.negotiate(offer)
+            connection.send(metadata={"msg_type": "Capabilities", **connection.capabilities})
+        return connection._endpoint
+
+    @classmethod
+    def _message(cls, comm_id, data, metadata, buffers):
+        """Builds a message following the Jupyter messaging protocol."""
+        return {
+            "metadata": metadata or {},
+            "content": {"comm_id": comm_id, "data": {} if data is None else data},
+            "buffers": list(buffers or []),
+        }
+
+    def _deliver(self, endpoint, data, metadata, buffers):
+        msg = self._message(endpoint.comm_id, data, metadata, buffers)
+        self._queue.put((endpoint._handle_msg, (msg,)))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            callback, args = item
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+
+
+class LocalComm(JupyterComm):
+    """LocalComm provides a Comm like JupyterComm, which is connected
+    to the LocalFrontend in the same process rather than to a frontend
+    through a Jupyter kernel.
+    """
+
+    def _open_comm(self, data):
+        return LocalFrontend.get()._accept(self.id, data)
+
+    def _can_block(self):
+        return threading.current_thread() is not LocalFrontend.get()._thread
+
+
+class LocalClientComm(JupyterCommJS):
+    """LocalClientComm provides a Comm like JupyterCommJS, which is
+    opened by the LocalFrontend in the same process rather than by a
+    frontend through a Jupyter kernel.
+    """
+
+    def _comm_manager(self):
+        return LocalFrontend.get()
+
+    def _can_block(self):
+        return threading.current_thread() is not self.manager._thread
+
+
+class LocalCommManager(CommManager):
+    """The LocalCommManager establishes Comms connected to the
+    LocalFrontend running in the same process, allowing Comms and their
+    callbacks to be used and load tested without a Jupyter kernel or a
+    browser.
+    """
+
+    server_comm = LocalComm
+
+    client_comm = LocalClientComm
+
+
 __all__ = [
+    "BinaryCodec",
+    "Codec",
     "Comm",
+    "CommRecorder",
+    "CommRegistry",
+    "CommReplayer",
+    "CommStats",
+    "JSONCodec",
+    "JupyterChannel",
+    "JupyterChannelJS",
     "JupyterComm",
     "JupyterCommJS",
     "JupyterCommManager",
+    "LocalClientComm",
+    "LocalComm",
+    "LocalCommManager",
+    "LocalConnection",
+    "LocalFrontend",
+    "MultiplexedCommManager",
+    "Multiplexer",
     "__version__",
     "extension",
 ]
@@ -2,6 +2,9 @@ var JS_MIME_TYPE = 'application/javascript';
 var HTML_MIME_TYPE = 'text/html';
 var EXEC_MIME_TYPE = 'application/vnd.holoviews_exec.v0+json';
 var CLASS_NAME = 'output';
+var DELETE_BATCH_PERIOD = 50;
+
+var pending_deletes = { ids: [], server_ids: [], timeout: null };
 
 /**
  * Render data to the DOM node
@@ -70,6 +73,48 @@ function handle_add_output(event, handle) {
   }
 }
 
+/**
+ * Queue a delete event, sending all deletes queued within a short
+ * period to the kernel as a single batch_delete event, or as separate
+ * events unless the kernel advertised support for batch_delete
+ */
+function queue_delete(key, id) {
+  if (id == null) {
+    return;
+  }
+  pending_deletes[key].push(id);
+  if (pending_deletes.timeout !== null) {
+    return;
+  }
+  pending_deletes.timeout = setTimeout(function () {
+    var msg = {
+      event_type: 'batch_delete',
+      ids: pending_deletes.ids,
+      server_ids: pending_deletes.server_ids
+    };
+    pending_deletes = { ids: [], server_ids: [], timeout: null };
+    var comm = window.PyViz.comm_manager.get_client_comm(
+      'hv-extension-comm',
+      'hv-extension-comm',
+      function () {}
+    );
+    if (comm == null) {
+      return;
+    }
+    var capabilities = window.PyViz.capabilities || {};
+    if ((capabilities['hv-extension-comm'] || {}).batch_delete) {
+      comm.send(msg);
+      return;
+    }
+    for (var id of msg.ids) {
+      comm.send({ event_type: 'delete', id: id });
+    }
+    for (var server_id of msg.server_ids) {
+      comm.send({ event_type: 'server_delete', id: server_id });
+    }
+  }, DELETE_BATCH_PERIOD);
+}
+
 /**
  * Handle when an output is cleared or removed
  */
@@ -77,12 +122,11 @@ function handle_clear_output(event, handle) {
   var id = handle.cell.output_area._hv_plot_id;
   var server_id = handle.cell.output_area._bokeh_server_id;
   if (((id === undefined) || !(id in PyViz.plot_index)) && (server_id !== undefined)) { return; }
-  var comm = window.PyViz.comm_manager.get_client_comm("hv-extension-comm", "hv-extension-comm", function () {});
   if (server_id !== null) {
-    comm.send({event_type: 'server_delete', 'id': server_id});
+    queue_delete('server_ids', server_id);
     return;
-  } else if (comm !== null) {
-    comm.send({event_type: 'delete', 'id': id});
+  } else {
+    queue_delete('ids', id);
   }
   delete PyViz.plot_index[id];
   if ((window.Bokeh !== undefined) & (id in window.Bokeh.index)) {
@@ -99,7 +143,10 @@ function handle_clear_output(event, handle) {
  * Handle kernel restart event
  */
 function handle_kernel_cleanup(event, handle) {
+  clearTimeout(pending_deletes.timeout);
+  pending_deletes = { ids: [], server_ids: [], timeout: null };
   delete PyViz.comms["hv-extension-comm"];
+  window.PyViz.multiplexers = {};
   window.PyViz.plot_index = {}
 }
 
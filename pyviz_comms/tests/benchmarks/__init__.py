@@ -0,0 +1,65 @@
+"""Benchmarks for the pyviz_comms message hot paths.
+
+The benchmarks are not collected by pytest, run them with:
+
+    python -m pyviz_comms.tests.benchmarks [-k PATTERN] [-o results.json] [-c baseline.json]
+
+Every module named ``bench_*`` is imported and each of its ``bench_*``
+functions is called, returning a dictionary of named measurements.
+All measurements are reported such that lower is better, e.g. as
+microseconds per operation or bytes allocated per message, so results
+saved for one commit can be compared against those of another.
+"""
+
+from __future__ import annotations
+
+import importlib
+import pkgutil
+import time
+
+
+def timeit(fn, number, repeat=5):
+    """Returns the best time per call of fn in microseconds over a number
+    of repeats.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def run(pattern=None, quick=False):
+    """Runs all benchmarks, optionally filtered by a substring of the
+    benchmark name, and returns the collected measurements. In quick
+    mode the number of iterations is reduced to smoke test the suite.
+    """
+    results = {}
+    for module_info in pkgutil.iter_modules(__path__):
+        if not module_info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        for name in sorted(dir(module)):
+            if not name.startswith("bench_") or (pattern and pattern not in name):
+                continue
+            for key, value in getattr(module, name)(quick=quick).items():
+                results[f"{name[6:]}.{key}"] = value
+    return results
+
+
+def compare(results, baseline, threshold=1.2):
+    """Compares results against a baseline, returning a dictionary of
+    (baseline, result, ratio) tuples for every shared measurement and
+    the list of measurements which regressed by more than threshold.
+    """
+    comparison, regressions = {}, []
+    for key, value in results.items():
+        if key not in baseline or not baseline[key]:
+            continue
+        ratio = value / baseline[key]
+        comparison[key] = (baseline[key], value, ratio)
+        if ratio > threshold:
+            regressions.append(key)
+    return comparison, regressions
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+from . import compare, run
+
+parser = argparse.ArgumentParser(description="Run the pyviz_comms benchmarks.")
+parser.add_argument("-k", dest="pattern", help="Only run benchmarks matching this substring.")
+parser.add_argument("-o", dest="output", help="Write the results to this JSON file.")
+parser.add_argument("-c", dest="baseline", help="Compare the results against this JSON file.")
+parser.add_argument(
+    "-t",
+    dest="threshold",
+    type=float,
+    default=1.2,
+    help="Ratio relative to the baseline above which a result counts as a regression.",
+)
+parser.add_argument("--quick", action="store_true", help="Run a reduced number of iterations.")
+args = parser.parse_args()
+
+results = run(args.pattern, quick=args.quick)
+if args.output:
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+if not args.baseline:
+    print(json.dumps(results, indent=2, sort_keys=True))
+    sys.exit(0)
+
+with open(args.baseline) as f:
+    baseline = json.load(f)
+comparison, regressions = compare(results, baseline, args.threshold)
+for key, (before, after, ratio) in sorted(comparison.items()):
+    flag = "  REGRESSION" if key in regressions else ""
+    print(f"{key:<50} {before:>14.2f} {after:>14.2f} {ratio:>7.2f}x{flag}")
+sys.exit(1 if regressions else 0)
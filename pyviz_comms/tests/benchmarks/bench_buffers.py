@@ -0,0 +1,53 @@
+"""Measures the number of bytes allocated while sending and decoding
+messages carrying large binary buffers, which should be independent
+of the buffer size if no copies are made.
+"""
+
+from __future__ import annotations
+
+import array
+import tracemalloc
+
+from pyviz_comms import Comm, JupyterCommJS
+
+SIZES = {"1MB": 2**20, "16MB": 2**24}
+
+
+class SinkComm(Comm):
+    def _send(self, data, metadata, buffers):
+        self.last = buffers
+
+
+def _allocated_per_message(fn, number=10):
+    tracemalloc.start()
+    try:
+        fn()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        for _ in range(number):
+            fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - start) // number
+
+
+def bench_send_buffers(quick=False):
+    comm = SinkComm()
+    results = {}
+    for label, size in SIZES.items():
+        data = array.array("d", bytes(size))
+        results[f"{label}_bytes_allocated"] = _allocated_per_message(
+            lambda data=data: comm.send({"type": "patch"}, buffers=[data])
+        )
+    return results
+
+
+def bench_decode_buffers(quick=False):
+    results = {}
+    for label, size in SIZES.items():
+        msg = {"content": {"data": {"type": "event"}}, "buffers": [bytearray(size)]}
+        results[f"{label}_bytes_allocated"] = _allocated_per_message(
+            lambda msg=msg: JupyterCommJS.decode(msg)
+        )
+    return results
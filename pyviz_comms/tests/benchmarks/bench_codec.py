@@ -0,0 +1,43 @@
+"""Measures the cost of encoding and decoding numeric event payloads,
+comparing the JSON serialization performed by the Jupyter messaging
+protocol against the binary codec.
+"""
+
+from __future__ import annotations
+
+import json
+
+from pyviz_comms import Codec
+
+from . import timeit
+
+PAYLOADS = {
+    "selection": {"comm_id": "comm", "index": list(range(10_000))},
+    "box_edit": {
+        "comm_id": "comm",
+        "data": {"x0": [i * 0.5 for i in range(1000)], "y0": [i * 0.25 for i in range(1000)]},
+    },
+}
+
+
+def _json_us(payload, number):
+    return timeit(lambda: json.loads(json.dumps(payload)), number)
+
+
+def _binary_us(payload, number):
+    codec = Codec.registry["binary"]
+
+    def roundtrip():
+        data, buffers = codec.encode(payload)
+        codec.decode(data, buffers)
+
+    return timeit(roundtrip, number)
+
+
+def bench_codec(quick=False):
+    number = 10 if quick else 1000
+    results = {}
+    for name, payload in PAYLOADS.items():
+        results[f"{name}_json_us"] = _json_us(payload, number)
+        results[f"{name}_binary_us"] = _binary_us(payload, number)
+    return results
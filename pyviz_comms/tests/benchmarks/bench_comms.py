@@ -0,0 +1,52 @@
+"""Measures the cost of creating and registering large numbers of comms."""
+
+from __future__ import annotations
+
+import time
+
+import param
+
+from pyviz_comms import Comm, JupyterCommManager
+
+from ..kernel import FakeKernel
+
+
+def _create_us(factory, number):
+    comms = JupyterCommManager._comms
+    existing = set(comms)
+    with FakeKernel():
+        start = time.perf_counter()
+        created = [factory() for _ in range(number)]
+        elapsed = time.perf_counter() - start
+    for comm in created:
+        comms.pop(comm.id, None)
+    assert existing <= set(comms)
+    return elapsed / number * 1e6
+
+
+def _comm_overhead(number):
+    """
+    Ratio of the cost of creating a bare Comm to that of creating a
+    plain Parameterized, so regressions in Comm.__init__ (such as
+    per-instance watchers) show up independently of the machine.
+    """
+
+    def best(factory):
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(number):
+                factory()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    return best(Comm) / best(param.Parameterized)
+
+
+def bench_comm_creation(quick=False):
+    number = 100 if quick else 10_000
+    return {
+        "server_comm_us": _create_us(JupyterCommManager.get_server_comm, number),
+        "client_comm_us": _create_us(JupyterCommManager.get_client_comm, number),
+        "comm_ratio": _comm_overhead(number),
+    }
@@ -0,0 +1,18 @@
+"""Measures the overhead of instantiating an extension."""
+
+from __future__ import annotations
+
+from pyviz_comms import extension
+
+from ..kernel import FakeKernel
+from . import timeit
+
+
+class sample_extension(extension):
+    def __call__(self, *args, **params):
+        pass
+
+
+def bench_extension(quick=False):
+    with FakeKernel():
+        return {"instantiate_us": timeit(sample_extension, 100 if quick else 10_000)}
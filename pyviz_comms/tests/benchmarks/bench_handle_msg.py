@@ -0,0 +1,31 @@
+"""Measures the cost of processing a message received from the frontend,
+from the Jupyter message to the ACK handed to the kernel.
+"""
+
+from __future__ import annotations
+
+from pyviz_comms import JupyterCommManager
+
+from ..kernel import FakeKernel, make_msg
+from . import timeit
+
+
+def _handle_msg_us(quick, **params):
+    with FakeKernel() as kernel:
+        comm = JupyterCommManager.get_client_comm(on_msg=lambda msg: None, **params)
+        ipy_comm = kernel.comm_manager.open(comm.id)
+        msg = make_msg(ipy_comm.comm_id, {"comm_id": comm.id, "x": 1.5, "y": 2.5})
+
+        def handle():
+            ipy_comm.sent.clear()
+            comm._handle_msg(msg)
+
+        return timeit(handle, 100 if quick else 10_000)
+
+
+def bench_handle_msg(quick=False):
+    return {
+        "sync_us": _handle_msg_us(quick),
+        "no_stdout_us": _handle_msg_us(quick, capture_stdout=False),
+        "metrics_us": _handle_msg_us(quick, metrics=True),
+    }
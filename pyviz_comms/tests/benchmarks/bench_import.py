@@ -0,0 +1,35 @@
+"""Measures the time taken to import pyviz_comms in a fresh interpreter."""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+
+
+def _import_times(module):
+    """Returns the self and cumulative import time in microseconds of
+    each module imported by a fresh interpreter importing the supplied
+    module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = (int(self), int(cumulative))
+    return times
+
+
+def bench_import(quick=False):
+    self, total = float("inf"), float("inf")
+    for _ in range(1 if quick else 10):
+        module_self, module_total = _import_times("pyviz_comms")["pyviz_comms"]
+        self, total = min(self, module_self), min(total, module_total)
+    return {"self_us": self, "total_us": total}
@@ -0,0 +1,31 @@
+"""Measures the throughput of events sent by the LocalFrontend to a
+client comm, each of which is decoded, handled and acknowledged like an
+event sent by a browser.
+"""
+
+from __future__ import annotations
+
+from pyviz_comms import LocalCommManager, LocalFrontend
+
+
+def bench_local(quick=False):
+    number = 100 if quick else 10_000
+    frontend = LocalFrontend.get()
+    results = {}
+    try:
+        for max_outstanding in (1, 10):
+            comm = LocalCommManager.get_client_comm(on_msg=lambda msg: None)
+            connection = frontend.open(comm.id)
+            summary = connection.simulate(
+                ({"x": i, "y": i * 0.5} for i in range(number)), max_outstanding=max_outstanding
+            )
+            results[f"outstanding_{max_outstanding}_us_per_event"] = (
+                summary["duration"] / number * 1e6
+            )
+            results[f"outstanding_{max_outstanding}_ack_latency_us"] = (
+                summary["ack_latency"]["mean"] * 1e6
+            )
+            comm.close()
+    finally:
+        frontend.close()
+    return results
@@ -0,0 +1,42 @@
+"""Measures the cost of sending messages to the frontend."""
+
+from __future__ import annotations
+
+from pyviz_comms import JupyterCommManager
+
+from ..kernel import FakeKernel
+from . import timeit
+
+PAYLOAD = {"events": [{"kind": "ModelChanged", "attr": "value", "new": 1}]}
+
+
+def _send_us(quick, buffers=None, capabilities=None, **params):
+    with FakeKernel() as kernel:
+        comm = JupyterCommManager.get_server_comm(**params)
+        comm.send(PAYLOAD)
+        comm.flush()
+        ipy_comm = kernel.comms[comm.id]
+        if capabilities:
+            ipy_comm.receive(metadata={"msg_type": "Capabilities", **capabilities})
+
+        def send():
+            comm.send(PAYLOAD, buffers=buffers)
+            if comm.batch:
+                comm.flush()
+            ipy_comm.sent.clear()
+
+        return timeit(send, 100 if quick else 10_000)
+
+
+def bench_send(quick=False):
+    return {
+        "json_us": _send_us(quick),
+        "buffers_us": _send_us(quick, buffers=[bytes(2**16)] * 2),
+        "batched_us": _send_us(quick, batch=True, batch_period=None),
+        "compressed_us": _send_us(
+            quick,
+            buffers=[bytes(2**16)] * 2,
+            capabilities={"compression": "deflate"},
+            compress_threshold=1024,
+        ),
+    }
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import pytest
+
+from .kernel import FakeKernel
+
+
+@pytest.fixture
+def kernel():
+    with FakeKernel() as kernel:
+        yield kernel
@@ -0,0 +1,157 @@
+"""An in-process stand-in for the ipykernel comm layer.
+
+Allows exercising JupyterComm, JupyterCommJS and JupyterCommManager
+without a running kernel or frontend, e.g.:
+
+    with FakeKernel() as kernel:
+        comm = JupyterCommManager.get_server_comm()
+        comm.send({"a": 1})
+        kernel.comms[comm.id].sent
+"""
+
+from __future__ import annotations
+
+import sys
+import types
+import uuid
+
+import IPython
+
+import pyviz_comms
+
+
+class FakeIPyComm:
+    """Stand-in for ipykernel.comm.Comm which records sent messages and
+    allows simulating messages from the frontend.
+    """
+
+    kernel = None
+
+    def __init__(self, target_name="", data=None, metadata=None, buffers=None, comm_id=None):
+        self.comm_id = comm_id or uuid.uuid4().hex
+        self.target_name = target_name
+        self.open_data = data
+        self.sent = []
+        self.closed = False
+        self._msg_callback = None
+        self._close_callbacks = []
+        if self.kernel is not None:
+            self.kernel.comms[target_name or self.comm_id] = self
+
+    def on_msg(self, callback):
+        self._msg_callback = callback
+
+    def on_close(self, callback):
+        self._close_callbacks.append(callback)
+
+    def send(self, data=None, metadata=None, buffers=None):
+        self.sent.append((data, metadata, buffers))
+
+    def close(self, data=None, metadata=None, buffers=None):
+        if self.closed:
+            return
+        self.closed = True
+        msg = make_msg(self.comm_id, data, metadata, buffers)
+        for callback in self._close_callbacks:
+            callback(msg)
+
+    def handle_msg(self, msg):
+        if self._msg_callback is not None:
+            self._msg_callback(msg)
+
+    def receive(self, data=None, metadata=None, buffers=None):
+        """Simulates a message sent by the frontend."""
+        self.handle_msg(make_msg(self.comm_id, data, metadata, buffers))
+
+
+def make_msg(comm_id, data=None, metadata=None, buffers=None):
+    """Builds a message following the Jupyter messaging protocol."""
+    return {
+        "header": {"msg_id": uuid.uuid4().hex, "msg_type": "comm_msg"},
+        "metadata": metadata or {},
+        "content": {"comm_id": comm_id, "data": {} if data is None else data},
+        "buffers": list(buffers or []),
+    }
+
+
+class FakeCommManager:
+    """Stand-in for the ipykernel CommManager."""
+
+    def __init__(self, kernel):
+        self.kernel = kernel
+        self.targets = {}
+
+    def register_target(self, target_name, callback):
+        self.targets[target_name] = callback
+
+    def unregister_target(self, target_name, callback=None):
+        return self.targets.pop(target_name, None)
+
+    def open(self, target_name, data=None, metadata=None, buffers=None):
+        """Simulates the frontend opening a comm to a registered target."""
+        comm = FakeIPyComm(target_name=target_name, data=data)
+        self.targets[target_name](comm, make_msg(comm.comm_id, data, metadata, buffers))
+        return comm
+
+
+class FakeEvents:
+    """Stand-in for the IPython EventManager."""
+
+    def __init__(self):
+        self.callbacks = {}
+
+    def register(self, event, callback):
+        self.callbacks.setdefault(event, []).append(callback)
+
+    def trigger(self, event, *args):
+        for callback in self.callbacks.get(event, []):
+            callback(*args)
+
+
+class FakeKernel:
+    """Context manager installing a fake kernel and IPython shell so that
+    the Jupyter comms can be used in-process.
+    """
+
+    def __init__(self):
+        self.comm_manager = FakeCommManager(self)
+        self.comms = {}
+        self.events = FakeEvents()
+        self.execution_count = 1
+        self.kernel = self
+
+    def __enter__(self):
+        ipykernel = types.ModuleType("ipykernel")
+        ipykernel_comm = types.ModuleType("ipykernel.comm")
+        ipykernel_comm.Comm = FakeIPyComm
+        ipykernel.comm = ipykernel_comm
+        self._modules = {name: sys.modules.get(name) for name in ("ipykernel", "ipykernel.comm")}
+        sys.modules.update({"ipykernel": ipykernel, "ipykernel.comm": ipykernel_comm})
+        self._state = (
+            IPython.get_ipython,
+            pyviz_comms._in_ipython,
+            pyviz_comms.Comm._flush_hook_registered,
+        )
+        IPython.get_ipython = lambda: self
+        pyviz_comms._in_ipython = True
+        pyviz_comms.Comm._flush_hook_registered = False
+        FakeIPyComm.kernel = self
+        return self
+
+    def __exit__(self, *args):
+        for name, module in self._modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        (
+            IPython.get_ipython,
+            pyviz_comms._in_ipython,
+            pyviz_comms.Comm._flush_hook_registered,
+        ) = self._state
+        FakeIPyComm.kernel = None
+
+    def run_cell(self):
+        """Simulates the end of a cell execution."""
+        self.events.trigger("post_run_cell", None)
+        self.execution_count += 1
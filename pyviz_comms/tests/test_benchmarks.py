@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from .benchmarks import compare, run
+
+
+def test_benchmarks_run():
+    results = run(quick=True)
+
+    assert "handle_msg.sync_us" in results
+    assert "send.json_us" in results
+    assert all(value >= 0 for value in results.values())
+
+
+def test_benchmarks_compare():
+    comparison, regressions = compare({"a": 3, "b": 1, "c": 1}, {"a": 2, "b": 1})
+
+    assert comparison == {"a": (2, 3, 1.5), "b": (1, 1, 1)}
+    assert regressions == ["a"]
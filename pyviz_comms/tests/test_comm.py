@@ -0,0 +1,883 @@
+from __future__ import annotations
+
+import array
+import asyncio
+import datetime
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+import pytest
+
+from pyviz_comms import (
+    ABORT_JS,
+    BinaryCodec,
+    Comm,
+    CommManager,
+    CommRecorder,
+    CommRegistry,
+    CommReplayer,
+    JupyterCommJS,
+    StandardOutput,
+)
+
+
+class RecordingComm(Comm):
+    """Comm which records all transmitted messages."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    def _send(self, data, metadata, buffers):
+        self.sent.append((data, metadata, buffers))
+
+
+class RecordingCommManager(CommManager):
+    server_comm = RecordingComm
+
+    client_comm = RecordingComm
+
+
+@pytest.fixture
+def comm():
+    return RecordingComm()
+
+
+def wait_for(condition, timeout=5):
+    start = time.monotonic()
+    while not condition() and time.monotonic() - start < timeout:
+        time.sleep(0.001)
+    assert condition()
+
+
+def test_send_unbatched(comm):
+    comm.send({"a": 1}, metadata={"b": 2})
+
+    assert comm.sent == [({"a": 1}, {"b": 2}, [])]
+
+
+def test_send_batched_queues_until_flush():
+    comm = RecordingComm(batch=True, batch_period=None)
+    comm.send({"a": 1})
+    comm.send("header", buffers=[b"abc"])
+
+    assert comm.sent == []
+
+    comm.flush()
+
+    assert comm.sent == [
+        (
+            {
+                "parts": [
+                    {"data": {"a": 1}, "metadata": {}, "buffers": 0},
+                    {"data": "header", "metadata": {}, "buffers": 1},
+                ]
+            },
+            {"msg_type": "Batch"},
+            [b"abc"],
+        )
+    ]
+
+
+def test_send_batched_single_message_unwrapped():
+    comm = RecordingComm(batch=True, batch_period=None)
+    comm.send({"a": 1}, metadata={"b": 2})
+    comm.flush()
+
+    assert comm.sent == [({"a": 1}, {"b": 2}, [])]
+
+
+def test_send_batched_flushes_after_period():
+    comm = RecordingComm(batch=True, batch_period=0.01)
+    comm.send({"a": 1})
+    comm.send({"a": 2})
+
+    wait_for(lambda: comm.sent)
+
+    assert len(comm.sent) == 1
+    assert comm.sent[0][1] == {"msg_type": "Batch"}
+
+
+def test_send_batched_flushes_without_starting_threads():
+    comm = RecordingComm(batch=True, batch_period=0.001)
+    comm.send({"a": 0})
+    wait_for(lambda: comm.sent)
+    threads = threading.active_count()
+    counts = []
+    for i in range(20):
+        comm.send({"a": i})
+        time.sleep(0.002)
+        counts.append(threading.active_count())
+
+    wait_for(lambda: len(comm.sent) > 1)
+    assert max(counts) == threads
+
+
+def test_handle_msg_batched_flushes_ack():
+    comm = RecordingComm(on_msg=lambda msg: None, batch=True, batch_period=None)
+    comm._handle_msg({"comm_id": "client", "value": 1})
+
+    assert comm.sent == [(None, {"msg_type": "Ready", "content": "", "comm_id": "client"}, [])]
+
+
+def test_comm_manager_flush():
+    comm = RecordingCommManager.get_server_comm(batch=True, batch_period=None)
+    comm.send({"a": 1})
+    RecordingCommManager.flush()
+
+    assert comm.sent == [({"a": 1}, None, [])]
+
+
+def test_send_buffers_zero_copy(comm):
+    data = bytearray(b"abcd")
+    comm.send({"a": 1}, buffers=[data])
+    data[0] = ord("z")
+
+    (_, _, (buffer,)) = comm.sent[0]
+    assert isinstance(buffer, memoryview)
+    assert buffer.tobytes() == b"zbcd"
+
+
+def test_send_typed_array_buffer_as_bytes(comm):
+    data = array.array("d", [1.0, 2.0])
+    comm.send(buffers=[data])
+
+    (_, _, (buffer,)) = comm.sent[0]
+    assert buffer.format == "B"
+    assert buffer.nbytes == 16
+
+
+def test_send_non_contiguous_buffer_raises(comm):
+    with pytest.raises(ValueError, match="C-contiguous"):
+        comm.send(buffers=[memoryview(bytearray(8))[::2]])
+
+
+def test_jupyter_comm_js_decode_readonly_buffers():
+    data = bytearray(b"abcd")
+    decoded = JupyterCommJS.decode({"content": {"data": {"a": 1}}, "buffers": [data]})
+    data[0] = ord("z")
+
+    buffer = decoded["_buffers"][0]
+    assert decoded["a"] == 1
+    assert buffer.readonly
+    assert buffer.tobytes() == b"zbcd"
+
+
+def test_handle_msg_async_callback_acks_on_completion():
+    events = []
+    release = asyncio.Event()
+
+    async def on_msg(msg):
+        await release.wait()
+        events.append(msg)
+
+    slow, fast = RecordingComm(on_msg=on_msg), RecordingComm(on_msg=events.append)
+
+    async def run():
+        slow._handle_msg({"comm_id": "slow", "value": 1})
+        fast._handle_msg({"comm_id": "fast", "value": 2})
+        assert slow.sent == []
+        assert fast.sent == [(None, {"msg_type": "Ready", "content": "", "comm_id": "fast"}, [])]
+        release.set()
+        while not slow.sent:
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert events == [{"value": 2}, {"value": 1}]
+    assert slow.sent == [(None, {"msg_type": "Ready", "content": "", "comm_id": "slow"}, [])]
+
+
+def test_handle_msg_async_callback_error():
+    async def on_msg(msg):
+        raise ValueError("Failed")
+
+    comm = RecordingComm(on_msg=on_msg)
+
+    async def run():
+        comm._handle_msg({"comm_id": "client"})
+        while not comm.sent:
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    (_, reply, _) = comm.sent[0]
+    assert reply["msg_type"] == "Error"
+    assert reply["comm_id"] == "client"
+    assert "ValueError: Failed" in reply["traceback"]
+
+
+def test_handle_msg_repeated_errors_aggregated():
+    def on_msg(msg):
+        if msg.get("other"):
+            raise ValueError("Other")
+        raise ValueError("Failed")
+
+    comm = RecordingComm(on_msg=on_msg, metrics=True)
+    for _ in range(4):
+        comm._handle_msg({"comm_id": "client"})
+    comm._handle_msg({"comm_id": "client", "other": True})
+
+    replies = [metadata for (_, metadata, _) in comm.sent]
+    assert all(reply["msg_type"] == "Error" for reply in replies)
+    assert all(reply["comm_id"] == "client" for reply in replies)
+    assert "ValueError: Failed" in replies[0]["traceback"]
+    assert [reply.get("repeated") for reply in replies[1:4]] == [1, 2, 3]
+    assert all("traceback" not in reply for reply in replies[1:4])
+    assert replies[1]["error"] == "ValueError: Failed"
+    assert "ValueError: Other" in replies[4]["traceback"]
+    assert comm.stats["errors"] == 5
+    assert comm.stats["suppressed_errors"] == 3
+
+
+def test_handle_msg_repeated_errors_reported_after_window():
+    def on_msg(msg):
+        raise ValueError("Failed")
+
+    comm = RecordingComm(on_msg=on_msg, error_window=0.05, error_limit=2)
+    for _ in range(4):
+        comm._handle_msg({"comm_id": "client"})
+    time.sleep(0.06)
+    comm._handle_msg({"comm_id": "client"})
+
+    replies = [metadata for (_, metadata, _) in comm.sent]
+    assert ["traceback" in reply for reply in replies] == [True, True, False, False, True]
+    assert "(2 similar errors were not reported)" in replies[4]["traceback"]
+
+
+def test_handle_msg_repeated_errors_without_window():
+    def on_msg(msg):
+        raise ValueError("Failed")
+
+    comm = RecordingComm(on_msg=on_msg, error_window=None, metrics=True)
+    for _ in range(3):
+        comm._handle_msg({"comm_id": "client"})
+
+    assert all("ValueError: Failed" in metadata["traceback"] for (_, metadata, _) in comm.sent)
+    assert comm.stats["suppressed_errors"] == 0
+
+
+def test_handle_msg_async_callback_without_event_loop():
+    events = []
+
+    async def on_msg(msg):
+        events.append(msg)
+
+    comm = RecordingComm(on_msg=on_msg)
+    comm._handle_msg({"comm_id": "client", "value": 1})
+
+    assert events == [{"value": 1}]
+    assert comm.sent == [(None, {"msg_type": "Ready", "content": "", "comm_id": "client"}, [])]
+
+
+def test_handle_msg_thread_dispatch_preserves_order():
+    events = []
+    comm = RecordingComm(on_msg=lambda msg: events.append(msg["value"]), dispatch="thread")
+    for i in range(100):
+        comm._handle_msg({"comm_id": "client", "value": i})
+
+    wait_for(lambda: len(comm.sent) == 100)
+
+    assert events == list(range(100))
+    assert all(reply["msg_type"] == "Ready" for (_, reply, _) in comm.sent)
+
+
+def test_handle_msg_thread_dispatch_comms_run_concurrently():
+    fast_done = threading.Event()
+
+    def slow_on_msg(msg):
+        assert fast_done.wait(5)
+
+    slow = RecordingComm(on_msg=slow_on_msg, dispatch="thread")
+    fast = RecordingComm(on_msg=lambda msg: fast_done.set(), dispatch="thread")
+    slow._handle_msg({"comm_id": "slow"})
+    fast._handle_msg({"comm_id": "fast"})
+
+    wait_for(lambda: slow.sent and fast.sent)
+
+    assert slow.sent[0][1]["msg_type"] == "Ready"
+    assert fast.sent[0][1]["msg_type"] == "Ready"
+
+
+def test_handle_msg_thread_dispatch_ack_after_callback():
+    release = threading.Event()
+    comm = RecordingComm(on_msg=lambda msg: release.wait(5), dispatch="thread")
+    comm._handle_msg({"comm_id": "client"})
+
+    time.sleep(0.01)
+    assert comm.sent == []
+
+    release.set()
+    wait_for(lambda: comm.sent)
+
+
+def test_standard_output_capture():
+    with StandardOutput() as stdout:
+        print("This gets captured")
+
+    assert stdout == ["This gets captured"]
+
+
+def test_standard_output_limit():
+    with StandardOutput(limit=5) as stdout:
+        print("0123456789")
+
+    assert stdout == ["01234", "[6 characters of output truncated]"]
+
+
+def test_standard_output_restores_stdout():
+    stream = sys.stdout
+    with StandardOutput():
+        with StandardOutput():
+            assert sys.stdout is not stream
+        assert sys.stdout is not stream
+
+    assert sys.stdout is stream
+
+
+def test_standard_output_captures_writelines():
+    with StandardOutput() as stdout:
+        sys.stdout.writelines(["a\n", "b\n"])
+
+    assert stdout == ["a", "b"]
+
+
+def test_standard_output_isolated_between_threads():
+    barrier = threading.Barrier(2)
+    outputs = {}
+
+    def capture(name):
+        with StandardOutput() as stdout:
+            barrier.wait(5)
+            print(name)
+            barrier.wait(5)
+        outputs[name] = stdout
+
+    threads = [threading.Thread(target=capture, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outputs == {"a": ["a"], "b": ["b"]}
+
+
+def test_handle_msg_forwards_stdout():
+    captured = []
+    comm = RecordingComm(on_msg=lambda msg: print("Output"), on_stdout=captured.append)
+    comm._handle_msg({"comm_id": "client"})
+
+    assert captured == [["Output"]]
+    assert comm.sent[0][1]["content"] == "\n\tOutput"
+
+
+def test_handle_msg_capture_stdout_disabled(capsys):
+    captured = []
+    comm = RecordingComm(
+        on_msg=lambda msg: print("Output"), on_stdout=captured.append, capture_stdout=False
+    )
+    comm._handle_msg({"comm_id": "client"})
+
+    assert captured == []
+    assert comm.sent[0][1]["content"] == ""
+    assert capsys.readouterr().out == "Output\n"
+
+
+def test_handle_msg_skips_capture_without_consumer(capsys):
+    comm = RecordingComm(on_msg=lambda msg: print("Output"))
+    comm._handle_msg({"comm_id": "client"})
+
+    assert comm.sent[0][1]["content"] == ""
+    assert capsys.readouterr().out == "Output\n"
+
+
+def test_handle_msg_async_callback_forwards_stdout():
+    captured = []
+
+    async def on_msg(msg):
+        await asyncio.sleep(0)
+        print("Output")
+
+    comm = RecordingComm(on_msg=on_msg, on_stdout=captured.append)
+
+    async def run():
+        comm._handle_msg({"comm_id": "client"})
+        print("Unrelated")
+        while not comm.sent:
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert captured == [["Output"]]
+    assert comm.sent[0][1]["content"] == "\n\tOutput"
+
+
+def test_comm_metrics_disabled_by_default(comm):
+    comm._handle_msg({"comm_id": "client"})
+
+    assert comm.stats is None
+
+
+def test_comm_registers_no_parameter_watchers():
+    # Per-instance watchers make param copy the Parameters of every Comm
+    comm = RecordingComm(metrics=True)
+
+    assert comm.param.watchers == {}
+
+
+def test_comm_metrics_enabled_on_class_after_comms_were_created():
+    RecordingComm()
+    Comm.metrics = True
+    try:
+        comm = RecordingComm()
+
+        assert comm.metrics is True
+        assert comm.stats is not None
+    finally:
+        Comm.metrics = False
+
+    assert RecordingComm().stats is None
+
+
+def test_comm_metrics_records_traffic():
+    def on_msg(msg):
+        if msg.get("fail"):
+            raise ValueError("Failed")
+
+    comm = RecordingComm(on_msg=on_msg, metrics=True)
+    comm.send("abcd", buffers=[b"0123456789"])
+    comm._handle_msg({"comm_id": "client", "value": 1})
+    comm._handle_msg({"comm_id": "client", "fail": True})
+
+    stats = comm.stats
+    assert stats["msgs_out"] == 3
+    assert stats["msgs_in"] == 2
+    assert stats["bytes_out"] >= 14
+    assert stats["bytes_in"] > 0
+    assert stats["errors"] == 1
+    assert stats["handler_latency"]["count"] == 2
+    assert stats["handler_to_ack_latency"]["count"] == 2
+    assert sum(stats["handler_to_ack_latency"]["buckets"].values()) == 2
+
+
+def test_comm_metrics_estimates_size_of_large_messages():
+    data = {"x": list(range(10_000)), "y": [{"label": "abc", "value": 1.5}] * 1000}
+    comm = RecordingComm(metrics=True)
+    comm.send(data)
+
+    size = len(json.dumps(data))
+    assert size / 2 < comm.stats["bytes_out"] < size * 2
+
+
+def test_comm_metrics_toggle():
+    comm = RecordingComm()
+    comm.metrics = True
+    comm.send("abcd")
+
+    assert comm.stats["msgs_out"] == 1
+
+    comm.metrics = False
+
+    assert comm.stats is None
+
+
+def test_comm_manager_stats():
+    comm = RecordingCommManager.get_server_comm(metrics=True)
+    other = RecordingCommManager.get_server_comm()
+    comm.send("abcd")
+
+    stats = RecordingCommManager.get_stats()
+    assert stats[comm.id]["msgs_out"] == 1
+    assert other.id not in stats
+
+    RecordingCommManager.reset_stats()
+
+    assert RecordingCommManager.get_stats()[comm.id]["msgs_out"] == 0
+
+
+def test_comm_registry_drops_unreferenced_comms():
+    registry = CommRegistry()
+    comm = RecordingComm()
+    registry[comm.id] = comm
+
+    assert len(registry) == 1
+
+    del comm
+    gc.collect()
+
+    assert len(registry) == 0
+
+
+def test_comm_registry_drops_closed_comms():
+    registry = CommRegistry()
+    comm = RecordingComm()
+    registry[comm.id] = comm
+    comm.close()
+
+    assert comm.id not in registry
+
+
+def test_comm_registry_lru_eviction():
+    closed = []
+
+    class ClosingComm(RecordingComm):
+        def close(self):
+            super().close()
+            closed.append(self.id)
+
+    registry = CommRegistry(max_size=2)
+    comms = [ClosingComm() for _ in range(3)]
+    registry[comms[0].id] = comms[0]
+    registry[comms[1].id] = comms[1]
+    comms[0].send({"a": 1})
+    registry[comms[2].id] = comms[2]
+
+    assert closed == [comms[1].id]
+    assert list(registry) == [comms[0].id, comms[2].id]
+
+
+def test_comm_registry_resize():
+    registry = CommRegistry()
+    comms = [RecordingComm() for _ in range(3)]
+    for comm in comms:
+        registry[comm.id] = comm
+    registry.resize(1)
+
+    assert list(registry) == [comms[2].id]
+
+
+def test_comm_manager_live_comms():
+    count = CommManager.live_comms()
+    comm = RecordingCommManager.get_server_comm()
+
+    assert CommManager.live_comms() == count + 1
+
+    comm.close()
+
+    assert CommManager.live_comms() == count
+
+
+def test_binary_codec_roundtrip():
+    codec = BinaryCodec()
+    data = {
+        "none": None,
+        "bool": [True, False],
+        "int": -(2**40),
+        "float": 0.5,
+        "str": "héllo",
+        "ints": [1, -2, 3],
+        "floats": [0.5, 1, 2.25],
+        "nested": [{"a": "b"}, [], ("c", 1)],
+        "bytes": b"abc",
+    }
+    encoded, buffers = codec.encode(data)
+    decoded, remaining = codec.decode(encoded, [*buffers, b"extra"])
+
+    assert decoded == dict(data, nested=[{"a": "b"}, [], ["c", 1]])
+    assert decoded["bytes"].tobytes() == b"abc"
+    assert remaining == [b"extra"]
+
+
+def test_binary_codec_packs_numeric_lists():
+    codec = BinaryCodec()
+    (_, (ints,)) = codec.encode(list(range(100)))
+    (_, (floats,)) = codec.encode([0.5] * 100)
+
+    assert ints.nbytes == 1 + 4 + 4 * 100
+    assert floats.nbytes == 1 + 4 + 8 * 100
+
+
+def test_binary_codec_preserves_large_integers():
+    codec = BinaryCodec()
+
+    assert codec.decode(*codec.encode([1, 2**40]))[0] == [1, 2**40]
+    assert all(type(v) is int for v in codec.decode(*codec.encode([1, 2**40]))[0])
+
+
+@pytest.mark.parametrize("data", [2**63, [1, -(2**64)], [0.5, 2**70], {"a": [2**100]}])
+def test_binary_codec_rejects_integers_outside_int64(data):
+    with pytest.raises(OverflowError, match="outside the int64 range"):
+        BinaryCodec().encode(data)
+
+
+def test_binary_codec_unsupported_type():
+    with pytest.raises(TypeError, match="cannot encode object of type object"):
+        BinaryCodec().encode({"a": object()})
+
+
+def test_send_encodes_with_negotiated_codec():
+    comm = RecordingComm(codecs=["binary", "json"])
+    comm._apply_capabilities(comm._negotiate({"codecs": ["json", "binary"]}))
+    comm.send({"a": [1, 2]}, metadata={"b": 1}, buffers=[b"abc"])
+    comm.send("text")
+
+    ((data, metadata, buffers), text) = comm.sent
+    assert data == {}
+    assert metadata == {"b": 1, "codec": "binary"}
+    assert BinaryCodec().decode(data, buffers)[0] == {"a": [1, 2]}
+    assert buffers[1].tobytes() == b"abc"
+    assert text == ("text", None, [])
+
+
+def test_negotiate_defaults_to_json(comm):
+    assert comm._negotiate({"codecs": ["binary", "json"]})["codec"] == "json"
+
+
+def test_negotiate_falls_back_to_json(comm):
+    assert comm._negotiate({"codecs": ["unknown"]})["codec"] == "json"
+    assert comm._negotiate({})["codec"] == "json"
+
+
+def test_send_compresses_buffers_above_threshold():
+    comm = RecordingComm(compress_threshold=100)
+    comm._apply_capabilities({"compression": "deflate"})
+    comm.send({"a": 1}, metadata={"b": 1}, buffers=[bytes(10), bytes(1000), os.urandom(1000)])
+
+    ((_, metadata, (small, large, random)),) = comm.sent
+    assert metadata == {"b": 1, "compressed": [1]}
+    assert small.nbytes == 10
+    assert zlib.decompress(large) == bytes(1000)
+    assert random.nbytes == 1000
+
+
+def test_send_does_not_compress_without_negotiation():
+    comm = RecordingComm(compress_threshold=100)
+    comm.send(buffers=[bytes(1000)])
+
+    ((_, metadata, (buffer,)),) = comm.sent
+    assert metadata is None
+    assert buffer.nbytes == 1000
+
+
+def test_flow_control_drop_policy():
+    comm = RecordingComm(max_in_flight=2, flow_policy="drop", metrics=True)
+    comm._apply_capabilities({"credits": True})
+    for i in range(3):
+        comm.send({"i": i})
+
+    assert [data for (data, _, _) in comm.sent] == [{"i": 0}, {"i": 1}]
+    assert comm.stats["dropped"] == 1
+
+    comm._release(1)
+    comm.send({"i": 3})
+
+    assert comm.sent[-1][0] == {"i": 3}
+    assert comm.stats["credit_latency"]["count"] == 1
+
+
+def test_flow_control_merge_policy():
+    comm = RecordingComm(max_in_flight=2, flow_policy="merge")
+    comm._apply_capabilities({"credits": True})
+    for i in range(5):
+        comm.send({"i": i})
+
+    assert len(comm.sent) == 2
+
+    comm._release(1)
+
+    (data, metadata, _) = comm.sent[-1]
+    assert metadata == {"msg_type": "Batch"}
+    assert [part["data"] for part in data["parts"]] == [{"i": 2}, {"i": 3}, {"i": 4}]
+
+
+def test_flow_control_block_policy_queues_on_main_thread():
+    comm = RecordingComm(max_in_flight=2)
+    comm._apply_capabilities({"credits": True})
+    for i in range(4):
+        comm.send({"i": i})
+
+    assert len(comm.sent) == 2
+
+    comm._release(1)
+
+    assert [data for (data, _, _) in comm.sent] == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+
+def test_flow_control_block_policy_blocks_other_threads():
+    comm = RecordingComm(max_in_flight=2)
+    comm._apply_capabilities({"credits": True})
+    thread = threading.Thread(target=lambda: [comm.send({"i": i}) for i in range(3)])
+    thread.start()
+
+    wait_for(lambda: len(comm.sent) == 2)
+    time.sleep(0.01)
+    assert thread.is_alive()
+
+    comm._release(1)
+    thread.join(5)
+
+    assert [data for (data, _, _) in comm.sent] == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+
+def test_flow_control_block_policy_with_batching_never_blocks_sends():
+    comm = RecordingComm(max_in_flight=1, batch=True, batch_period=0.001)
+    comm._apply_capabilities({"credits": True})
+    comm.send({"i": 0})
+    wait_for(lambda: len(comm.sent) == 1)
+    comm.send({"i": 1})
+    time.sleep(0.01)
+
+    # The timer flushing the batch queues the message rather than
+    # waiting for credits, so sends on other threads do not block
+    sender = threading.Thread(target=comm.send, args=({"i": 2},))
+    sender.start()
+    sender.join(5)
+    assert not sender.is_alive()
+
+    wait_for(lambda: not comm._batch_queue)
+    comm._release(1)
+    comm._release(1)
+
+    assert [data for data, _, _ in comm.sent] == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+
+def test_flow_control_close_releases_blocked_sender():
+    comm = RecordingComm(max_in_flight=2)
+    comm._apply_capabilities({"credits": True})
+    thread = threading.Thread(target=lambda: [comm.send({"i": i}) for i in range(3)])
+    thread.start()
+    wait_for(lambda: len(comm.sent) == 2)
+
+    comm.close()
+    thread.join(5)
+
+    assert not thread.is_alive()
+
+
+def test_flow_control_never_holds_back_acks():
+    comm = RecordingComm(max_in_flight=2, flow_policy="drop", on_msg=lambda msg: None)
+    comm._apply_capabilities({"credits": True})
+    comm.send({"i": 0})
+    comm.send({"i": 1})
+    comm._handle_msg({"comm_id": "client"})
+
+    assert comm.sent[-1][1]["msg_type"] == "Ready"
+
+
+def test_flow_control_requires_negotiation():
+    comm = RecordingComm(max_in_flight=1, flow_policy="drop")
+    comm.send({"i": 0})
+    comm.send({"i": 1})
+
+    assert len(comm.sent) == 2
+
+
+def test_recorder_records_sent_and_received_messages(tmp_path):
+    recorder = CommRecorder(tmp_path / "session.log")
+    comm = RecordingComm(on_msg=lambda msg: None, recorder=recorder)
+    comm._handle_msg({"comm_id": "plot", "x": 1})
+    comm.send({"a": 1}, buffers=[b"abc"])
+    recorder.close()
+
+    records = list(CommReplayer(tmp_path / "session.log"))
+
+    assert [(r["direction"], r["comm_id"], r["data"], r["buffers"]) for r in records] == [
+        ("in", comm.id, {"comm_id": "plot", "x": 1}, []),
+        ("out", comm.id, None, []),
+        ("out", comm.id, {"a": 1}, [b"abc"]),
+    ]
+    assert records[1]["metadata"] == {"msg_type": "Ready", "content": "", "comm_id": "plot"}
+    assert records[0]["time"] <= records[1]["time"] <= records[2]["time"]
+
+
+def test_recorder_serializes_values_json_does_not_support(tmp_path):
+    recorder = CommRecorder(tmp_path / "session.log")
+    comm = RecordingComm(recorder=recorder)
+    comm.send({"date": datetime.date(2024, 1, 31), "index": array.array("i", [1, 2])})
+    recorder.close()
+
+    (record,) = CommReplayer(tmp_path / "session.log")
+
+    assert record["data"] == {"date": "2024-01-31", "index": [1, 2]}
+
+
+def test_recorder_errors_do_not_break_delivery(tmp_path, capsys):
+    comm = RecordingComm(recorder=CommRecorder(tmp_path))
+    comm.send({"a": 1})
+
+    assert comm.sent == [({"a": 1}, None, [])]
+    assert "Error" in capsys.readouterr().err
+
+
+def test_replayer_replays_received_messages(tmp_path):
+    with CommRecorder(tmp_path / "session.log") as recorder:
+        RecordingComm(recorder=recorder)._handle_msg({"x": 1})
+        other = RecordingComm(recorder=recorder)
+        other._handle_msg({"x": 2})
+        other._handle_msg({"x": 3})
+    received = []
+    comm = RecordingComm(on_msg=received.append)
+
+    summary = CommReplayer(tmp_path / "session.log").replay(comm, speed=None, comm_id=other.id)
+
+    assert received == [{"x": 2}, {"x": 3}]
+    assert [metadata["msg_type"] for _, metadata, _ in comm.sent] == ["Ready", "Ready"]
+    assert summary["messages"] == 2
+    assert summary["handler_latency"]["count"] == 2
+
+
+def test_replayer_preserves_intervals_divided_by_speed(tmp_path):
+    with CommRecorder(tmp_path / "session.log") as recorder:
+        comm = RecordingComm(recorder=recorder)
+        comm._handle_msg({"x": 1})
+        time.sleep(0.02)
+        comm._handle_msg({"x": 2})
+    now = [0.0]
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        now[0] += delay
+
+    replayer = CommReplayer(tmp_path / "session.log", clock=lambda: now[0], sleep=sleep)
+    first, second = (record["time"] for record in replayer if record["direction"] == "in")
+    summary = replayer.replay(RecordingComm(), speed=2)
+
+    assert sleeps == [pytest.approx((second - first) / 2)]
+    assert summary["duration"] == sum(sleeps)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="requires node")
+def test_abort_js_detects_echoed_changes():
+    callback = ABORT_JS.format(plot_id="plot", change="value", transform="")
+    script = f"""
+    globalThis.window = {{PyViz: {{receivers: {{}}}}}};
+    var callback = new Function('cb_obj', {json.dumps(callback + "return 'sent';")});
+    var events = [
+      {{kind: 'ModelChanged', model: {{id: 'slider'}}, attr: 'value', new: 1}},
+      {{kind: 'ModelChanged', model: {{id: 'slider'}}, attr: 'value', new: 2}},
+      {{kind: 'ModelChanged', model: {{id: 'range'}}, attr: 'value', new: [0, 1]}},
+      {{kind: 'ModelChanged', model: {{id: 'range'}}, attr: 'start', new: 5}},
+      {{kind: 'ModelChanged', model: {{id: 'nan'}}, attr: 'value', new: NaN}}
+    ];
+    var results = [callback({{id: 'slider', value: 1}})];
+    window.PyViz.receivers.plot = {{_partial: {{content: {{events: events}}}}}};
+    for (var cb_obj of [
+      {{id: 'slider', value: 1}}, {{id: 'slider', value: 2}}, {{id: 'slider', value: 3}},
+      {{id: 'range', value: [0, 1]}}, {{id: 'range', value: [0, 2]}},
+      {{id: 'range', value: 5}}, {{id: 'nan', value: NaN}}, {{id: 'other', value: 1}}
+    ]) {{
+      results.push(callback(cb_obj));
+    }}
+    console.log(JSON.stringify(results));
+    """
+    result = subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True)
+
+    assert json.loads(result.stdout) == [
+        "sent",  # No partial message is being applied
+        None,
+        None,
+        "sent",
+        None,
+        "sent",
+        "sent",  # Only changes of the same attribute are echoes
+        None,
+        "sent",
+    ]
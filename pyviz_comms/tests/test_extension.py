@@ -300,3 +300,87 @@ def test_extension_count_two_cells_subclass_first(get_ipython):
     assert sub_extension._repeat_execution_in_cell is False
     assert sub_extension._repeat_execution_in_cell == parent_extension._repeat_execution_in_cell
     assert parent_extension._repeat_execution_in_cell == extension._repeat_execution_in_cell
+
+
+@pytest.fixture
+def delete_actions():
+    registries = (
+        "_delete_actions",
+        "_server_delete_actions",
+        "_keyed_delete_actions",
+        "_keyed_server_delete_actions",
+    )
+    state = {name: getattr(extension, name).copy() for name in registries}
+    yield
+    for name, value in state.items():
+        setattr(extension, name, value)
+
+
+def test_delete_action_global(delete_actions):
+    deleted = []
+    extension.add_delete_action(deleted.append)
+
+    extension._process_comm_msg({"event_type": "delete", "id": "a"})
+    extension._process_comm_msg({"event_type": "delete", "id": "b"})
+
+    assert deleted == ["a", "b"]
+
+
+def test_delete_action_keyed(delete_actions):
+    deleted = []
+    extension.add_delete_action(deleted.append, id="a")
+
+    extension._process_comm_msg({"event_type": "delete", "id": "b"})
+
+    assert deleted == []
+
+    extension._process_comm_msg({"event_type": "delete", "id": "a"})
+    extension._process_comm_msg({"event_type": "delete", "id": "a"})
+
+    assert deleted == ["a"]
+    assert "a" not in extension._keyed_delete_actions
+
+
+def test_server_delete_action_keyed(delete_actions):
+    deleted = []
+    extension.add_server_delete_action(deleted.append, id="a")
+    extension.add_delete_action(deleted.append, id="a")
+
+    extension._process_comm_msg({"event_type": "server_delete", "id": "a"})
+
+    assert deleted == ["a"]
+    assert "a" in extension._keyed_delete_actions
+
+
+def test_batch_delete(delete_actions):
+    deleted, server_deleted = [], []
+    extension.add_delete_action(deleted.append)
+    extension.add_delete_action(lambda id: deleted.append(f"keyed-{id}"), id="b")
+    extension.add_server_delete_action(server_deleted.append)
+
+    extension._process_comm_msg(
+        {"event_type": "batch_delete", "ids": ["a", "b"], "server_ids": ["s"]}
+    )
+
+    assert deleted == ["a", "keyed-b", "b"]
+    assert server_deleted == ["s"]
+
+
+def test_batch_delete_continues_after_failing_action(delete_actions, capsys):
+    deleted, server_deleted = [], []
+
+    def action(id):
+        deleted.append(id)
+        if id == "a":
+            raise ValueError("Failed")
+
+    extension.add_delete_action(action)
+    extension.add_server_delete_action(server_deleted.append)
+
+    extension._process_comm_msg(
+        {"event_type": "batch_delete", "ids": ["a", "b", "c"], "server_ids": ["s"]}
+    )
+
+    assert deleted == ["a", "b", "c"]
+    assert server_deleted == ["s"]
+    assert "ValueError: Failed" in capsys.readouterr().err
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pyviz_comms
+
+
+def _run(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def test_import_defers_loading_files():
+    output = _run(
+        "import pyviz_comms; print(sorted({'data', 'nb_mime_js'} & set(vars(pyviz_comms))))"
+    )
+
+    assert output == "[]"
+
+
+def test_import_defers_asyncio():
+    output = _run("import sys, pyviz_comms; print('asyncio' in sys.modules)")
+
+    assert output == "False"
+
+
+def test_lazy_module_attributes():
+    assert pyviz_comms.nb_mime_js.startswith("\n\n")
+    assert "EXEC_MIME_TYPE" in pyviz_comms.nb_mime_js
+    assert pyviz_comms._jupyter_labextension_paths() == [
+        {"src": "labextension", "dest": pyviz_comms.data["name"]}
+    ]
+
+
+def test_labextension_paths_read_package_json_once():
+    output = _run(
+        "import builtins, pyviz_comms\n"
+        "opened = []\n"
+        "open_ = builtins.open\n"
+        "builtins.open = lambda *args, **kwargs: opened.append(args[0]) or open_(*args, **kwargs)\n"
+        "pyviz_comms._jupyter_labextension_paths()\n"
+        "pyviz_comms._jupyter_labextension_paths()\n"
+        "print(len(opened))"
+    )
+
+    assert output == "1"
+
+
+def test_public_names_are_exported():
+    exported = set(pyviz_comms.__all__)
+
+    assert {"Codec", "JSONCodec", "BinaryCodec", "CommStats", "CommRegistry"} <= exported
+    assert all(hasattr(pyviz_comms, name) for name in exported)
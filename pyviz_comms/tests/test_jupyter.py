@@ -0,0 +1,584 @@
+from __future__ import annotations
+
+import array
+import datetime
+import json
+import struct
+import threading
+import time
+import zlib
+
+import pytest
+
+from pyviz_comms import BinaryCodec, JupyterCommManager, MultiplexedCommManager, Multiplexer
+
+
+def test_server_comm_opened_on_send(kernel):
+    comm = JupyterCommManager.get_server_comm()
+
+    assert comm.id not in kernel.comms
+
+    comm.send({"a": 1}, buffers=[b"abc"])
+
+    ipy_comm = kernel.comms[comm.id]
+    assert ipy_comm.target_name == comm.id
+    assert ipy_comm.sent == [({"a": 1}, None, [b"abc"])]
+
+
+def test_server_comm_close(kernel):
+    comm = JupyterCommManager.get_server_comm()
+    comm.send({"a": 1})
+    comm.close()
+
+    assert kernel.comms[comm.id].closed
+
+
+def test_client_comm_handle_msg(kernel):
+    events = []
+    comm = JupyterCommManager.get_client_comm(on_msg=events.append)
+    ipy_comm = kernel.comm_manager.open(comm.id)
+    ipy_comm.receive({"comm_id": comm.id, "value": 1}, buffers=[b"abc"])
+
+    assert events == [{"value": 1, "_buffers": {0: b"abc"}}]
+    assert ipy_comm.sent == [(None, {"msg_type": "Ready", "content": "", "comm_id": comm.id}, [])]
+
+
+def test_client_comm_on_open(kernel):
+    opened = []
+    comm = JupyterCommManager.get_client_comm(on_open=opened.append)
+    kernel.comm_manager.open(comm.id, data={"a": 1})
+
+    assert opened[0]["content"]["data"] == {"a": 1}
+
+
+def test_client_comm_close_unregisters_target(kernel):
+    comm = JupyterCommManager.get_client_comm()
+
+    assert comm.id in kernel.comm_manager.targets
+
+    comm.close()
+
+    assert comm.id not in kernel.comm_manager.targets
+
+
+def test_batched_server_comm_flushed_at_end_of_cell(kernel):
+    comm = JupyterCommManager.get_server_comm(batch=True, batch_period=None)
+    comm.send({"a": 1})
+    comm.send({"a": 2})
+
+    assert comm.id not in kernel.comms
+
+    kernel.run_cell()
+
+    (data, metadata, _) = kernel.comms[comm.id].sent[0]
+    assert metadata == {"msg_type": "Batch"}
+    assert [part["data"] for part in data["parts"]] == [{"a": 1}, {"a": 2}]
+
+
+def test_client_comm_closed_by_frontend_unregisters(kernel):
+    comm = JupyterCommManager.get_client_comm()
+    ipy_comm = kernel.comm_manager.open(comm.id)
+
+    assert comm.id in JupyterCommManager._comms
+
+    ipy_comm.close()
+
+    assert comm.id not in JupyterCommManager._comms
+
+
+def test_server_comm_negotiates_codec(kernel):
+    comm = JupyterCommManager.get_server_comm(codecs=["binary", "json"])
+    comm.send({"a": 1})
+    ipy_comm = kernel.comms[comm.id]
+
+    assert ipy_comm.open_data == {
+        "capabilities": {
+            "codecs": ["binary", "json"],
+            "compression": ["deflate"],
+            "credits": False,
+            "chunking": False,
+        }
+    }
+
+    ipy_comm.receive(metadata={"msg_type": "Capabilities", "codec": "binary"})
+    comm.send({"a": 2})
+
+    ((data, metadata, _), (encoded, encoded_metadata, buffers)) = ipy_comm.sent
+    assert (data, metadata) == ({"a": 1}, None)
+    assert encoded_metadata == {"codec": "binary"}
+    assert BinaryCodec().decode(encoded, buffers)[0] == {"a": 2}
+
+
+def test_client_comm_negotiates_codec(kernel):
+    events = []
+    comm = JupyterCommManager.get_client_comm(on_msg=events.append, codecs=["binary"])
+    ipy_comm = kernel.comm_manager.open(comm.id, data={"capabilities": {"codecs": ["binary"]}})
+
+    ((_, reply, _),) = ipy_comm.sent
+    assert reply["msg_type"] == "Capabilities"
+    assert reply["comm_id"] == comm.id
+    assert reply["codec"] == "binary"
+    assert reply["batch_delete"] is True
+
+    (encoded, buffers) = BinaryCodec().encode({"comm_id": comm.id, "value": [0.5, 1.5]})
+    ipy_comm.receive(encoded, metadata={"codec": "binary"}, buffers=[*buffers, b"abc"])
+
+    assert events == [{"value": [0.5, 1.5], "_buffers": {0: b"abc"}}]
+
+
+def test_client_comm_without_capabilities_uses_json(kernel):
+    comm = JupyterCommManager.get_client_comm()
+    ipy_comm = kernel.comm_manager.open(comm.id)
+    comm.send({"a": 1})
+
+    assert ipy_comm.sent == [({"a": 1}, None, [])]
+
+
+def test_client_comm_sends_event_settings(kernel):
+    comm = JupyterCommManager.get_client_comm(event_throttle=100)
+    ipy_comm = kernel.comm_manager.open(comm.id, data={"capabilities": {}})
+    comm.event_timeout = 5000
+
+    ((_, reply, _), (_, update, _)) = ipy_comm.sent
+    assert reply["settings"] == {"throttle": 100}
+    assert update == {
+        "msg_type": "Settings",
+        "comm_id": comm.id,
+        "settings": {"throttle": 100, "timeout": 5000},
+    }
+
+
+def test_client_comm_echoes_trace_in_ack(kernel):
+    comm = JupyterCommManager.get_client_comm(on_msg=lambda msg: None, trace=True, metrics=True)
+    ipy_comm = kernel.comm_manager.open(comm.id, data={"capabilities": {}})
+    previous = {"debounce": 10, "transport": 20, "queue": 1, "handler": 5, "total": 36}
+    trace = {"event": 1000, "sent": 1010, "previous": [previous]}
+    ipy_comm.receive({"comm_id": comm.id, "value": 1}, metadata={"trace": trace})
+
+    ((_, capabilities, _), (_, ack, _)) = ipy_comm.sent
+    assert capabilities["settings"] == {"trace": True}
+    assert ack["trace"]["event"] == 1000
+    assert ack["trace"]["sent"] == 1010
+    assert "previous" not in ack["trace"]
+    assert ack["trace"]["received"] <= ack["trace"]["start"] <= ack["trace"]["end"]
+    assert abs(ack["trace"]["end"] - time.time() * 1000) < 1000
+
+    trace_latency = comm.stats["trace_latency"]
+    assert trace_latency["transport"]["count"] == 1
+    assert trace_latency["transport"]["mean"] == 0.02
+    assert trace_latency["total"]["p95"] == 0.036
+
+
+def test_client_comm_returns_stdout_to_frontend(kernel):
+    comm = JupyterCommManager.get_client_comm(on_msg=lambda msg: print("Output"))
+    ipy_comm = kernel.comm_manager.open(comm.id)
+    ipy_comm.receive({"comm_id": comm.id, "value": 1})
+
+    ((_, ack, _),) = ipy_comm.sent
+    assert ack["content"] == "\n\tOutput"
+
+
+def test_client_comm_echoes_batch_in_ack(kernel):
+    comm = JupyterCommManager.get_client_comm(on_msg=lambda msg: None)
+    ipy_comm = kernel.comm_manager.open(comm.id)
+    ipy_comm.receive({"comm_id": comm.id, "value": 1}, metadata={"batch": 3})
+    ipy_comm.receive({"comm_id": comm.id, "value": 2})
+
+    ((_, ack, _), (_, legacy_ack, _)) = ipy_comm.sent
+    assert ack == {"msg_type": "Ready", "content": "", "comm_id": comm.id, "batch": 3}
+    assert "batch" not in legacy_ack
+
+
+def test_client_comm_coalesces_queued_events(kernel):
+    events, started, release = [], threading.Event(), threading.Event()
+
+    def on_msg(msg):
+        started.set()
+        release.wait(5)
+        events.append(msg["value"])
+
+    comm = JupyterCommManager.get_client_comm(
+        on_msg=on_msg, dispatch="thread", coalesce=True, metrics=True
+    )
+    ipy_comm = kernel.comm_manager.open(comm.id)
+    for value in range(5):
+        ipy_comm.receive(
+            {"comm_id": comm.id, "value": value}, metadata={"event_key": "slider|value"}
+        )
+        assert started.wait(5)
+    ipy_comm.receive({"comm_id": comm.id, "value": "other"}, metadata={"event_key": "other"})
+
+    superseded = [metadata for _, metadata, _ in ipy_comm.sent]
+    assert (
+        superseded
+        == [{"msg_type": "Ready", "content": "", "superseded": True, "comm_id": comm.id}] * 3
+    )
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while len(ipy_comm.sent) < 6 and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+    assert events == [0, 4, "other"]
+    assert [metadata["msg_type"] for _, metadata, _ in ipy_comm.sent] == ["Ready"] * 6
+    assert comm.stats["coalesced"] == 3
+
+
+def test_server_comm_compresses_buffers_when_negotiated(kernel):
+    comm = JupyterCommManager.get_server_comm(compress_threshold=1024)
+    comm.send("uncompressed", buffers=[bytes(4096)])
+    ipy_comm = kernel.comms[comm.id]
+    ipy_comm.receive(metadata={"msg_type": "Capabilities", "compression": "deflate"})
+    comm.send("compressed", buffers=[bytes(4096)])
+
+    ((_, metadata, (buffer,)), (_, compressed_metadata, (compressed,))) = ipy_comm.sent
+    assert metadata is None
+    assert buffer.nbytes == 4096
+    assert compressed_metadata == {"compressed": [0]}
+    assert zlib.decompress(compressed) == bytes(4096)
+
+
+def test_server_comm_splits_large_messages_when_negotiated(kernel):
+    comm = JupyterCommManager.get_server_comm(chunk_size=1000)
+    comm.send("unsplit", buffers=[bytes(4096)])
+    ipy_comm = kernel.comms[comm.id]
+    ipy_comm.receive(metadata={"msg_type": "Capabilities", "chunking": True})
+    comm.send({"a": 1}, buffers=[bytes(range(256)) * 10, b"tail"])
+    comm.send({"a": 2})
+
+    (unsplit, *fragments, small) = ipy_comm.sent
+    assert unsplit[1] is None
+    assert small == ({"a": 2}, None, [])
+    assert len(fragments) == 3
+    assert all(sum(buf.nbytes for buf in buffers) <= 1000 for _, _, buffers in fragments)
+    assert [metadata["fragment"]["index"] for _, metadata, _ in fragments] == [0, 1, 2]
+
+    payload = b"".join(bytes(buf) for _, _, buffers in fragments for buf in buffers)
+    (header_length,) = struct.unpack("<I", payload[:4])
+    header = json.loads(payload[4 : 4 + header_length])
+    assert header == {"data": {"a": 1}, "metadata": None, "buffers": [2560, 4]}
+    assert payload[4 + header_length :] == bytes(range(256)) * 10 + b"tail"
+
+
+def test_client_comm_sends_acks_ahead_of_bulk_data(kernel):
+    comm = JupyterCommManager.get_client_comm(
+        on_msg=lambda msg: comm.send({"patch": 1}, buffers=[bytes(5000)]),
+        chunk_size=1000,
+        bulk_threshold=1000,
+    )
+    ipy_comm = kernel.comm_manager.open(comm.id, {"capabilities": {"chunking": True}})
+    send = ipy_comm.send
+
+    def slow_send(*args):
+        time.sleep(0.01)
+        send(*args)
+
+    ipy_comm.send = slow_send
+    ipy_comm.receive({"comm_id": comm.id, "value": 1})
+    comm.send({"small": 1})
+    comm.close()
+
+    msg_types = [(metadata or {}).get("msg_type") for _, metadata, _ in ipy_comm.sent[1:]]
+    assert msg_types.count("Fragment") == 6
+    assert msg_types.index("Ready") < 5
+    assert ipy_comm.sent[-1] == ({"small": 1}, None, [])
+
+
+def test_server_comm_sends_bulk_bursts_on_one_worker(kernel):
+    comm = JupyterCommManager.get_server_comm(bulk_threshold=100)
+    comm.send({})
+    threads = threading.active_count()
+    for i in range(5):
+        comm.send({"i": i}, buffers=[bytes(1000)])
+        deadline = time.monotonic() + 5
+        while comm._bulk_sending and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    assert threading.active_count() == threads + 1
+
+    worker = comm._bulk_worker
+    comm.close()
+
+    assert not worker.is_alive()
+    assert [data for data, _, _ in kernel.comms[comm.id].sent[1:]] == [{"i": i} for i in range(5)]
+
+
+def test_server_comm_splits_messages_with_values_json_does_not_support(kernel):
+    comm = JupyterCommManager.get_server_comm(chunk_size=100, codecs=["json"])
+    comm.send({})
+    ipy_comm = kernel.comms[comm.id]
+    ipy_comm.receive(metadata={"msg_type": "Capabilities", "chunking": True})
+    comm.send({"date": datetime.date(2024, 1, 31), "values": array.array("d", [0.5] * 20)})
+
+    fragments = ipy_comm.sent[1:]
+    assert len(fragments) > 1
+    payload = b"".join(bytes(buf) for _, _, buffers in fragments for buf in buffers)
+    (header_length,) = struct.unpack("<I", payload[:4])
+    header = json.loads(payload[4 : 4 + header_length])
+    assert header["data"] == {"date": "2024-01-31", "values": [0.5] * 20}
+
+
+def test_server_comm_flow_control(kernel):
+    comm = JupyterCommManager.get_server_comm(max_in_flight=1, flow_policy="drop")
+    comm.send({"i": 0})
+    ipy_comm = kernel.comms[comm.id]
+
+    assert ipy_comm.open_data["capabilities"]["credits"]
+
+    ipy_comm.receive(metadata={"msg_type": "Capabilities", "credits": True})
+    ipy_comm.receive(metadata={"msg_type": "Credit", "credits": 1})
+    comm.send({"i": 1})
+    comm.send({"i": 2})
+    ipy_comm.receive(metadata={"msg_type": "Credit", "credits": 1})
+    comm.send({"i": 3})
+
+    assert [data for (data, _, _) in ipy_comm.sent] == [{"i": 0}, {"i": 1}, {"i": 3}]
+
+
+def test_server_comm_counts_messages_sent_before_capabilities_reply(kernel):
+    comm = JupyterCommManager.get_server_comm(max_in_flight=2, flow_policy="drop")
+    comm.send({"i": 0})
+    comm.send({"i": 1})
+    ipy_comm = kernel.comms[comm.id]
+    ipy_comm.receive(metadata={"msg_type": "Capabilities", "credits": True})
+    # The frontend credits the messages it received after selecting credits
+    ipy_comm.receive(metadata={"msg_type": "Credit", "credits": 1})
+    comm.send({"i": 2})
+    comm.send({"i": 3})
+
+    assert [data for (data, _, _) in ipy_comm.sent] == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+
+def test_server_comm_discards_count_when_credits_are_declined(kernel):
+    comm = JupyterCommManager.get_server_comm(max_in_flight=1, flow_policy="drop")
+    comm.send({"i": 0})
+    ipy_comm = kernel.comms[comm.id]
+    ipy_comm.receive(metadata={"msg_type": "Capabilities", "credits": False})
+    comm.max_in_flight = 1
+    comm._apply_capabilities({"credits": True})
+    comm.send({"i": 1})
+
+    assert comm._in_flight == 1
+    assert [data for (data, _, _) in ipy_comm.sent] == [{"i": 0}, {"i": 1}]
+
+
+def test_multiplexed_server_comms_share_one_comm(kernel):
+    comms = [MultiplexedCommManager.get_server_comm() for _ in range(3)]
+    for i, comm in enumerate(comms):
+        comm.send({"i": i})
+
+    assert kernel.comms == {}
+
+    mux = kernel.comm_manager.open("pyviz-multiplexer")
+
+    assert list(kernel.comms) == ["pyviz-multiplexer"]
+    opened = [(data, metadata) for data, metadata, _ in mux.sent[::2]]
+    sent = [(data, metadata) for data, metadata, _ in mux.sent[1::2]]
+    assert opened == [
+        (
+            {"capabilities": comm._capabilities()},
+            {"msg_type": "Open", "channel": comm.id},
+        )
+        for comm in comms
+    ]
+    assert sent == [({"i": i}, {"channel": comm.id}) for i, comm in enumerate(comms)]
+
+
+def test_multiplexed_server_comm_negotiates_per_channel(kernel):
+    comm = MultiplexedCommManager.get_server_comm()
+    other = MultiplexedCommManager.get_server_comm()
+    mux = kernel.comm_manager.open("pyviz-multiplexer")
+    comm.send({"a": 1})
+    other.send({"a": 1})
+    mux.receive(metadata={"msg_type": "Capabilities", "codec": "binary", "channel": comm.id})
+    comm.send({"a": 2})
+    other.send({"a": 2})
+
+    (encoded, metadata, buffers) = mux.sent[-2]
+    assert metadata == {"codec": "binary", "channel": comm.id}
+    assert BinaryCodec().decode(encoded, buffers)[0] == {"a": 2}
+    assert mux.sent[-1] == ({"a": 2}, {"channel": other.id}, [])
+
+
+def test_multiplexed_client_comm(kernel):
+    events = []
+    comm = MultiplexedCommManager.get_client_comm(on_msg=events.append)
+    mux = kernel.comm_manager.open("pyviz-multiplexer")
+    mux.receive({"capabilities": {}}, metadata={"msg_type": "Open", "channel": comm.id})
+    mux.receive({"comm_id": comm.id, "value": 1}, metadata={"channel": comm.id})
+
+    assert comm.id not in kernel.comm_manager.targets
+    assert events == [{"value": 1, "_buffers": {}}]
+    (_, reply, _) = mux.sent[-1]
+    assert reply == {"msg_type": "Ready", "content": "", "comm_id": comm.id, "channel": comm.id}
+
+
+def test_multiplexed_comms_closed_with_shared_comm(kernel):
+    comm = MultiplexedCommManager.get_client_comm()
+    server_comm = MultiplexedCommManager.get_server_comm()
+    mux = kernel.comm_manager.open("pyviz-multiplexer")
+    mux.receive({"capabilities": {}}, metadata={"msg_type": "Open", "channel": comm.id})
+    server_comm.send({"a": 1})
+    server_comm.close()
+
+    assert mux.sent[-1] == (None, {"msg_type": "Close", "channel": server_comm.id}, None)
+    assert comm.id in MultiplexedCommManager._comms
+
+    mux.close()
+
+    assert comm.id not in MultiplexedCommManager._comms
+
+
+def test_multiplexed_comms_stay_on_their_shared_comm(kernel):
+    comm = MultiplexedCommManager.get_server_comm()
+    comm.send({"a": 1})
+    mux = kernel.comm_manager.open("pyviz-multiplexer")
+    # The manager code was executed again, opening another shared comm
+    other_mux = kernel.comm_manager.open("pyviz-multiplexer")
+    other = MultiplexedCommManager.get_server_comm()
+    comm.send({"a": 2})
+    other.send({"b": 1})
+
+    assert mux.sent[-1] == ({"a": 2}, {"channel": comm.id}, [])
+    assert [data for data, _, _ in other_mux.sent] == [
+        {"capabilities": other._capabilities()},
+        {"b": 1},
+    ]
+
+    mux.close()
+    other.send({"b": 2})
+
+    assert comm.id not in MultiplexedCommManager._comms
+    assert other_mux.sent[-1] == ({"b": 2}, {"channel": other.id}, [])
+
+
+def test_multiplexer_queue_is_bounded(kernel, monkeypatch):
+    monkeypatch.setattr(Multiplexer, "queue_limit", 3)
+    comm = MultiplexedCommManager.get_server_comm()
+    for i in range(5):
+        comm.send({"i": i})
+    mux = kernel.comm_manager.open("pyviz-multiplexer")
+
+    assert [data for data, _, _ in mux.sent] == [{"i": 2}, {"i": 3}, {"i": 4}]
+
+
+def test_server_comm_request(kernel):
+    comm = JupyterCommManager.get_server_comm()
+    future = comm.request({"x": 1})
+    other = comm.request({"x": 2})
+    ipy_comm = kernel.comms[comm.id]
+
+    assert ipy_comm.sent == [
+        ({"x": 1}, {"msg_type": "Request", "request_id": "0"}, []),
+        ({"x": 2}, {"msg_type": "Request", "request_id": "1"}, []),
+    ]
+
+    ipy_comm.receive({"result": [1, 2]}, metadata={"msg_type": "Response", "request_id": "1"})
+    ipy_comm.receive(metadata={"msg_type": "Response", "request_id": "0", "error": "Error: x"})
+
+    assert other.result(timeout=0) == [1, 2]
+    with pytest.raises(RuntimeError, match="Error: x"):
+        future.result(timeout=0)
+
+
+def test_server_comm_request_binary_response(kernel):
+    comm = JupyterCommManager.get_server_comm()
+    future = comm.request()
+    ipy_comm = kernel.comms[comm.id]
+    ipy_comm.receive(
+        metadata={"msg_type": "Response", "request_id": "0", "binary": True}, buffers=[b"tile"]
+    )
+
+    assert future.result(timeout=0) == b"tile"
+
+
+def test_server_comm_request_timeout_cancels(kernel):
+    comm = JupyterCommManager.get_server_comm()
+    future = comm.request(timeout=0.01)
+
+    with pytest.raises(TimeoutError):
+        future.result(timeout=1)
+
+    # The cancellation is sent by the scheduler thread once it failed the future
+    ipy_comm = kernel.comms[comm.id]
+    deadline = time.monotonic() + 1
+    while len(ipy_comm.sent) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert ipy_comm.sent[-1] == (None, {"msg_type": "Cancel", "request_id": "0"}, [])
+
+
+def test_server_comm_request_timeouts_share_a_thread(kernel):
+    comm = JupyterCommManager.get_server_comm()
+    comm.request(timeout=60)
+    threads = threading.active_count()
+    futures = [comm.request(timeout=60) for _ in range(50)]
+    comm.close()
+
+    assert threading.active_count() == threads
+    assert all(isinstance(future.exception(timeout=0), RuntimeError) for future in futures)
+
+
+def test_server_comm_request_cancel(kernel):
+    comm = JupyterCommManager.get_server_comm()
+    future = comm.request()
+    future.cancel()
+    ipy_comm = kernel.comms[comm.id]
+    ipy_comm.receive({"result": 1}, metadata={"msg_type": "Response", "request_id": "0"})
+
+    assert future.cancelled()
+    assert ipy_comm.sent[-1] == (None, {"msg_type": "Cancel", "request_id": "0"}, [])
+
+
+def test_server_comm_close_fails_requests(kernel):
+    comm = JupyterCommManager.get_server_comm()
+    future = comm.request()
+    comm.close()
+
+    with pytest.raises(RuntimeError, match="closed"):
+        future.result(timeout=0)
+
+
+def test_client_comm_responds_to_requests(kernel):
+    def on_request(data):
+        if data["x"] < 0:
+            raise ValueError("negative")
+        return bytes([data["x"]]) if data.get("binary") else data["x"] * 2
+
+    comm = JupyterCommManager.get_client_comm(on_request=on_request)
+    ipy_comm = kernel.comm_manager.open(comm.id)
+    for request_id, data in enumerate([{"x": 2}, {"x": 3, "binary": True}, {"x": -1}]):
+        ipy_comm.receive(
+            {"comm_id": comm.id, **data},
+            metadata={"msg_type": "Request", "request_id": str(request_id)},
+        )
+
+    ((result, metadata, _), (_, binary_metadata, (buffer,)), (_, error_metadata, _)) = (
+        ipy_comm.sent
+    )
+    assert (result, metadata) == ({"result": 4}, {"msg_type": "Response", "request_id": "0"})
+    assert binary_metadata == {"msg_type": "Response", "request_id": "1", "binary": True}
+    assert bytes(buffer) == b"\x03"
+    assert error_metadata == {
+        "msg_type": "Response",
+        "request_id": "2",
+        "error": "ValueError: negative",
+    }
+
+
+def test_client_comm_forgets_cancelled_requests(kernel):
+    comm = JupyterCommManager.get_client_comm(on_request=lambda data: data["x"])
+    comm._cancelled_expiry = 0.01
+    ipy_comm = kernel.comm_manager.open(comm.id)
+    ipy_comm.receive(metadata={"msg_type": "Cancel", "request_id": "0"})
+    ipy_comm.receive(metadata={"msg_type": "Cancel", "request_id": "1"})
+    ipy_comm.receive({"x": 1}, metadata={"msg_type": "Request", "request_id": "0"})
+
+    # The response to the cancelled request is suppressed
+    assert ipy_comm.sent == []
+
+    # The cancellation of a request that never arrived expires
+    deadline = time.monotonic() + 1
+    while comm._cancelled_requests and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not comm._cancelled_requests
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from pyviz_comms import LocalCommManager, LocalFrontend
+
+
+@pytest.fixture
+def frontend():
+    frontend = LocalFrontend.get()
+    yield frontend
+    frontend.close()
+
+
+def test_local_client_comm_acknowledges_simulated_events(frontend):
+    received = []
+    comm = LocalCommManager.get_client_comm(on_msg=received.append, codecs=["binary"])
+    connection = frontend.open(comm.id)
+
+    summary = connection.simulate(({"x": i} for i in range(500)), max_outstanding=4)
+
+    assert [msg["x"] for msg in received] == list(range(500))
+    assert summary["events"] == 500
+    assert summary["errors"] == 0
+    assert summary["ack_latency"]["count"] == 500
+    assert connection.capabilities["codec"] == "binary"
+
+
+def test_local_client_comm_counts_failed_events(frontend):
+    def fail(msg):
+        raise ValueError("Bad event")
+
+    comm = LocalCommManager.get_client_comm(on_msg=fail)
+    connection = frontend.open(comm.id)
+
+    assert connection.simulate([{"x": 1}] * 3)["errors"] == 3
+
+
+def test_local_server_comm_applies_flow_control(frontend):
+    comm = LocalCommManager.get_server_comm(max_in_flight=2)
+    comm.send(data={"i": -1})
+    connection = frontend.connections[comm.id]
+    received = []
+    connection.on_msg(lambda data, metadata, buffers: received.append(data["i"]))
+    assert frontend.wait(5)
+    assert connection.capabilities["credits"]
+
+    sender = threading.Thread(target=lambda: [comm.send(data={"i": i}) for i in range(100)])
+    sender.start()
+    sender.join(5)
+
+    assert frontend.wait(5)
+    assert received == list(range(100))
+    assert comm._in_flight == 0
+
+
+def test_local_connection_requests_server_comm(frontend):
+    comm = LocalCommManager.get_server_comm(on_request=lambda data: data["x"] * 2)
+    comm.send(data={})
+    connection = frontend.connections[comm.id]
+
+    assert connection.request({"x": 21}, timeout=5).result(5) == 42
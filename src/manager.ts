@@ -14,6 +14,14 @@ const fetch = ServerConnection.makeRequest;
 const API_ROOT = URLExt.join(PageConfig.getBaseUrl(), '/panel-preview/');
 const API_LAYOUT = URLExt.join(API_ROOT, '/layout/');
 
+// Period over which delete events are collected into a single batch
+const DELETE_BATCH_PERIOD = 50;
+
+interface IPendingDeletes {
+  ids: string[];
+  server_ids: string[];
+}
+
 /**
  * A micro manager that contains the document context
  */
@@ -22,6 +30,10 @@ export class ContextManager implements IDisposable {
   private _app: JupyterFrontEnd;
   private _context: DocumentRegistry.IContext<DocumentRegistry.IModel> | null;
   private _comm: Kernel.IComm | undefined;
+  // Whether the kernel advertised support for batch_delete events
+  private _batchDeletes = false;
+  private _pendingDeletes: IPendingDeletes = { ids: [], server_ids: [] };
+  private _deleteTimeout: number | null = null;
 
   constructor(
     app: JupyterFrontEnd,
@@ -83,6 +95,14 @@ export class ContextManager implements IDisposable {
       (session: any, status: string) => {
         if (status === 'restarting' || status === 'dead') {
           this._comm = undefined;
+          this._batchDeletes = false;
+          this._clearPendingDeletes();
+          // The shared comm of multiplexed channels does not survive
+          const kernel_id = session.session?.kernel?.id;
+          const multiplexers = (window as any).PyViz?.multiplexers;
+          if (multiplexers !== undefined && kernel_id !== undefined) {
+            delete multiplexers[kernel_id];
+          }
         }
       },
       this
@@ -106,7 +126,14 @@ export class ContextManager implements IDisposable {
           'hv-extension-comm'
         );
       if (this._comm) {
-        this._comm.open();
+        // Kernels supporting batch_delete reply to the capabilities offer
+        this._comm.onMsg = (msg: any) => {
+          const metadata = msg.metadata || {};
+          if (metadata.msg_type === 'Capabilities') {
+            this._batchDeletes = !!metadata.batch_delete;
+          }
+        };
+        this._comm.open({ capabilities: {} });
       }
     }
     return this._comm;
@@ -116,6 +143,52 @@ export class ContextManager implements IDisposable {
     this._comm = comm;
   }
 
+  /**
+   * Queue a delete event, sending all deletes queued within a short
+   * period to the kernel as a single batch_delete event.
+   */
+  queueDelete(key: keyof IPendingDeletes, id: string): void {
+    this._pendingDeletes[key].push(id);
+    if (this._deleteTimeout !== null) {
+      return;
+    }
+    this._deleteTimeout = window.setTimeout(
+      () => this._flushDeletes(),
+      DELETE_BATCH_PERIOD
+    );
+  }
+
+  private _flushDeletes(): void {
+    const { ids, server_ids } = this._pendingDeletes;
+    this._clearPendingDeletes();
+    if (ids.length === 0 && server_ids.length === 0) {
+      return;
+    }
+    const comm = this.comm;
+    if (!comm) {
+      return;
+    }
+    if (this._batchDeletes) {
+      comm.send({ event_type: 'batch_delete', ids, server_ids });
+      return;
+    }
+    // Kernels running an older pyviz_comms only handle single deletes
+    for (const id of ids) {
+      comm.send({ event_type: 'delete', id });
+    }
+    for (const id of server_ids) {
+      comm.send({ event_type: 'server_delete', id });
+    }
+  }
+
+  private _clearPendingDeletes(): void {
+    if (this._deleteTimeout !== null) {
+      window.clearTimeout(this._deleteTimeout);
+      this._deleteTimeout = null;
+    }
+    this._pendingDeletes = { ids: [], server_ids: [] };
+  }
+
   get isDisposed(): boolean {
     return this._context === null;
   }
@@ -124,6 +197,7 @@ export class ContextManager implements IDisposable {
     if (this.isDisposed) {
       return;
     }
+    this._flushDeletes();
     this._context = null;
     this._comm = undefined;
   }
@@ -23,6 +23,7 @@ export declare interface ICommProxy {
     disposeOnDone?: boolean
   ): void;
   onMsg: (msg: KernelMessage.ICommMsgMsg) => void;
+  onClose: (msg: KernelMessage.ICommCloseMsg) => void;
   connected: boolean;
   active: boolean;
 }
@@ -34,6 +35,7 @@ export declare interface IKernelProxy {
     callback: (comm: Kernel.IComm, msg: KernelMessage.ICommOpenMsg) => void
   ): void;
   connectToComm(targetName: string, commId?: string): ICommProxy;
+  readonly id: string | undefined;
 }
 
 export declare interface IWidgetManagerProxy {
@@ -198,6 +200,9 @@ export class HVJSExec extends Widget implements IRenderMime.IRenderer {
           set onMsg(callback: (msg: KernelMessage.ICommMsgMsg) => void) {
             comm.onMsg = callback;
           },
+          set onClose(callback: (msg: KernelMessage.ICommCloseMsg) => void) {
+            comm.onClose = callback;
+          },
           open: openClosure,
           send: sendClosure,
           connected: false,
@@ -206,11 +211,15 @@ export class HVJSExec extends Widget implements IRenderMime.IRenderer {
       };
 
       let msg_callback: any = null;
+      let close_callback: any = null;
       if (kernel === undefined) {
         comm_proxy = {
           set onMsg(callback: (msg: KernelMessage.ICommMsgMsg) => void) {
             msg_callback = callback;
           },
+          set onClose(callback: (msg: KernelMessage.ICommCloseMsg) => void) {
+            close_callback = callback;
+          },
           open: function (): void {},
           send: function (): void {},
           connected: false,
@@ -224,6 +233,9 @@ export class HVJSExec extends Widget implements IRenderMime.IRenderer {
             comm_proxy.open = new_comm.open;
             comm_proxy.send = new_comm.send;
             comm.onMsg = msg_callback;
+            if (close_callback !== null) {
+              comm.onClose = close_callback;
+            }
             comm_proxy.active = true;
           } else if (retries > 3) {
             console.warn(
@@ -243,7 +255,11 @@ export class HVJSExec extends Widget implements IRenderMime.IRenderer {
     };
     const kernel_proxy: IKernelProxy = {
       connectToComm: connectClosure,
-      registerCommTarget: registerClosure
+      registerCommTarget: registerClosure,
+      // Identifies the kernel, e.g. to share a multiplexer between plots
+      get id(): string | undefined {
+        return manager!.context.sessionContext.session?.kernel?.id;
+      }
     };
     (window as any).PyViz.kernels[id] = kernel_proxy;
 
@@ -352,16 +368,13 @@ export class HVJSExec extends Widget implements IRenderMime.IRenderer {
   _disposePlot(): void {
     if (this._server_id) {
       if (this._manager.comm !== null && this._dispose) {
-        this._manager.comm.send({
-          event_type: 'server_delete',
-          id: this._server_id
-        });
+        this._manager.queueDelete('server_ids', this._server_id);
       }
       this._server_id = null;
     } else if (this._document_id) {
       const id = this._document_id;
       if (this._manager.comm && this._dispose) {
-        this._manager.comm.send({ event_type: 'delete', id: id });
+        this._manager.queueDelete('ids', id);
       }
       if ((window as any).PyViz !== undefined) {
         if ((window as any).PyViz.kernels !== undefined) {